@@ -0,0 +1,408 @@
+"""
+Writes the manifest of an execution - one record for each found file.
+
+The manifest describes each found file with the fields in L{FIELDS}: name of the signature,
+source file, position of the first and the last byte in the source file, number of bytes written,
+name of the output file, the way the end of the file was determined (L{METHOD_NAMES}), a verdict
+(L{VERDICT_COMPLETE}, L{VERDICT_VALID}, L{VERDICT_TRUNCATED}), optionally a hash of the content and
+for duplicates the file written before with the same content (see L{DedupStore}).
+Manifests whose name ends with C{.csv} are written as CSV with a header line; all others as
+JSON lines (one JSON object per line). Hence, found files may be indexed without examining the
+destination folder. Source files are recorded with their absolute path, so that the files may be
+extracted from any working directory. In JSON manifests, names are decoded with the encoding of the
+file system (L{FS_ENCODING}); if a name of a record is not valid in this encoding, all names of the
+record are decoded as latin-1 and the record gets the additional field C{encoding}, so that names
+are always read back unchanged (see L{readManifest}).
+
+Records are collected in memory and written in batches of L{BATCH_SIZE} records; records may be
+added from several threads (see L{CarveWriter}).
+
+For index-only executions (see L{ExecutionSettings.ExecutionSettings.virtual}) no files are written
+and the records carry no output file; selected records may be extracted later on (see L{readManifest}
+and L{extractRecords}).
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+
+@var BATCH_SIZE: Number of records collected before they are written to the manifest
+@type BATCH_SIZE: C{int}
+@var FIELDS: Fields of a record - in this order for the columns of CSV manifests
+@type FIELDS: C{List} of C{String}
+@var FS_ENCODING: Encoding of file names in JSON manifests (unless given by the field C{encoding})
+@type FS_ENCODING: C{String}
+@var METHOD_NAMES: Names of the end detection methods for each signature type
+@type METHOD_NAMES: C{Dict}
+@var VERDICT_COMPLETE: Verdict - the end of the file was found (end sequence, file size)
+@type VERDICT_COMPLETE: C{String}
+@var VERDICT_VALID: Verdict - the structure of the file has been checked (manual, chunks)
+@type VERDICT_VALID: C{String}
+@var VERDICT_TRUNCATED: Verdict - the file exceeds the end of the source file; only the available bytes were written
+@type VERDICT_TRUNCATED: C{String}
+"""
+import csv
+import json
+import hashlib
+import threading
+import os
+import os.path
+import sys
+from collections import OrderedDict
+import signatures
+import tools
+
+BATCH_SIZE = 256
+FIELDS = ['signature', 'source', 'start', 'end', 'length', 'path', 'method', 'verdict', 'hash', 'duplicate']
+FS_ENCODING = sys.getfilesystemencoding() or 'utf-8'
+METHOD_NAMES = {signatures.TYPE_END_SEQUENCE: 'end_sequence', signatures.TYPE_FILE_SIZE: 'file_size',
+    signatures.TYPE_MANUAL: 'manual', signatures.TYPE_CHUNKS: 'chunks'}
+
+VERDICT_COMPLETE = 'complete'
+VERDICT_VALID = 'valid'
+VERDICT_TRUNCATED = 'truncated'
+
+def createRecord(sig, source, start, end, sourcesize):
+    """
+    Creates the record for a found file - without output file and hash (see L{CarveManifest.add}).
+
+    @param sig: Signature of the found file
+    @type sig: L{signatures.CompiledSignature}
+    @param source: Name of the source file (recorded with its absolute path)
+    @type source: C{String}
+    @param start: Position of the first byte of the file in the source file
+    @type start: C{int}
+    @param end: Position of the last byte of the file in the source file
+    @type end: C{int}
+    @param sourcesize: Size of the source file
+    @type sourcesize: C{int}
+    @return: Record with the fields given in L{FIELDS}
+    @rtype: C{Dict}
+    """
+    if end >= sourcesize:
+        verdict = VERDICT_TRUNCATED
+    elif sig.type == signatures.TYPE_MANUAL or sig.type == signatures.TYPE_CHUNKS:
+        verdict = VERDICT_VALID
+    else:
+        verdict = VERDICT_COMPLETE
+    return {'signature': sig.name, 'source': os.path.abspath(source), 'start': start, 'end': end,
+        'length': max(min(end, sourcesize - 1) - start + 1, 0), 'path': None,
+        'method': METHOD_NAMES.get(sig.type), 'verdict': verdict, 'hash': None, 'duplicate': None}
+
+class CarveManifest:
+    """
+    Manifest file of an execution.
+
+    @ivar _file: The manifest file
+    @type _file: Reference to a file
+    @ivar _csv: Writer for CSV manifests (C{None} for JSON lines)
+    @type _csv: C{csv.writer}
+    @ivar _hashname: Name of the hash algorithm (see C{hashlib}) - C{None} for no hashes
+    @type _hashname: C{String}
+    @ivar _records: Records not written yet
+    @type _records: C{List} of C{Dict}
+    @ivar _lock: Lock for adding and writing records
+    @type _lock: C{threading.Lock}
+    """
+    def __init__(self, filename, hashname = None, append = False, size = None):
+        """
+        Opens the manifest file.
+
+        @param filename: Name of the manifest file - CSV if it ends with C{.csv}, otherwise JSON lines
+        @type filename: C{String}
+        @param hashname: Name of the hash algorithm for the content of found files (see C{hashlib}) -
+        C{None} for no hashes
+        @type hashname: C{String}
+        @param append: Indicates, whether records are appended to an existing manifest
+        @type append: C{Boolean}
+        @param size: Size the existing manifest is cut to before appending (C{None} for the whole manifest)
+        @type size: C{int}
+        """
+        if hashname != None:
+            hashlib.new(hashname)       # unknown algorithms are reported before searching
+        if append and size != None:
+            try:
+                existing = open(filename, 'r+b')
+                existing.truncate(size)
+                existing.close()
+            except IOError:
+                pass
+        self._file = open(filename, append and 'ab' or 'wb')
+        self._file.seek(0, 2)
+        self._hashname = hashname
+        self._records = []
+        self._lock = threading.Lock()
+        self._csv = None
+        if filename.lower().endswith('.csv'):
+            self._csv = csv.writer(self._file, lineterminator = '\n')
+            if self._file.tell() == 0:
+                self._csv.writerow(FIELDS)
+
+    def add(self, record, filehandle = None):
+        """
+        Adds the record of a found file; the records are written as soon as a batch is complete.
+
+        If hashes are requested and the record carries none, the content of the found file is read
+        from the source file for the hash.
+
+        @param record: Record as provided by L{createRecord} - with the name of the output file
+        @type record: C{Dict}
+        @param filehandle: Reference to the source file (required for hashes only)
+        @type filehandle: Reference to file or C{mmap}
+        """
+        if self._hashname != None and filehandle != None and record.get('hash') == None:
+            record['hash'] = tools.hashRange(filehandle, record['start'], record['length'], self._hashname)
+        self._lock.acquire()
+        try:
+            self._records.append(record)
+            if len(self._records) >= BATCH_SIZE:
+                self._write()
+        finally:
+            self._lock.release()
+
+    def addWritten(self, record, written, filehandle = None):
+        """
+        Adds the record of a found file after writing it.
+
+        @param record: Record as provided by L{createRecord}
+        @type record: C{Dict}
+        @param written: Name of the written file, hash and name of the file with the same content
+        as returned by L{tools.writeFile}
+        @type written: C{Tuple}
+        @param filehandle: Reference to the source file (required for hashes only)
+        @type filehandle: Reference to file or C{mmap}
+        """
+        record['path'], digest, record['duplicate'] = written
+        if digest != None:
+            record['hash'] = digest
+        self.add(record, filehandle)
+
+    def flush(self):
+        """
+        Writes all records collected so far to the manifest file.
+
+        @return: Size of the manifest file
+        @rtype: C{int}
+        """
+        self._lock.acquire()
+        try:
+            self._write()
+            self._file.flush()
+            return self._file.tell()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """
+        Writes all remaining records and closes the manifest file.
+        """
+        self.flush()
+        self._file.close()
+
+    def _write(self):
+        """
+        Writes the collected records - the lock has to be held by the caller.
+        """
+        if self._csv != None:
+            self._csv.writerows([[_csvValue(record.get(field)) for field in FIELDS] for record in self._records])
+        else:
+            self._file.write(''.join([json.dumps(_jsonRecord(record)) + '\n' for record in self._records]))
+        self._records = []
+
+def readManifest(filename):
+    """
+    Reads the records from a manifest file (CSV or JSON lines as written by L{CarveManifest}).
+
+    @param filename: Name of the manifest file
+    @type filename: C{String}
+    @return: C{None} if the manifest could not be read, otherwise the records
+    @rtype: C{List} of C{Dict}
+    """
+    records = []
+    try:
+        mfile = open(filename, 'rb')
+        try:
+            if filename.lower().endswith('.csv'):
+                for row in csv.DictReader(mfile):
+                    record = {}
+                    for field in FIELDS:
+                        value = row.get(field) or None
+                        if value != None and field in ['start', 'end', 'length']:
+                            value = int(value)
+                        record[field] = value
+                    records.append(record)
+            else:
+                for line in mfile:
+                    if not line.strip():
+                        continue
+                    record = {}
+                    values = json.loads(line)
+                    encoding = values.pop('encoding', FS_ENCODING)
+                    for field, value in values.items():
+                        if isinstance(value, unicode):
+                            value = value.encode(encoding)
+                        record[str(field)] = value
+                    records.append(record)
+        finally:
+            mfile.close()
+    except EnvironmentError, msg:
+        print ('Manifest cannot be read: %s' %(msg))
+        return None
+    except (ValueError, TypeError, LookupError, csv.Error), msg:
+        print ('Error in Manifest %s - %s' %(filename, msg))
+        return None
+    return records
+
+def extractRecords(records, status, manifest = None):
+    """
+    Writes the files described by records (e.g. of an index-only execution) to the destination folder.
+
+    Records of disabled signatures (L{ExecutionSettings.ExecutionSettings.disabled_signatures}) and
+    records outside the range given by L{ExecutionSettings.ExecutionStatus.file_start} and
+    L{ExecutionSettings.ExecutionStatus.file_end} (if given) are skipped. The files are numbered per
+    signature as in a regular execution; the extension is taken from the signature. If a source file
+    cannot be opened, the error is reported and its records are skipped.
+
+    @param records: Records as provided by L{readManifest}
+    @type records: C{List} of C{Dict}
+    @param status: Status instance of the extraction (only settings and range are regarded)
+    @type status: L{ExecutionSettings.ExecutionStatus}
+    @param manifest: Manifest the records of the extracted files are added to (C{None} for no manifest)
+    @type manifest: L{CarveManifest}
+    @return: Number of extracted files for each signature
+    @rtype: C{Dict}
+    """
+    settings = status.settings
+    extensions = {}
+    for sig in settings.signatures:
+        if sig[signatures.name] not in settings.disabled_signatures:
+            extensions[sig[signatures.name]] = sig[signatures.extension]
+    counter = {}
+    sources = {}
+    try:
+        for record in records:
+            name = record.get('signature')
+            if not extensions.has_key(name) or None in [record.get('source'), record.get('start'), record.get('end')]:
+                continue
+            if status.file_start != None and record['start'] < status.file_start:
+                continue
+            if status.file_end != None and record['start'] >= status.file_end:
+                continue
+            if not sources.has_key(record['source']):
+                try:
+                    sources[record['source']] = tools.openSourceFile(record['source'], settings.memory_mapped,
+                        settings.output_level == 3)
+                except EnvironmentError, msg:
+                    print ('Error for %s: %s' %(record['source'], msg))
+                    sources[record['source']] = None
+            filehandle = sources[record['source']]
+            if filehandle == None:
+                continue
+            number = counter.get(name, 0)
+            written = tools.writeFile(name, number + settings.counterstart_global, extensions[name],
+                filehandle, record['start'], record['end'], settings.dest_folder, settings.output_level == 3, status)
+            counter[name] = number + 1
+            if manifest != None:
+                manifest.addWritten(dict(record), written, filehandle)
+    finally:
+        for filehandle in sources.values():
+            if filehandle != None:
+                filehandle.close()
+    return counter
+
+def joinManifests(filename, parts, duplicates = None):
+    """
+    Joins the manifests of several source files (see L{FileExtractorCLI.searchSourceFiles}) and removes them.
+
+    The header lines of CSV manifests are kept for the first part only; missing parts are skipped. If
+    files have been resolved as duplicates across the source files, the records are updated accordingly.
+
+    @param filename: Name of the joined manifest
+    @type filename: C{String}
+    @param parts: Names of the manifests to be joined in this order
+    @type parts: C{List} of C{String}
+    @param duplicates: Files resolved across the source files - the name of each file mapped to its new
+    name (C{None} if removed) and the name of the file with the same content kept before
+    @type duplicates: C{Dict}
+    """
+    if duplicates:
+        _joinRecords(filename, parts, duplicates)
+        return
+    joined = open(filename, 'wb')
+    try:
+        header = filename.lower().endswith('.csv')
+        for part in parts:
+            try:
+                partfile = open(part, 'rb')
+            except IOError:
+                continue
+            try:
+                if header and joined.tell() > 0:
+                    partfile.readline()
+                tools.copyRange(partfile, partfile.tell(), None, joined)
+            finally:
+                partfile.close()
+            os.remove(part)
+    finally:
+        joined.close()
+
+def _joinRecords(filename, parts, duplicates):
+    """
+    Joins the manifests of several source files record by record and updates the records of duplicates
+    (see L{joinManifests}).
+    """
+    joined = CarveManifest(filename)
+    try:
+        for part in parts:
+            if not os.path.exists(part):
+                continue
+            records = readManifest(part)
+            if records == None:
+                continue
+            for record in records:
+                if duplicates.has_key(record.get('path')):
+                    record['path'], record['duplicate'] = duplicates[record['path']]
+                elif duplicates.has_key(record.get('duplicate')):
+                    record['duplicate'] = duplicates[record['duplicate']][1]
+                joined.add(record)
+            os.remove(part)
+    finally:
+        joined.close()
+
+def _csvValue(value):
+    """
+    Converts a value of a record for CSV manifests (C{None} becomes an empty column).
+    """
+    if value == None:
+        return ''
+    return value
+
+def _jsonRecord(record):
+    """
+    Converts a record for JSON manifests - names are decoded with L{FS_ENCODING}, or as latin-1 if one
+    of them is not valid in this encoding (the record gets the field C{encoding} then).
+    """
+    encoding = FS_ENCODING
+    names = [value for value in [record.get(field) for field in FIELDS] if isinstance(value, str)]
+    try:
+        for name in names:
+            name.decode(encoding)
+    except UnicodeError:
+        encoding = 'latin-1'
+    values = OrderedDict()
+    for field in FIELDS:
+        value = record.get(field)
+        if isinstance(value, str):
+            value = value.decode(encoding)
+        values[field] = value
+    if encoding != FS_ENCODING:
+        values['encoding'] = encoding
+    return values
@@ -0,0 +1,243 @@
+"""
+Writes found files in the background for the FileExtractor core.
+
+The core puts one job for each found file into a bounded queue; a pool of writer threads
+copies the files from the source file into the destination folder. Each writer thread uses its
+own reference to the source file, so that the core may continue examining the source file
+while files are written. If the queue is full, the core waits until a writer thread has taken
+the next job - hence, memory is limited no matter how many files are found.
+
+Files are written in parallel, but duplicates (see L{tools.resolveDuplicate}) are resolved in the
+order the files have been found, so that the same copy of a content is kept in each run. The content
+of a found file is hashed before writing it; duplicates are not written at all.
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+
+@var JOBS_PER_THREAD: Number of jobs waiting in the queue for each writer thread at most
+@type JOBS_PER_THREAD: C{int}
+"""
+import Queue
+import threading
+import tools
+
+JOBS_PER_THREAD = 16
+
+class CarveWriter:
+    """
+    Pool of writer threads for found files.
+
+    @ivar _queue: Queue of jobs - tuples (sequence number, type, counter, extension, start, end) as for
+    L{tools.writeFile} and the record for the manifest
+    @type _queue: C{Queue.Queue}
+    @ivar _submitted: Number of jobs put into the queue so far
+    @type _submitted: C{int}
+    @ivar _resolved: Sequence number of the job to resolve its duplicates next
+    @type _resolved: C{int}
+    @ivar _turn: Condition for waiting until a job may resolve its duplicates - or until a file
+    with the same content has been written
+    @type _turn: C{threading.Condition}
+    @ivar _pending: Names of the files registered for deduplication, but not written yet
+    @type _pending: C{Dict}
+    @ivar _threads: Writer threads
+    @type _threads: C{List} of C{threading.Thread}
+    @ivar _status: Status instance of the current execution
+    @type _status: L{ExecutionSettings.ExecutionStatus}
+    @ivar _manifest: Manifest the records of written files are added to (C{None} for no manifest)
+    @type _manifest: L{CarveManifest.CarveManifest}
+    @ivar _error: First error occured in one of the writer threads (C{None} if none)
+    @type _error: C{Exception}
+    """
+    def __init__(self, binfilename, number, status, manifest = None):
+        """
+        Starts the writer threads.
+
+        @param binfilename: Name of the source file
+        @type binfilename: C{String}
+        @param number: Number of writer threads
+        @type number: C{int}
+        @param status: Status instance of the current execution
+        @type status: L{ExecutionSettings.ExecutionStatus}
+        @param manifest: Manifest the records of written files are added to (C{None} for no manifest)
+        @type manifest: L{CarveManifest.CarveManifest}
+        """
+        self._queue = Queue.Queue(number * JOBS_PER_THREAD)
+        self._submitted = 0
+        self._resolved = 0
+        self._turn = threading.Condition()
+        self._pending = {}
+        self._status = status
+        self._manifest = manifest
+        self._error = None
+        self._threads = []
+        for i in range(number):
+            filehandle = tools.openSourceFile(binfilename, status.settings.memory_mapped, 0, status.settings.imaging)
+            thread = threading.Thread(target = self._run, args = (filehandle,))
+            thread.setDaemon(True)
+            thread.start()
+            self._threads.append(thread)
+
+    def write(self, type, counter, extension, start, end, record = None):
+        """
+        Puts a found file into the queue for being written (see L{tools.writeFile} for the parameters).
+        The record of the file (see L{CarveManifest.createRecord}) is added to the manifest once the
+        file has been written.
+
+        Blocks, if the queue is full. Errors occured in the writer threads are raised here.
+        """
+        if self._error:
+            raise self._error
+        self._queue.put((self._submitted, type, counter, extension, start, end, record))
+        self._submitted += 1
+
+    def flush(self):
+        """
+        Waits until all files in the queue have been written.
+
+        Errors occured in the writer threads are raised here.
+        """
+        self._queue.join()
+        if self._error:
+            raise self._error
+
+    def close(self):
+        """
+        Waits until all files in the queue have been written and stops the writer threads.
+
+        Errors occured in the writer threads are raised here.
+        """
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._error:
+            raise self._error
+
+    def _run(self, filehandle):
+        """
+        Main loop of a writer thread - writes files until receiving C{None} from the queue.
+
+        For deduplication, the content of a file is hashed first; the hash is registered once all
+        files found before have been registered (see L{_resolve}). Only files with new content are
+        written afterwards. After an error of any kind, the remaining jobs are only taken from the
+        queue (the error is passed to the core) - the turn is passed on for each job in any case, so
+        that neither the other writer threads nor the core wait forever.
+
+        @param filehandle: Own reference to the source file of this thread
+        @type filehandle: Reference to file or C{mmap}
+        """
+        settings = self._status.settings
+        showoutput = settings.output_level == 3
+        while 1:
+            job = self._queue.get()
+            if job == None:
+                self._queue.task_done()
+                break
+            sequence, type, counter, extension, start, end, record = job
+            filename = tools.getCarveName(type, counter, extension, settings.dest_folder, settings)
+            try:
+                digest = None
+                if settings.dedup != None and not self._error:
+                    try:
+                        digest = tools.hashRange(filehandle, start, end - start + 1, settings.getHashName())
+                    except Exception, msg:
+                        self._setError(msg)
+                original = self._resolve(sequence, filename, digest)
+                if not self._error:
+                    if original != None:
+                        self._waitWritten(original)
+                        filename = tools.linkDuplicate(filename, original, showoutput, self._status)
+                    elif digest != None:
+                        tools.copyFile(filename, filehandle, start, end, showoutput)
+                    else:
+                        digest = tools.copyFile(filename, filehandle, start, end, showoutput, settings.getHashName())
+                    if record != None:
+                        self._manifest.addWritten(record, (filename, digest, original), filehandle)
+            except Exception, msg:
+                self._setError(msg)
+            finally:
+                self._written(filename)
+                self._queue.task_done()
+        filehandle.close()
+
+    def _setError(self, error):
+        """
+        Keeps an error occured in a writer thread for the core - only the first one is kept.
+
+        @param error: The error
+        @type error: C{Exception}
+        """
+        if self._error == None:
+            self._error = error
+
+    def _resolve(self, sequence, filename, digest):
+        """
+        Waits for the turn of a job and registers the content of its file (see L{DedupStore.DedupStore.register}).
+
+        The turn is passed on to the next job in any case, also if the file could not be hashed.
+
+        @param sequence: Sequence number of the job
+        @type sequence: C{int}
+        @param filename: Name of the file to be written
+        @type filename: C{String}
+        @param digest: Hash of the content of the file (C{None} for no deduplication)
+        @type digest: C{String}
+        @return: Name of the file with the same content registered before (C{None} if the file has
+        to be written)
+        @rtype: C{String}
+        """
+        original = None
+        self._turn.acquire()
+        try:
+            while self._resolved != sequence:
+                self._turn.wait()
+            try:
+                if digest != None and not self._error:
+                    original = self._status.dedup_store.register(digest, filename)
+                    if original == None:
+                        self._pending[filename] = 1
+            finally:
+                self._resolved += 1
+                self._turn.notifyAll()
+        finally:
+            self._turn.release()
+        return original
+
+    def _waitWritten(self, filename):
+        """
+        Waits until a file registered for deduplication has been written (or has failed).
+
+        @param filename: Name of the file
+        @type filename: C{String}
+        """
+        self._turn.acquire()
+        try:
+            while self._pending.has_key(filename):
+                self._turn.wait()
+        finally:
+            self._turn.release()
+
+    def _written(self, filename):
+        """
+        Marks a file as written, so that its duplicates may be linked to it (see L{_waitWritten}).
+
+        @param filename: Name of the file
+        @type filename: C{String}
+        """
+        self._turn.acquire()
+        try:
+            if self._pending.pop(filename, None) != None:
+                self._turn.notifyAll()
+        finally:
+            self._turn.release()
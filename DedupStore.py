@@ -0,0 +1,85 @@
+"""
+Remembers the content of the files written during an execution for detecting duplicates.
+
+Source files often contain several copies of the same file (thumbnail caches, slack space, files
+saved again). If requested (see L{ExecutionSettings.ExecutionSettings.dedup}), the hash of each
+found file is calculated from the source file before writing it (see L{tools.writeFile}); files
+whose hash has been seen before are not written, but skipped or replaced by a hard link to the
+first copy.
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+"""
+import threading
+
+class DedupStore:
+    """
+    Written files keyed by the hash of their content - may be used from several threads.
+
+    @ivar _files: Name of the first file written for each hash
+    @type _files: C{Dict}
+    @ivar _lock: Lock for looking up and adding hashes
+    @type _lock: C{threading.Lock}
+    """
+    def __init__(self):
+        """
+        Creates an empty store.
+        """
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def register(self, digest, filename):
+        """
+        Looks up a hash and adds it, if it has not been seen before.
+
+        @param digest: Hash of the content of a written file
+        @type digest: C{String}
+        @param filename: Name of the written file
+        @type filename: C{String}
+        @return: C{None} if the content is new, otherwise the name of the file written first with this content
+        @rtype: C{String}
+        """
+        self._lock.acquire()
+        try:
+            original = self._files.get(digest)
+            if original == None:
+                self._files[digest] = filename
+            return original
+        finally:
+            self._lock.release()
+
+    def getState(self):
+        """
+        Provides a copy of the store for a checkpoint.
+
+        @return: Name of the first file written for each hash
+        @rtype: C{Dict}
+        """
+        self._lock.acquire()
+        try:
+            return dict(self._files)
+        finally:
+            self._lock.release()
+
+    def setState(self, files):
+        """
+        Restores the store from a checkpoint (see L{getState}).
+
+        @param files: Name of the first file written for each hash
+        @type files: C{Dict}
+        """
+        self._lock.acquire()
+        try:
+            self._files = dict(files)
+        finally:
+            self._lock.release()
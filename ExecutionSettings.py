@@ -4,9 +4,11 @@ Module for maintaining runtime information about application execution.
 Both, the settings for configuring executions and status information about 
 the current execution are handled by this module.
 
-This class does not provide any notification whenever something has changed
-within the class. Insteed, the observing class is supposed to implement a
-timer and should check for up-to-date information frequently.
+The status notifies registered listeners whenever something has changed
+(see L{ExecutionStatus.addListener}) - hence, observing classes do not need
+to check for up-to-date information frequently. Progress events are rate-limited,
+events for found files are sent for each file. All updates are synchronised; listeners
+receive a consistent snapshot of the status (L{StatusSnapshot}).
 
 FileExtractor is free software: you can redistribute it and/or modify
 it under the terms of the GNU General Public License as published by
@@ -27,16 +29,58 @@ along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 @var def_folder: Default value for output folder
 @var def_output_level: Default value for the amount of output to be generated by the application
 @var def_output_frequency: Default value for the frequency output is generated for the CL interface
+@var def_blocksize: Default value for the number of bytes read from the source file at once
+@var def_processes: Default value for the number of processes examining one source file
+@var def_core: Default value for the core examining the source files (see L{tools.determineScanCore})
+@var def_writers: Default value for the number of threads writing found files
+@var def_alignment: Default value for the alignment of start sequences (every byte)
+@var def_checkpoint_interval: Default value for the number of seconds between two checkpoints
+@var def_event_interval: Default value for the minimum number of seconds between two progress events for a listener
+@var def_dedup_hash: Default value for the hash algorithm used for deduplication, if no hash is requested for the manifest
+@var def_source_workers: Default value for the number of source files examined in parallel
+
+@var EVENT_STARTED: Event - execution for a source file has been started
+@type EVENT_STARTED: C{int}
+@var EVENT_PROGRESS: Event - progress within the current source file
+@type EVENT_PROGRESS: C{int}
+@var EVENT_FOUND: Event - a file has been found within the current source file
+@type EVENT_FOUND: C{int}
+@var EVENT_FINISHED: Event - execution for a source file has been finished
+@type EVENT_FINISHED: C{int}
+@var DEDUP_SKIP: Deduplication - files with the same content as a file written before are skipped
+@type DEDUP_SKIP: C{String}
+@var DEDUP_LINK: Deduplication - files with the same content as a file written before are replaced by a hard link
+@type DEDUP_LINK: C{String}
 """
 
 import signatures
+from DedupStore import DedupStore
+import threading
 import time
+import traceback
 
 def_digits = 5
 def_counterstart = 1
 def_folder = "./"
 def_output_level = 2
 def_output_frequency = 100
+def_blocksize = 4 * 1024 * 1024
+def_processes = 1
+def_core = "auto"
+def_writers = 2
+def_alignment = 1
+def_checkpoint_interval = 60
+def_event_interval = 0.5
+def_dedup_hash = "sha1"
+def_source_workers = 1
+
+EVENT_STARTED = 1
+EVENT_PROGRESS = 2
+EVENT_FOUND = 3
+EVENT_FINISHED = 4
+
+DEDUP_SKIP = "skip"
+DEDUP_LINK = "link"
 
 class ExecutionSettings:
     """
@@ -51,10 +95,35 @@ class ExecutionSettings:
     @ivar sourceFiles: List of source files for searching in.
     @ivar number_sourcefiles: Total number of source files to be processed. (Generated automatically)
     @ivar signatures: Signatures active for this particular Execution.
+    @ivar blocksize: Number of bytes read from the source file at once by the core.
+    @ivar memory_mapped: Indicates, whether the source file shall be accessed memory mapped instead of being read.
+    @ivar processes: Number of processes examining the source file in parallel (in shards of the block size).
+    @ivar core: Name of the core examining the source files ("Python", "Native" or "auto").
+    @ivar writers: Number of threads writing found files in the background (0 for writing them while examining).
+    @ivar alignment: Start sequences are only looked up at multiples of this number of bytes (1 for every byte;
+    0 for the cluster size of the file system in the source file - see L{bootsector}).
+    @ivar state_file: Name of the file the state of the execution is written to periodically (C{None} for no checkpoints).
+    @ivar checkpoint_interval: Number of seconds between two checkpoints.
+    @ivar resume: Indicates, whether the execution shall be continued from the state in the state file.
+    @ivar manifest: Name of the file a record for each found file is written to (C{None} for no manifest - 
+    see L{CarveManifest}).
+    @ivar manifest_hash: Name of the hash algorithm for the content of found files in the manifest (C{None} for no hashes).
+    @ivar virtual: Indicates, whether found files are only recorded in the manifest instead of being written
+    (index-only execution - see L{CarveManifest.extractRecords} for writing them later on).
+    @ivar dedup: Handling of files with the same content as a file written before (L{DEDUP_SKIP}, L{DEDUP_LINK} or
+    C{None} for writing them as any other file - see L{DedupStore}).
+    @ivar source_workers: Number of processes examining different source files in parallel (each one with a copy 
+    of the settings - see L{FileExtractorCLI.searchSourceFiles}).
+    @ivar imaging: Status of the imaging writing the source file whilst it is examined (C{None} for complete source
+    files - see L{GrowingFile}).
     """
     def __init__(self, digits = def_digits, counterstart = def_counterstart, 
             dest_folder = def_folder, output_level = def_output_level, output_frequency = def_output_frequency,
-            disabled_signatures = [], sourceFiles = [], signatures = None):
+            disabled_signatures = [], sourceFiles = [], signatures = None, blocksize = def_blocksize, memory_mapped = False,
+            processes = def_processes, core = def_core, writers = def_writers, alignment = def_alignment,
+            state_file = None, checkpoint_interval = def_checkpoint_interval, resume = False,
+            manifest = None, manifest_hash = None, virtual = False, dedup = None, source_workers = def_source_workers,
+            imaging = None):
         """
         Initialises a new ExecutionSettings Object
         
@@ -70,6 +139,21 @@ class ExecutionSettings:
         self.sourceFiles = sourceFiles
         self.number_sourcefiles = len(sourceFiles)
         self.signatures = signatures
+        self.blocksize = blocksize
+        self.memory_mapped = memory_mapped
+        self.processes = processes
+        self.core = core
+        self.writers = writers
+        self.alignment = alignment
+        self.state_file = state_file
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+        self.manifest = manifest
+        self.manifest_hash = manifest_hash
+        self.virtual = virtual
+        self.dedup = dedup
+        self.source_workers = source_workers
+        self.imaging = imaging
         
     def disableSignatureWithNames(self, names):
         """
@@ -89,6 +173,20 @@ class ExecutionSettings:
         @rtype: C{List} of Signatures
         """
         return self.signatures
+    
+    def getHashName(self):
+        """
+        Provides the hash algorithm for the content of written files.
+        
+        @return: Name of the hash algorithm (see C{hashlib}) - C{None} if neither the manifest nor the
+        deduplication requires hashes
+        @rtype: C{String}
+        """
+        if self.manifest_hash != None:
+            return self.manifest_hash
+        if self.dedup != None:
+            return def_dedup_hash
+        return None
         
     
 class ExecutionStatus:
@@ -109,6 +207,9 @@ class ExecutionStatus:
     @ivar endTimes: List of end times - each item represents the end time of one source file
     @ivar sum_per_sourcefile: List of found files (each item representing the number of found files for one source file
         and all signatures).
+    @ivar dedup_store: Hashes of the files written so far (see L{ExecutionSettings.dedup})
+    @ivar _lock: Lock synchronising updates and snapshots of the status
+    @ivar _listeners: Registered listeners - lists of listener, interval and time of the next progress event
     """
     def __init__(self, executionSettings):
         """
@@ -139,6 +240,10 @@ class ExecutionStatus:
         self.endTimes = []
         self.sum_per_sourcefile = []
         
+        self.dedup_store = DedupStore()
+        self._lock = threading.RLock()
+        self._listeners = []
+        
     def initialisedOne(self):
         """
         Call this function whenever execution for one source file has been initialised.
@@ -152,14 +257,20 @@ class ExecutionStatus:
         Call this function whenever the execution for one source file has been started.
         
         A new entry to the list L{sum_per_sourcefile} is added and the size as well as
-        the start time is applied to instance variables.
+        the start time is applied to instance variables. Listeners receive L{EVENT_STARTED}.
         
         @param size: Size of the source file in bytes.
         @type size: C{int}
         """
-        self.sum_per_sourcefile.append(0)
-        self.size = size
-        self.startTimes.append(time.time())
+        self._lock.acquire()
+        try:
+            self.sum_per_sourcefile.append(0)
+            self.size = size
+            self.progressWithinCurrent = 0
+            self.startTimes.append(time.time())
+        finally:
+            self._lock.release()
+        self._notify(EVENT_STARTED)
     
     def finishedOneSourceFile(self):
         """
@@ -167,36 +278,173 @@ class ExecutionStatus:
         
         Values for end time and number of finished files are applied to instance variables.
         L{file_start}, L{file_end} and L{counter} are reseted. The progress for the 
-        current file L{progressWithinCurrent} is set to filesize.
+        current file L{progressWithinCurrent} is set to filesize. Listeners receive L{EVENT_FINISHED}.
+        """
+        self._lock.acquire()
+        try:
+            self.progressWithinCurrent = self.size
+            self.endTimes.append(time.time())
+            self.file_start = None
+            self.file_end = None
+            self.finished += 1
+            self.result_eachfile.append(self.counter)
+            self.counter = {}
+        finally:
+            self._lock.release()
+        self._notify(EVENT_FINISHED)
+    
+    def addResultForSourceFile(self, size, counter, startTime, endTime):
         """
-        self.progressWithinCurrent = self.size
-        self.endTimes.append(time.time())
-        self.file_start = None
-        self.file_end = None
-        self.finished += 1
-        self.result_eachfile.append(self.counter)
-        self.counter = {}
+        Call this function for a source file examined with a status of its own (e.g. in another process).
+        
+        The results are applied as if the source file had been examined with this status; source files
+        have to be added in their order. Listeners receive L{EVENT_FINISHED}.
+        
+        @param size: Size of the examined part of the source file in bytes
+        @type size: C{int}
+        @param counter: Number of found files for each signature (C{None} if the source file could not be examined)
+        @type counter: C{Dict}
+        @param startTime: Start time for the source file
+        @type startTime: C{float}
+        @param endTime: End time for the source file
+        @type endTime: C{float}
+        """
+        if counter == None:
+            counter = {}
+        found = sum(counter.values())
+        self._lock.acquire()
+        try:
+            self.sum_per_sourcefile.append(found)
+            self.foundOverall += found
+            for name, number in counter.items():
+                self.counterr[name] = self.counterr.get(name, 0) + number
+            self.size = size
+            self.progressWithinCurrent = size
+            self.startTimes.append(startTime)
+            self.endTimes.append(endTime)
+            self.finished += 1
+            self.result_eachfile.append(dict(counter))
+        finally:
+            self._lock.release()
+        self._notify(EVENT_FINISHED)
     
     def updateFineshedForCurrent(self, bytes):
         """
         Call this function whenever there is up-to-date information about the progress within a source file.
         
+        Cheap enough for being called for each block examined; listeners receive L{EVENT_PROGRESS} 
+        not more often than requested by them.
+        
         @param bytes: Current position in the current source file in bytes.
         @type bytes: C{int}
         """
         self.progressWithinCurrent = bytes
+        if self._listeners:
+            self._notify(EVENT_PROGRESS)
     
-    def foundFile(self):
+    def foundFile(self, name = None, start = None, end = None):
         """
         Call this function whenever there is a new file found within a source file.
         
-        
         The values for files found for the current source file as well as for the overall
-        process are updated.
+        process are updated - if the signature is given, the counters for the signature as well.
+        Listeners receive L{EVENT_FOUND}.
+        
+        @param name: Name of the signature of the found file
+        @type name: C{String}
+        @param start: Position of the first byte of the found file in the source file
+        @type start: C{int}
+        @param end: Position of the last byte of the found file in the source file
+        @type end: C{int}
+        """
+        self._lock.acquire()
+        try:
+            self.sum_per_sourcefile[self.finished] += 1
+            self.foundOverall += 1
+            if name != None:
+                self.counter[name] += 1
+                self.counterr[name] += 1
+        finally:
+            self._lock.release()
+        if self._listeners:
+            self._notify(EVENT_FOUND, (name, start, end))
+
+    def addListener(self, listener, interval = def_event_interval):
+        """
+        Registers a listener for the events of this execution.
+        
+        The listener is called as C{listener(event, snapshot)} with the event (L{EVENT_STARTED},
+        L{EVENT_PROGRESS}, L{EVENT_FOUND}, L{EVENT_FINISHED}) and a L{StatusSnapshot}. Listeners
+        are called within the thread of the core; GUI listeners have to pass the snapshot to their
+        own thread (e.g. C{wx.CallAfter}).
+        
+        @param listener: Function to be called for each event
+        @type listener: C{function}
+        @param interval: Minimum number of seconds between two progress events for this listener
+        (0 for every update of the progress)
+        @type interval: C{float}
+        """
+        self._lock.acquire()
+        try:
+            self._listeners = self._listeners + [[listener, interval, 0]]
+        finally:
+            self._lock.release()
+    
+    def removeListener(self, listener):
+        """
+        Unregisters a listener (see L{addListener}).
+        
+        @param listener: Function registered before
+        @type listener: C{function}
         """
-        self.sum_per_sourcefile[self.finished] += 1
-        self.foundOverall += 1
-        return
+        self._lock.acquire()
+        try:
+            self._listeners = [x for x in self._listeners if x[0] != listener]
+        finally:
+            self._lock.release()
+    
+    def getSnapshot(self, hit = None):
+        """
+        Provides a consistent copy of the dynamic information of this execution.
+        
+        @param hit: Information about the file found last (see L{StatusSnapshot.hit})
+        @type hit: C{Tuple}
+        @return: Copy of the current status
+        @rtype: L{StatusSnapshot}
+        """
+        self._lock.acquire()
+        try:
+            return StatusSnapshot(self, hit)
+        finally:
+            self._lock.release()
+    
+    def _notify(self, event, hit = None):
+        """
+        Sends an event to the listeners - progress events only to those listeners whose interval has passed.
+        
+        An exception raised by a listener is reported and does not interrupt the execution.
+        
+        @param event: Event to be sent
+        @type event: C{int}
+        @param hit: Information about a found file for L{EVENT_FOUND}
+        @type hit: C{Tuple}
+        """
+        now = time.time()
+        due = []
+        for entry in self._listeners:
+            if event == EVENT_PROGRESS:
+                if now < entry[2]:
+                    continue
+                entry[2] = now + entry[1]
+            due.append(entry[0])
+        if due:
+            snapshot = self.getSnapshot(hit)
+            for listener in due:
+                try:
+                    listener(event, snapshot)
+                except Exception:
+                    print "Error in listener for the execution status:"
+                    traceback.print_exc()
 
     def getCurrentFile(self):
         """
@@ -301,3 +549,56 @@ class ExecutionStatus:
         @rtype: C{int}
         """
         return self.endTimes[number] - self.startTimes[number]
+
+
+class StatusSnapshot:
+    """
+    Consistent copy of the dynamic information of an execution (see L{ExecutionStatus.getSnapshot}).
+    
+    @ivar sourcefile: Name of the current source file (C{None} if all source files have been processed)
+    @ivar finished: Number of finshed source files
+    @ivar sourcefiles: Number of source files in total
+    @ivar size: Size of the current source file in bytes
+    @ivar progress: Progress within the current source file in bytes
+    @ivar elapsed: Elapsed time for the current source file in seconds
+    @ivar found: Number of found files in the current source file
+    @ivar foundOverall: Number of found files in total for all source files
+    @ivar counter: Dictionary with number of found files for the current source file (each entry one signature)
+    @ivar counterr: Dictionary with number of found files in total for all source files (each entry one signature)
+    @ivar hit: Name of the signature, start and end position of the file found last (only for 
+        L{EVENT_FOUND}, otherwise C{None})
+    """
+    def __init__(self, status, hit = None):
+        """
+        Copies the values from a status - the status has to be locked by the caller.
+        
+        @param status: Status to be copied
+        @type status: L{ExecutionStatus}
+        @param hit: Information about the file found last
+        @type hit: C{Tuple}
+        """
+        self.finished = status.finished
+        self.sourcefiles = len(status.settings.sourceFiles)
+        self.sourcefile = None
+        self.elapsed = 0
+        self.found = 0
+        if self.hasMoreSourceFiles():
+            self.sourcefile = status.getCurrentFile()
+            if len(status.startTimes) > status.finished:
+                self.elapsed = status.getCurrentElapsedTime()
+                self.found = status.getCurrentFound()
+        self.size = status.size
+        self.progress = status.progressWithinCurrent
+        self.foundOverall = status.foundOverall
+        self.counter = dict(status.counter)
+        self.counterr = dict(status.counterr)
+        self.hit = hit
+    
+    def hasMoreSourceFiles(self):
+        """
+        Checks, whether there were more source files to be processed at the time of the snapshot.
+        
+        @return: TRUE if more source files to be processed, otherwise FALSE
+        @rtype: Boolean
+        """
+        return self.finished < self.sourcefiles
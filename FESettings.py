@@ -89,6 +89,10 @@ DEFAULTS = {
             "ig_output_filename" : "fileextractor.img", 
             "output_dir" : "/tmp", 
             "ig_default_core" : "Linux", 
+            "ig_pipeline" : "yes", 
+            "ig_hashes" : "sha256", 
+            "ig_hash_segment" : "0", 
+            "scan_core" : "auto", 
             "naming_digits" : "5", 
             "command_sudo" : "gksudo --message 'This action requrires root priveliges - Please provide password!'"
 }
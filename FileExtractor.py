@@ -488,6 +488,8 @@ class FileExtractorFrame(wxFrame):
         else:
             settings = ExecutionSettings(disabled_signatures = dis_sigs, sourceFiles = sourceFiles, dest_folder=self.dest_folder,
                     signatures = signatures.getCopyOfAllSignauteres(), output_level = 0, output_frequency=10000)
+        if getSettings().getValue('scan_core'):
+            settings.core = getSettings().getValue('scan_core')
         progressDialog = ProgressDialog.ProgressDialog(self, -1, "Progress of Search",
                 settings)
 
@@ -511,6 +513,8 @@ class FileExtractorFrame(wxFrame):
                 type_string = "File end identified by File Size information"
             elif filesize_type == signatures.TYPE_MANUAL:
                 type_string = "File end identified by user specific function"
+            elif filesize_type == signatures.TYPE_CHUNKS:
+                type_string = "File end identified by walking the chunks of the file"
             dlg = wxMessageDialog(self, "Signature name: " + name + "\n"
                                 "File Extension: " + extension + "\n\n" +
                                 description + "\n" +
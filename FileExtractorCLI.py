@@ -21,10 +21,27 @@ along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 import FileExtractorCore
 import tools
 import signatures
+import signaturedb
 import sys
+import os
+import copy
+import glob
+import time
+import hashlib
+import itertools
+import multiprocessing
+import CarveManifest
 from ExecutionSettings import ExecutionSettings
 from ExecutionSettings import ExecutionStatus
 from ExecutionSettings import def_digits
+from ExecutionSettings import def_blocksize
+from ExecutionSettings import def_processes
+from ExecutionSettings import def_core
+from ExecutionSettings import def_writers
+from ExecutionSettings import def_alignment
+from ExecutionSettings import def_checkpoint_interval
+from ExecutionSettings import def_source_workers
+from ExecutionSettings import DEDUP_SKIP, DEDUP_LINK
 
 def usage(programname):
     """
@@ -33,7 +50,8 @@ def usage(programname):
     @param programname: Name of the program (usually first argument of the CLI argument list)
     """
     print ""
-    print "Usage: %s [-sX] [-eX] [-dX] [-nX] [-fS] [-o{1|2|3}] filename" %programname
+    print "Usage: %s [-sX] [-eX] [-dX] [-nX] [-fS] [-o{1|2|3}] [-bX] [-m] [-pX] [-cS] [-wX] [-aX] [-kS [-tX] [--resume]] [-rS [-hS] [-v]] [-uS] [-jX] filename [filename ...]" %programname
+    print "       %s -x [-fS] [-nX] [-dX] [-sX] [-eX] [-idS] [-rS [-hS]] [-uS] manifest" %programname
     print ""
     print "Parameters"
     print "\t-sX\tStart position inside file for searching (default 0)"
@@ -43,9 +61,28 @@ def usage(programname):
     print "\t-fS\tDestination folder for extracted files (default current directory)"
     print "\t-oX\tOutput level (1-progress; 2-percentage/occurences; 3-full debug) - (default 2)"
     print "\t-gX\tOutput frequency - depending on the size: filesize/X (default 100)"
+    print "\t-bX\tNumber of bytes to read from the source file at once (default %d)" %def_blocksize
+    print "\t-m\tAccess the source file memory mapped"
+    print "\t-pX\tNumber of processes examining the source file in parallel (default %d)" %def_processes
+    print "\t-cS\tCore for examining the source file: Python, Native or auto (default %s)" %def_core
+    print "\t-wX\tNumber of threads writing found files; 0 - write them while searching (default %d)" %def_writers
+    print "\t-aX\tLook up start sequences only at multiples of X bytes; 0 - cluster size of file system (default %d)" %def_alignment
+    print "\t-kS\tWrite checkpoints to state file S"
+    print "\t-tX\tSeconds between two checkpoints (default %d)" %def_checkpoint_interval
+    print "\t--resume\tContinue the execution from the checkpoint in the state file"
+    print "\t-rS\tWrite a record for each found file to manifest S (CSV if S ends with .csv, otherwise JSON lines)"
+    print "\t-hS\tHash algorithm for the content of found files in the manifest (e.g. md5, sha1)"
+    print "\t-v\tOnly record found files in the manifest - do not write them (index only)"
+    print "\t-uS\tFiles with the same content as a file written before: skip - remove them, link - hard link them"
+    print "\t-jX\tNumber of source files examined in parallel (default %d)" %def_source_workers
+    print "\t-x\tExtract the files recorded in a manifest (starting at -sX and before -eX; not disabled by -idS)"
+    print "\tfilename\tSource file - several source files, patterns (e.g. *.img) and lists of source files"
+    print "\t\t(@S - one name per line) may be given; for more than one source file, the files found in each"
+    print "\t\tsource file are written into a folder of their own and -sX / -eX apply to each source file"
     print "\t-iY\tSignature operations"
     print "\t\t-is\tShow available signaturs"
     print "\t\t-idS\tDisable Signature with name S"
+    print "\t\t-ilS\tLoad signatures from signature database in folder S"
     print ""
 
 def handleArguments(args):
@@ -58,7 +95,8 @@ def handleArguments(args):
     
     @param args: List of arguments to be processed (usually the CLI arguments list)
     @return: Info about success: 0 - not successful, 1 - Signature information is requested,
-    2 - successful; The settings applied to the Settings / Status instances
+    2 - successful, 3 - files shall be extracted from a manifest (the "source file");
+    The settings applied to the Settings / Status instances
     @rtype: C{int}; L{ExecutionStatus}
     """
     if len(args) < 2:
@@ -67,10 +105,13 @@ def handleArguments(args):
     settings = ExecutionSettings(signatures = signatures.getCopyOfAllSignauteres())
     status = ExecutionStatus(settings)
     disabled_signs = []
+    extract = 0
     for arg in args:
-        if arg[0] != '-':
+        if arg == '' or arg[0] != '-':
             continue
-        if arg[1] == 's':
+        if arg == '--resume':
+            settings.resume = True
+        elif arg[1] == 's':
             status.file_start = int(arg[2:])
         elif arg[1] == 'e':
             status.file_end = int(arg[2:])
@@ -84,20 +125,108 @@ def handleArguments(args):
             settings.output_level = int(arg[2:])
         elif arg[1] =='g':
             settings.output_frequency = int(arg[2:])
+        elif arg[1] == 'b':
+            settings.blocksize = int(arg[2:])
+        elif arg[1] == 'm':
+            settings.memory_mapped = True
+        elif arg[1] == 'p':
+            settings.processes = int(arg[2:])
+        elif arg[1] == 'c':
+            settings.core = arg[2:]
+        elif arg[1] == 'w':
+            settings.writers = int(arg[2:])
+        elif arg[1] == 'a':
+            settings.alignment = int(arg[2:])
+        elif arg[1] == 'k':
+            settings.state_file = arg[2:]
+        elif arg[1] == 't':
+            settings.checkpoint_interval = int(arg[2:])
+        elif arg[1] == 'r':
+            settings.manifest = arg[2:]
+        elif arg[1] == 'h':
+            settings.manifest_hash = arg[2:]
+        elif arg[1] == 'v':
+            settings.virtual = True
+        elif arg[1] == 'u':
+            settings.dedup = arg[2:]
+        elif arg[1] == 'j':
+            settings.source_workers = int(arg[2:])
+        elif arg[1] == 'x':
+            extract = 1
         elif arg[1] =='i':
             if arg[2] == 's':
                 return 1, status
             elif arg[2] == 'd':
                 disabled_signs.append(arg[3:])
+            elif arg[2] == 'l':
+                loaded = signaturedb.loadDatabase(arg[3:])
+                if loaded == None:
+                    return 0, None
+                signaturedb.addSignatures(settings.signatures, loaded)
             else:
                 print ('Unrecognised option for Signature operations: %c [Ignored]' %(arg[2]))
         else:
             print ('Unrecognised option: %c [Ignored]' %(arg[1]))
+    if settings.resume and settings.state_file == None:
+        print ('Resuming requires a state file (-kS)')
+        return 0, None
+    if settings.virtual and (settings.manifest == None or extract):
+        print ('Index only requires a manifest (-rS) and cannot be combined with extracting (-x)')
+        return 0, None
+    if settings.dedup != None and settings.dedup not in [DEDUP_SKIP, DEDUP_LINK]:
+        print ('Unknown handling of duplicates: %s' %(settings.dedup))
+        return 0, None
+    if settings.manifest_hash != None:
+        if settings.manifest == None:
+            print ('Hashes are only written to a manifest (-rS)')
+            return 0, None
+        try:
+            hashlib.new(settings.manifest_hash)
+        except ValueError:
+            print ('Unknown hash algorithm: %s' %(settings.manifest_hash))
+            return 0, None
     settings.dest_folder = tools.checkDestfolder(settings.dest_folder)
-    settings.sourceFiles.append(args[len(args)-1])
+    settings.sourceFiles = expandSourceFiles([arg for arg in args[1:] if arg != '' and arg[0] != '-'])
+    if settings.sourceFiles == None:
+        return 0, None
+    if not settings.sourceFiles:
+        settings.sourceFiles = [args[len(args)-1]]
+    settings.number_sourcefiles = len(settings.sourceFiles)
     settings.disableSignatureWithNames(disabled_signs)
+    if extract:
+        return 3, status
     return 2, status
 
+def expandSourceFiles(names):
+    """
+    Determines the source files from the file names given on the command line.
+    
+    Patterns are expanded (in sorted order; patterns not matching any file are kept as they are); names
+    starting with @ denote list files containing one source file per line.
+    
+    @param names: File names given on the command line
+    @type names: C{List} of C{String}
+    @return: C{None} if a list file cannot be read, otherwise the source files
+    @rtype: C{List} of C{String}
+    """
+    sources = []
+    for name in names:
+        if name[0] == '@':
+            try:
+                listfile = open(name[1:], 'r')
+                try:
+                    sources.extend([line.strip() for line in listfile if line.strip()])
+                finally:
+                    listfile.close()
+            except EnvironmentError, msg:
+                print ('List of source files cannot be read: %s' %(msg))
+                return None
+        else:
+            matches = glob.glob(name)
+            matches.sort()
+            sources.extend(matches or [name])
+    return sources
+
 def printHeader(status):
     """
     Display information about the settings for the current application execution on standard sutput.
@@ -140,6 +269,169 @@ def printResults(signs, counter, time_passed):
         print ('\t%s\t: %d File(s)' %(sig[signatures.name], counter[sig[signatures.name]]))
     print ('Overall processing time: %f seconds' %time_passed)
 
+def extractFromManifest(status):
+    """
+    Extracts the files recorded in a manifest (see L{CarveManifest.extractRecords}) and displays the results.
+    
+    @param status: Information container for the extraction - the manifest is given as source file.
+    @type status: L{ExecutionStatus}
+    """
+    starttime = time.time()
+    records = CarveManifest.readManifest(status.getCurrentFile())
+    if records == None:
+        return
+    manifest = None
+    if status.settings.manifest != None:
+        manifest = CarveManifest.CarveManifest(status.settings.manifest, status.settings.manifest_hash)
+    try:
+        counter = CarveManifest.extractRecords(records, status, manifest)
+    finally:
+        if manifest != None:
+            manifest.close()
+    print ('\nExtracted %d of %d recorded files:' %(sum(counter.values()), len(records)))
+    for name in sorted(counter.keys()):
+        print ('\t%s\t: %d File(s)' %(name, counter[name]))
+    print ('Overall processing time: %f seconds' %(time.time() - starttime))
+
+def searchSourceFiles(status):
+    """
+    Examines several source files - in parallel by L{ExecutionSettings.source_workers} processes.
+    
+    Each source file is examined with a copy of the settings (see L{_searchSourceFile}); the files found in
+    a source file are written into a folder of their own, so that their names never collide. The results of
+    the source files are applied to the status in the order of the source files (see 
+    L{ExecutionStatus.addResultForSourceFile}); finally, the manifests of the source files are joined in this order.
+    Duplicates are resolved across the source files in the same order (see L{_resolveDuplicates}), so
+    that a file is kept only in the first source file containing it.
+    
+    @param status: Information container for the execution - all source files are given in its settings.
+    @type status: L{ExecutionStatus}
+    """
+    settings = status.settings
+    jobs = [(settings, number, status.file_start, status.file_end) for number in range(len(settings.sourceFiles))]
+    pool = None
+    if settings.source_workers > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(min(settings.source_workers, len(jobs)))
+        results = pool.imap(_searchSourceFile, jobs)
+    else:
+        results = itertools.imap(_searchSourceFile, jobs)
+    starttime = time.time()
+    duplicates = {}
+    try:
+        for number, size, counter, started, finished, files in results:
+            status.addResultForSourceFile(size, counter, started, finished)
+            if files:
+                _resolveDuplicates(status, files, duplicates)
+            if counter == None:
+                print ('Source file %d / %d: %s - not examined' %(number + 1, len(jobs), settings.sourceFiles[number]))
+            else:
+                print ('Source file %d / %d: %s - %d File(s) in %f seconds' %(number + 1, len(jobs), 
+                    settings.sourceFiles[number], sum(counter.values()), finished - started))
+    finally:
+        if pool != None:
+            pool.terminate()
+            pool.join()
+    # parts of interrupted executions are kept for resuming
+    if settings.manifest != None:
+        CarveManifest.joinManifests(settings.manifest, [_partName(settings.manifest, number) for number in range(len(jobs))],
+            duplicates)
+    signs = [sig for sig in settings.signatures if sig[signatures.name] not in settings.disabled_signatures]
+    printResults(signs, status.counterr, time.time() - starttime)
+
+def _resolveDuplicates(status, files, duplicates):
+    """
+    Resolves the duplicates of the files kept for one source file against the source files before.
+
+    Each source file is deduplicated on its own (see L{tools.resolveDuplicate}); a kept file, whose
+    content has been kept for a source file before, is removed or hard linked to the file kept
+    before - in the latter case along with the links to it within its source file.
+
+    @param status: Status of the execution - its hashes are shared by all source files
+    @type status: L{ExecutionStatus}
+    @param files: Name of the file kept for each hash within the source file (see L{DedupStore.getState})
+    @type files: C{Dict}
+    @param duplicates: Resolved files - the name of each file mapped to its new name (C{None} if removed)
+    and the name of the file with the same content kept before; updated here
+    @type duplicates: C{Dict}
+    """
+    link = status.settings.dedup == DEDUP_LINK and hasattr(os, 'link')
+    links = None
+    for digest, filename in sorted(files.items()):
+        original = status.dedup_store.register(digest, filename)
+        if original == None:
+            continue
+        if not link:
+            os.remove(filename)
+            duplicates[filename] = (None, original)
+            continue
+        if links == None:
+            links = {}
+            folder = os.path.dirname(filename)
+            for name in os.listdir(folder):
+                stat = os.stat(os.path.join(folder, name))
+                links.setdefault((stat.st_dev, stat.st_ino), []).append(os.path.join(folder, name))
+        stat = os.stat(filename)
+        for name in links.get((stat.st_dev, stat.st_ino), [filename]):
+            os.remove(name)
+            os.link(original, name)
+        duplicates[filename] = (filename, original)
+
+def _partName(filename, number):
+    """
+    Provides the name of the part of a file (manifest, state file) belonging to one of several source files.
+    """
+    return '%s.%d' %(filename, number + 1)
+
+def _searchSourceFile(job):
+    """
+    Examines one of several source files (see L{searchSourceFiles}) - in a worker process or in this process.
+    
+    The files found are written into the folder C{<number>_<name of source file>} inside the destination folder;
+    manifest and state file get the number of the source file as suffix. Worker processes produce no output
+    and do not start processes of their own.
+    
+    @param job: Settings of the execution, running number of the source file, range to be examined
+    @type job: C{Tuple}
+    @return: Running number and size of the source file, number of found files for each signature (C{None}
+    if the source file could not be examined), start and end time, name of the file kept for each hash
+    (C{None} without deduplication)
+    @rtype: C{Tuple}
+    """
+    settings, number, file_start, file_end = job
+    settings = copy.copy(settings)
+    settings.signatures = copy.deepcopy(settings.signatures)
+    settings.disabled_signatures = list(settings.disabled_signatures)
+    filename = settings.sourceFiles[number]
+    settings.sourceFiles = [filename]
+    settings.number_sourcefiles = 1
+    settings.dest_folder = tools.checkDestfolder(os.path.join(settings.dest_folder,
+        '%03d_%s' %(number + 1, os.path.basename(filename))))
+    if settings.manifest != None:
+        settings.manifest = _partName(settings.manifest, number)
+    if settings.state_file != None:
+        settings.state_file = _partName(settings.state_file, number)
+    if multiprocessing.current_process().daemon:
+        settings.output_level = 0
+        settings.processes = 1
+    status = ExecutionStatus(settings)
+    status.file_start = file_start
+    status.file_end = file_end
+    started = time.time()
+    try:
+        if not os.path.isdir(settings.dest_folder):
+            os.makedirs(settings.dest_folder)
+        core = tools.determineScanCore(settings.core)
+        if core.init(status) < 0:
+            return number, 0, None, started, time.time(), None
+        core.startSearch(status)
+    except EnvironmentError, msg:
+        print ('Error for %s: %s' %(filename, msg))
+        return number, 0, None, started, time.time(), None
+    files = None
+    if settings.dedup != None:
+        files = status.dedup_store.getState()
+    return number, status.size, status.result_eachfile[0], status.startTimes[0], status.endTimes[0], files
+
 def startCLI(argv):
     """
     Starts the CLI application
@@ -158,11 +450,24 @@ def startCLI(argv):
         signatures.printSignatures(status.settings.getActiveSignatures())
         sys.exit()
     
-    if FileExtractorCore.init(status) < 0:
+    if ret == 3:
+        extractFromManifest(status)
+        sys.exit()
+    
+    core = tools.determineScanCore(status.settings.core)
+    if core == None:
+        print ('Core not available: %s' %(status.settings.core))
+        sys.exit()
+    
+    if len(status.settings.sourceFiles) > 1:
+        searchSourceFiles(status)
+        sys.exit()
+    
+    if core.init(status) < 0:
         sys.exit()
 
     printHeader(status)
-    signs, counter = FileExtractorCore.startSearch(status)
+    signs, counter = core.startSearch(status)
     printResults(signs, counter, status.getRunTimeForNumber(0))
     
 if __name__ == "__main__":
@@ -12,11 +12,13 @@ the information for source file names etc. may be applied. (see module L{Executi
 details. Afterwards, an L{ExecutionSettings.ExecutionStatus} instance has to be created - the core 
 will use it to put up-to-date information about the execution in there. Pass the status instance
 to the core. (In order to take advantage of the status object you have to run the core in a seperate 
-thread). Use a timer and look for changes in the status object frequently.
+thread). Register a listener with the status object in order to be notified about changes
+(see L{ExecutionSettings.ExecutionStatus.addListener}).
 
 The core handles exactly one source file. The iteration over a list of source files has to
 be performed by the calling frontend. However, the status object is handled in a way,
-that overall information for all source files are contained.
+that overall information for all source files are contained. One source file may be
+examined by several processes in parallel (see L{ExecutionSettings.ExecutionSettings.processes}).
 
 FileExtractor is free software: you can redistribute it and/or modify
 it under the terms of the GNU General Public License as published by
@@ -34,22 +36,56 @@ along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 
 @var maxlength: For internal processing - Indicates the maximum length for sequences in signatures (both
 start and end sequences) - important for prefetching characters from the source files.)
-@var start: For internal processing - Remembers, which file types have been started currently. This way
+@var start: For internal processing - Remembers, which file types have been started currently (position of the
+started file or -1 for each active signature, indexed as L{compiled}). This way
 files may even be identified when they are stored within other files. (such as thumbnails) However, it
 is not possible to find a file inside a file if both are of the same type.
-@var skipped: For internal processing - some file types (end type 1) need skipping of end sequences. This dictionary
-is responsible for remebering the skipped end sequences for all file types.
+@var skipped: For internal processing - some file types (end type 1) need skipping of end sequences. This list
+is responsible for remebering the skipped end sequences for all file types (indexed as L{compiled}).
+@var compiled: For internal processing - Compiled representation of the active signatures (see
+L{signatures.CompiledSignature}) in the order of L{ExecutionSettings.ExecutionSettings.signatures}.
 @var size: Size of the current source file.
-@var binfile: Reference to the current source file descriptor.
+@var binfile: Reference to the current source file descriptor (or a memory map of it, see
+L{ExecutionSettings.ExecutionSettings.memory_mapped}).
+@var matcher: For internal processing - Matcher compiled from all start and end sequences of the active
+signatures; the identifier for each sequence is a tuple (index of signature, 0 for start / 1 for end sequence).
+@var sequences: For internal processing - Sequences the matcher was compiled from (required for
+cores examining the source file themselves).
+@var alignment: For internal processing - Start sequences are only looked up at positions M{alignment_offset +
+k * alignment} (see L{ExecutionSettings.ExecutionSettings.alignment}).
+@var alignment_offset: For internal processing - First aligned position within the source file.
+@var aligned: For internal processing - Indicates for each of the L{sequences}, whether it is only looked up at
+aligned positions.
+@var checkpoint_time: For internal processing - Time the next checkpoint is due at (see
+L{ExecutionSettings.ExecutionSettings.state_file}).
+@var STATE_VERSION: Version of the format of state files
+@type STATE_VERSION: C{int}
+@var writer: For internal processing - Writer threads for found files (C{None} if found files are written
+by the core itself - see L{ExecutionSettings.ExecutionSettings.writers}).
+@var output_step: For internal processing - Number of bytes between two progress messages on standard out
+(see L{ExecutionSettings.ExecutionSettings.output_frequency}).
+@var output_next: For internal processing - Progress the next progress message on standard out is due at.
+@var manifest: For internal processing - Manifest the found files are recorded in (C{None} if no manifest is
+written - see L{ExecutionSettings.ExecutionSettings.manifest}).
+@var manifest_size: For internal processing - Size of the manifest at the checkpoint the execution is resumed from
+(C{None} if not resumed).
 """
 import struct
+import zlib
 import os.path
+import multiprocessing
 import signatures
-from tools import checkString
+import signaturedb
+import ExecutionSettings
+import bootsector
 from tools import writeFile
+from CarveWriter import CarveWriter
+import CarveManifest
 import tools
 import time
 
+STATE_VERSION = 1
+
 def getAvailableSignatures():
     """
     Forwards the request for available signatures to the signatures module. Normalises
@@ -68,176 +104,552 @@ def init(status_passed):
     Initalises the core for execution for one source file
     
     Variables for maximal signature sequence length, found start sequences,
-    counters are reseted and the source file is opened. The status instance
+    counters are reseted and the source file is opened. If requested, the source file is
+    memory mapped; if this is not possible (e.g. empty files or files too large for the address
+    space) the source file is read conventionally. The status instance
     is updated and informed about the success of intialisation.
     
     @param status_passed: Status instance containing all information for the current execution.
     @type status_passed: ExecutionSettings.ExecutionStatus
     
-    @return: Indicates, whether the initialisation was sucessful. (-1 / -2 for problems with signature file; 0 for success)
+    @return: Indicates, whether the initialisation was sucessful. (-1 / -2 for problems with signature file;
+    -3 for a state file not matching the execution; -4 for an index-only execution without manifest; 0 for success)
     @rtype: C{int}
     """
-    global maxlength, start, skipped, size, binfile
+    global maxlength, start, skipped, size, binfile, matcher, sequences, compiled
+    global alignment, alignment_offset, aligned, manifest_size
     
     status = status_passed
     settings = status.settings
+    if settings.virtual and settings.manifest == None:
+        print ('Index-only execution requires a manifest')
+        return -4
 
     settings.dest_folder = tools.checkDestfolder(settings.dest_folder)
     
     binfilename = status.getCurrentFile()
-    binfile = open(binfilename, 'rb')
+    binfile = tools.openSourceFile(binfilename, settings.memory_mapped, settings.output_level == 3, settings.imaging)
 
     if status.file_start == None:
         status.file_start = 0
-    if status.file_end == None or status.file_end > os.path.getsize(binfilename):
-        status.file_end = os.path.getsize(binfilename)
+    if status.file_end == None or status.file_end > tools.getOpenFileSize(binfile):
+        status.file_end = tools.getOpenFileSize(binfile)
 
     counter = status.counter
     counterr = status.counterr   # for continue counting
-    start = {}
-    skipped = {}
 
     for j in settings.signatures:
         counter[j[signatures.name]] = 0
-        start[j[signatures.name]] = -1
-        skipped[j[signatures.name]] = 0
+        if not counterr.has_key(j[signatures.name]):
+            counterr[j[signatures.name]] = 0
     
 
     size = status.file_end - status.file_start
-    maxlength = signatures.normaliseSignatures(settings.signatures)
+    # disabled ones first - the compiled signatures are indexed as the active ones
+    disabled = signatures.disable(settings.signatures, settings.disabled_signatures)
+    compiled = []
+    maxlength = signatures.normaliseSignatures(settings.signatures, compiled)
     if maxlength == -1:
         print ('Error in Signature File - required Entry missing in at least one signature')
         return -1
     if maxlength == -2:
         print ('Error in Signature File - wrong value for at least one signature')
         return -2
-    disabled = signatures.disable(settings.signatures, settings.disabled_signatures)
+    start = [-1] * len(compiled)
+    skipped = [0] * len(compiled)
+    
+    sequences = []
+    for sig in compiled:
+        sequences.append((sig.start_seq, (sig.index, 0)))
+        if sig.type == signatures.TYPE_END_SEQUENCE:
+            sequences.append((sig.end_seq, (sig.index, 1)))
+    alignment, alignment_offset = settings.alignment, 0
+    if alignment < 1:
+        detected = bootsector.detectAlignment(binfile, status.file_start)
+        if detected == None:
+            detected = (bootsector.SECTOR_SIZE, status.file_start)
+            if settings.output_level == 3:
+                print ('No file system recognised - start sequences are looked up at sectors')
+        alignment, alignment_offset = detected
+        if settings.output_level == 3:
+            print ('Start sequences are looked up at multiples of %d bytes from 0x%x' %(alignment, alignment_offset))
+    aligned = [alignment > 1 and kind == 0 for seq, (index, kind) in sequences]
+    matcher = signaturedb.getMatcher(sequences, alignment, alignment_offset, aligned)
+    manifest_size = None
+    if settings.resume and settings.state_file != None:
+        if _restoreCheckpoint(status, binfilename) < 0:
+            return -3
+        size = status.file_end - status.file_start
     status.initialisedOne()
     return 0
 
+def _restoreCheckpoint(status, binfilename):
+    """
+    Restores the state of an interrupted execution from the state file (see L{_writeCheckpoint}).
+    
+    The source file is examined from the position of the last checkpoint on; files started before are
+    continued and the numbering of found files is continued as well.
+    
+    @param status: Status instance of the current execution
+    @type status: ExecutionSettings.ExecutionStatus
+    @param binfilename: Name of the source file
+    @type binfilename: C{String}
+    @return: 0 if restored (or no state file available), -1 if the state file does not match the execution
+    @rtype: C{int}
+    """
+    global manifest_size
+    state = tools.loadPickle(status.settings.state_file)
+    if state == None:
+        print ('No checkpoint found in %s - starting from the beginning' %(status.settings.state_file))
+        return 0
+    if not isinstance(state, dict) or state.get('version') != STATE_VERSION or \
+            state['source'] != os.path.abspath(binfilename) or state['end'] != status.file_end or \
+            state['signatures'] != [sig.name for sig in compiled]:
+        print ('State file %s does not match this execution (source file, range or signatures)' %(status.settings.state_file))
+        return -1
+    status.file_start = state['position']
+    start[:] = state['start']
+    skipped[:] = state['skipped']
+    status.counter.update(state['counter'])
+    status.counterr.update(state['counterr'])
+    status.dedup_store.setState(state.get('dedup', {}))
+    manifest_size = state.get('manifest')
+    if status.settings.output_level == 3:
+        print ('Resuming at 0x%x' %(status.file_start))
+    return 0
+
     
-def startSearch(status_passed):
+def startSearch(status_passed, blocks = None):
     """
     Invokes the search on the file.
     
-    Central bit of the core - examines the source file byte by byte and checks against the
+    Central bit of the core - examines the source file and checks against the
     provided start sequences of files (provided by the signatures). Ones, a start sequence
     has been found, the further actions depend on the type of signature (in fact, how the end
     of the file is identified - by end sequence, file size info inside file or manual by
     additional module).
     
-    The status object is constantly updated. The frequency of updating the status instance with
-    progress within a source file depends on the value in the settings instance (
-    ExecutionSettings.ExecutionSettings.output_frequency) In fact, this variable says how often
-    a message shall be sent to the status object in total for the current source file.
+    The source file is examined block by block, either in this process (see L{_candidateBlocks}) or
+    by several worker processes (see L{_shardedCandidateBlocks}). Within one block all candidate positions
+    for start and end sequences are looked up at once (see L{MultiMatcher.MultiMatcher}) and afterwards
+    processed in the order of their position in the source file (see L{_processCandidates}). This way,
+    the results are exactly the same as when going through the file byte by byte. Other
+    cores may examine the source file themselves and only pass the candidates found (see
+    L{FileExtractorCoreNew}).
+    
+    The status object is updated after each block; it notifies its listeners about the progress
+    (see L{ExecutionSettings.ExecutionStatus.addListener}). Progress messages on standard out are
+    printed by such a listener as well (see L{_printProgress}).
     
     @param status_passed: Reference to the status instance for applying runtime information and
     gaining settings for the running.
     @type status_passed: ExecutionSettings.ExecutionStatus
+    @param blocks: Tuples (next position to be examined, candidates found in front of it) for all
+    blocks of the source file - if C{None} the source file is examined by this module
+    @type blocks: Iterable
     return: Active Signatures; Overall Counter
     rtype: C{List} of C{Signatures}; C{int}
     """
-    global binfile, start, skipped, size, maxlength
-    global status
+    global binfile, start, skipped, size, maxlength, matcher
+    global status, writer, manifest, checkpoint_time, output_step, output_next
     status= status_passed
-    st = binfile.read(maxlength-1)
 
-    dx = size / status.settings.output_frequency           # for user output only
-    x = dx                                  # same here    
+    output_step = size / status.settings.output_frequency   # for user output only
+    if output_step < 1:
+        output_step = 1
+    output_next = output_step
+    if status.settings.output_level > 0:
+        status.addListener(_printProgress, 0)
     
-    file_pos = binfile.tell()
     status.startedOneSourceFile(size)
     
-    while 1:
-        c = ''
-        if file_pos < status.file_end:
-            c = binfile.read(1)
-        file_pos = binfile.tell()
-        if c!='':               # end of file
-            st += c
-    
-        if file_pos-status.file_start >= x:
-            status.updateFineshedForCurrent(file_pos-status.file_start)
-            
-            if status.settings.output_level == 0:
-                pass  
-            elif status.settings.output_level == 3 and size!=0:
-                print "Pos: 0x%x - %d / %d KB (%d %%)" %(file_pos, (file_pos-status.file_start)  / 1024 , size / 1024, (file_pos-status.file_start)*100/size)
-            elif status.settings.output_level == 2:
-                print "%d %%" %((file_pos-status.file_start)*100/size)
-            elif status.settings.output_level == 1:
-                print '#' ,
-            x += dx
-            
-        for sig in status.settings.signatures:
-            if start[sig[signatures.name]] == -1:
-                if sig[signatures.start_seq][0] == ord(st[0]):
-                    if checkString(st, sig[signatures.start_seq]):
-                        start_pos = file_pos-len(st)
-                        if status.settings.output_level == 3:
-                            print ('Found start at 0x%x for %s' %(start_pos, sig[signatures.description]))
-                        if sig[signatures.filesize_type] == signatures.TYPE_FILE_SIZE:
-                            offsets = sig[signatures.filesize_address_offsets]
-                            ofs = 0
-                            for i in offsets:
-                                binfile.seek(start_pos + i)
-                                val = ord(binfile.read(1))
-                                ofs = ofs * 256 + val
-                            end_pos = start_pos + ofs
-                            correction = sig[signatures.filesize_info_correction]
-                            end_pos = end_pos + correction
-                            writeFile(sig[signatures.name],status.counterr[sig[signatures.name]]+status.settings.counterstart_global,
-                                  sig[signatures.extension],binfile, start_pos, end_pos-1,
-                                  status.settings.dest_folder, status.settings.output_level == 3, status)
-                            status.counter[sig[signatures.name]] += 1
-                            status.counterr[sig[signatures.name]] += 1
-                            status.foundFile()
-                            binfile.seek(file_pos)
-                        elif sig[signatures.filesize_type] == signatures.TYPE_MANUAL:
-                            function = sig[signatures.filesizemanual_functionname]
-                            if status.settings.output_level == 3:
-                                print ('-- Enter signature defined function for end address determination for this file')
-                            end_address = function(binfile, start_pos, status.settings.output_level == 3)
-                            if (end_address < start_pos):
-                                if status.settings.output_level == 3:
-                                    print ('-- No valid end address found - skip this file.')
-                                continue
-                            writeFile(sig[signatures.name],status.counterr[sig[signatures.name]]+status.settings.counterstart_global,
-                                  sig[signatures.extension],binfile, start_pos, end_address,
-                                  status.settings.dest_folder, status.settings.output_level == 3, status)
-                            status.counter[sig[signatures.name]] += 1   
-                            status.counterr[sig[signatures.name]] += 1   
-                            status.foundFile()
-                            binfile.seek(file_pos)
-                        else:
-                            start[sig[signatures.name]] = start_pos
-            else:
-                if file_pos < start[sig[signatures.name]] + len(sig[signatures.start_seq]):
-                    continue
-                if sig[signatures.end_seq][0] == ord(st[0]):
-                    if tools.checkString(st, sig[signatures.end_seq]):
-                        end_pos = file_pos-len(st)+len(sig[signatures.end_seq])-1
-                        if skipped[sig[signatures.name]] < sig[signatures.skip_end_seqs]:
-                            skipped[sig[signatures.name]] +=1
-                            if status.settings.output_level == 3:
-                                print ('Found end at 0x%x for %s - skipped' %(end_pos, sig[signatures.description]))
-                            continue
-                        if status.settings.output_level == 3:
-                            print ('Found end at 0x%x for %s' %(end_pos, sig[signatures.description]))
-                        writeFile(sig[signatures.name],status.counterr[sig[signatures.name]]+status.settings.counterstart_global,
-                                sig[signatures.extension],binfile, start[sig[signatures.name]], end_pos,
-                                status.settings.dest_folder, status.settings.output_level == 3, status)
-                        start[sig[signatures.name]] = -1
-                        status.counter[sig[signatures.name]] += 1
-                        status.counterr[sig[signatures.name]] += 1
-                        status.foundFile()
-                        skipped[sig[signatures.name]] = 0
-            
-        if len(st)==1:
-            break
-        st = st[1:]
+    if blocks == None:
+        if status.settings.processes > 1 and size > status.settings.blocksize and status.settings.imaging == None:
+            blocks = _shardedCandidateBlocks()
+        else:
+            blocks = _candidateBlocks()
+    manifest = None
+    if status.settings.manifest != None:
+        # records of previous source files or of the execution resumed are kept
+        manifest = CarveManifest.CarveManifest(status.settings.manifest, status.settings.manifest_hash,
+            status.finished > 0 or manifest_size != None, manifest_size)
+    writer = None
+    if status.settings.writers > 0 and not status.settings.virtual:
+        writer = CarveWriter(status.getCurrentFile(), status.settings.writers, status, manifest)
+    checkpoint_time = time.time() + status.settings.checkpoint_interval
+    try:
+        for pos, candidates in blocks:
+            _processCandidates(candidates)
+            if status.settings.state_file != None and time.time() >= checkpoint_time:
+                _writeCheckpoint(pos)
+            status.updateFineshedForCurrent(pos-status.file_start)
+    finally:
+        if writer != None:
+            writer.close()
+            writer = None
+        if manifest != None:
+            manifest.close()
+            manifest = None
+        status.removeListener(_printProgress)
+    if status.settings.state_file != None:
+        _writeCheckpoint(status.file_end)
     
     status.finishedOneSourceFile()
     binfile.close()
     return status.settings.signatures, status.counterr
+
+def _printProgress(event, snapshot):
+    """
+    Listener printing the progress to standard out (see L{ExecutionSettings.ExecutionStatus.addListener}).
+    
+    A message is printed whenever the progress has passed the next step (L{output_step}); the
+    kind of message depends on the output level (see L{ExecutionSettings.ExecutionSettings.output_level}).
     
+    @param event: Event sent by the status
+    @type event: C{int}
+    @param snapshot: Status at the time of the event
+    @type snapshot: L{ExecutionSettings.StatusSnapshot}
+    """
+    global output_next
+    done = snapshot.progress
+    if event != ExecutionSettings.EVENT_PROGRESS or done < output_next:
+        return
+    if status.settings.output_level == 3 and size!=0:
+        print "Pos: 0x%x - %d / %d KB (%d %%)" %(status.file_start + done, done  / 1024 , size / 1024, done*100/size)
+    elif status.settings.output_level == 2:
+        print "%d %%" %(done*100/size)
+    elif status.settings.output_level == 1:
+        print '#' ,
+    while output_next <= done:
+        output_next += output_step
+
+def _writeCheckpoint(pos):
+    """
+    Writes the state of the execution to the state file.
+    
+    All candidates in front of the given position have been processed; all files found so far
+    are written before (see L{CarveWriter.CarveWriter.flush}) and so are their records in the manifest. Hence, an execution continued from
+    this state (see L{_restoreCheckpoint}) delivers exactly the same files as an uninterrupted one.
+    A checkpoint, which cannot be written, is skipped.
+    
+    @param pos: Position in the source file the execution may be continued at
+    @type pos: C{int}
+    """
+    global checkpoint_time
+    if writer != None:
+        writer.flush()
+    state = {'version': STATE_VERSION, 'source': os.path.abspath(status.getCurrentFile()),
+        'end': status.file_end, 'position': pos, 'signatures': [sig.name for sig in compiled],
+        'start': start, 'skipped': skipped, 'counter': status.counter, 'counterr': status.counterr,
+        'dedup': status.dedup_store.getState()}
+    if manifest != None:
+        state['manifest'] = manifest.flush()
+    try:
+        tools.savePickle(status.settings.state_file, state)
+    except EnvironmentError, msg:
+        print ('Checkpoint could not be written: %s' %(msg))
+    checkpoint_time = time.time() + status.settings.checkpoint_interval
+
+def _candidateBlocks():
+    """
+    Examines the source file block by block in this process.
+    
+    The source file is read in blocks of L{ExecutionSettings.ExecutionSettings.blocksize} bytes
+    (aligned to multiples of the block size within the source file). The last M{maxlength - 1} bytes
+    of each block are carried over to the next one, so that sequences spanning two blocks are found
+    as well. Memory mapped source files are not read at all; the map is examined in ranges of
+    the block size directly.
+    
+    @return: Generator for tuples (next position to be examined, candidates found in front of it -
+    see L{_processCandidates})
+    @rtype: C{Generator}
+    """
+    blocksize = status.settings.blocksize
+    mapped = tools.isMapped(binfile)
+    pos = status.file_start                 # next position to be examined
+    read_pos = status.file_start            # next position to be read from the source file
+    data = ''
+    while pos < status.file_end:
+        toread = blocksize - read_pos % blocksize
+        if toread > status.file_end - read_pos:
+            toread = status.file_end - read_pos
+        if mapped:
+            read_pos += toread
+            candidates = matcher.find(binfile, 0, pos, read_pos, status.file_end)
+            pos = read_pos
+        else:
+            carry = read_pos - pos          # bytes read already but not examined yet
+            binfile.seek(read_pos)
+            block = binfile.read(toread)
+            read_pos += len(block)
+            data = data[len(data) - carry:] + block
+            if read_pos >= status.file_end or block == '':
+                limit = read_pos            # last block - examine up to the very end
+            else:
+                limit = read_pos - maxlength + 1
+            candidates = []
+            if limit > pos:
+                candidates = matcher.find(data, read_pos - len(data), pos, limit)
+                pos = limit
+            if block == '':
+                yield pos, candidates
+                break
+        yield pos, candidates
+
+def _shardedCandidateBlocks():
+    """
+    Examines the source file in several worker processes.
+    
+    The range to be examined is split into shards of L{ExecutionSettings.ExecutionSettings.blocksize}
+    bytes (aligned as for L{_candidateBlocks}), which are handed out to a pool of
+    L{ExecutionSettings.ExecutionSettings.processes} worker processes. Each worker reads its shard
+    plus the following M{maxlength - 1} bytes, so that sequences starting at the end of a shard are found
+    as well (see L{_scanShard}). The workers only look up candidates; the results are handed back in
+    the order of the shards and all candidates are processed by this process afterwards. Thereby, files
+    spanning several shards are assembled and the numbering of the output files is exactly the same
+    as for examining the source file in one process.
+    
+    @return: Generator for tuples (next position to be examined, candidates found in front of it -
+    see L{_processCandidates})
+    @rtype: C{Generator}
+    """
+    blocksize = status.settings.blocksize
+    shards = []
+    pos = status.file_start
+    while pos < status.file_end:
+        end = min(pos + blocksize - pos % blocksize, status.file_end)
+        shards.append((pos, end, min(end + maxlength - 1, status.file_end)))
+        pos = end
+    # the worker processes are started right away - before any writer thread is started
+    pool = multiprocessing.Pool(status.settings.processes, _initShard,
+        (status.getCurrentFile(), matcher, status.settings.memory_mapped))
+    return _collectShards(pool, shards)
+
+def _collectShards(pool, shards):
+    """
+    Hands out the shards to the worker processes and collects the results in the order of the shards.
+    
+    @param pool: Pool of worker processes (see L{_initShard})
+    @type pool: C{multiprocessing.Pool}
+    @param shards: Shards of the source file (see L{_scanShard})
+    @type shards: C{List} of C{Tuples}
+    @return: Generator for tuples (next position to be examined, candidates found in front of it -
+    see L{_processCandidates})
+    @rtype: C{Generator}
+    """
+    try:
+        results = pool.imap(_scanShard, shards)
+        for i in range(len(shards)):
+            yield shards[i][1], results.next()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _initShard(binfilename, matcher_passed, memory_mapped):
+    """
+    Initialises a worker process for examining shards of the source file.
+    
+    @param binfilename: Name of the source file
+    @type binfilename: C{String}
+    @param matcher_passed: Matcher compiled for the active signatures (see L{matcher})
+    @type matcher_passed: L{MultiMatcher.MultiMatcher}
+    @param memory_mapped: Indicates, whether the source file shall be memory mapped
+    @type memory_mapped: C{Boolean}
+    """
+    global binfile, matcher
+    binfile = tools.openSourceFile(binfilename, memory_mapped, 0)
+    matcher = matcher_passed
+
+def _scanShard(shard):
+    """
+    Looks up all candidates within one shard of the source file (invoked in a worker process).
+    
+    @param shard: First position of the shard, the position behind its last one and the position
+    up to which sequences starting within the shard may reach
+    @type shard: C{Tuple} of C{int}
+    @return: Candidates starting within the shard (see L{_processCandidates})
+    @rtype: C{List} of C{Tuples}
+    """
+    lo, hi, end = shard
+    if tools.isMapped(binfile):
+        return matcher.find(binfile, 0, lo, hi, end)
+    binfile.seek(lo)
+    return matcher.find(binfile.read(end - lo), lo, lo, hi)
+    
+def _processCandidates(candidates):
+    """
+    Processes the candidates found within one block in the order of their positions.
+    
+    For signatures with no file currently started a start sequence starts a new file; depending
+    on the type of signature the end of the file is determined immediately (file size info, manual,
+    chunks - see L{_walkChunks}) or the file is remembered as started (end sequence). For started files only end sequences
+    are regarded. Files exceeding the maximum file size of their signature are skipped; a started
+    file is given up as soon as its end sequence could not be found within the maximum file size.
+    
+    @param candidates: Candidates as returned by L{MultiMatcher.MultiMatcher.find} - tuples of
+    position and (index of signature, 0 for start / 1 for end sequence)
+    @type candidates: C{List} of C{Tuples}
+    """
+    global binfile, start, skipped, maxlength, status
+    debug_output = status.settings.output_level == 3
+    for start_pos, (index, kind) in candidates:
+        sig = compiled[index]
+        if start[index] != -1 and sig.type == signatures.TYPE_END_SEQUENCE and \
+                _exceedsMaximum(sig, start_pos + sig.end_length - start[index]):
+            if debug_output:
+                print ('Gave up file started at 0x%x for %s - exceeds maximum file size' %(start[index], sig.description))
+            start[index] = -1
+            skipped[index] = 0
+        if start[index] == -1:
+            if kind != 0:
+                continue
+            if debug_output:
+                print ('Found start at 0x%x for %s' %(start_pos, sig.description))
+            if sig.type == signatures.TYPE_FILE_SIZE:
+                ofs = 0
+                for i in sig.offsets:
+                    val = tools.readAt(binfile, start_pos + i, 1)
+                    if val == '':
+                        break
+                    ofs = ofs * 256 + ord(val)
+                else:
+                    end_pos = start_pos + ofs
+                    end_pos = end_pos + sig.correction
+                    if end_pos <= start_pos:
+                        if debug_output:
+                            print ('-- No valid file size found - skip this file.')
+                        continue
+                    if _exceedsMaximum(sig, end_pos - start_pos):
+                        if debug_output:
+                            print ('-- File size exceeds maximum file size - skip this file.')
+                        continue
+                    _writeFile(sig, start_pos, end_pos-1)
+            elif sig.type == signatures.TYPE_MANUAL:
+                if debug_output:
+                    print ('-- Enter signature defined function for end address determination for this file')
+                # the function expects the source file right behind the examined window
+                binfile.seek(min(start_pos + maxlength, status.file_end))
+                end_address = sig.function(binfile, start_pos, debug_output)
+                if (end_address < start_pos):
+                    if debug_output:
+                        print ('-- No valid end address found - skip this file.')
+                    continue
+                if _exceedsMaximum(sig, end_address - start_pos + 1):
+                    if debug_output:
+                        print ('-- File size exceeds maximum file size - skip this file.')
+                    continue
+                _writeFile(sig, start_pos, end_address)
+            elif sig.type == signatures.TYPE_CHUNKS:
+                end_address = _walkChunks(sig, start_pos)
+                if end_address < start_pos:
+                    if debug_output:
+                        print ('-- No valid chunk structure found - skip this file.')
+                    continue
+                _writeFile(sig, start_pos, end_address)
+            else:
+                start[index] = start_pos
+        else:
+            if kind != 1 or start_pos <= start[index]:
+                continue
+            end_pos = start_pos + sig.end_length - 1
+            if skipped[index] < sig.skip_end_seqs:
+                skipped[index] +=1
+                if debug_output:
+                    print ('Found end at 0x%x for %s - skipped' %(end_pos, sig.description))
+                continue
+            if debug_output:
+                print ('Found end at 0x%x for %s' %(end_pos, sig.description))
+            _writeFile(sig, start[index], end_pos)
+            start[index] = -1
+            skipped[index] = 0
+
+def _writeFile(sig, start_pos, end_pos):
+    """
+    Writes a found file and counts it.
+    
+    The file is passed to the writer threads, if enabled; otherwise it is written immediately
+    (see L{tools.writeFile}). For index-only executions the file is only recorded in the manifest. The running number of the file is determined here in either case; so is
+    the record for the manifest (see L{CarveManifest.createRecord}).
+    
+    @param sig: Signature of the found file
+    @type sig: L{signatures.CompiledSignature}
+    @param start_pos: Position of the first byte of the file in the source file
+    @type start_pos: C{int}
+    @param end_pos: Position of the last byte of the file in the source file
+    @type end_pos: C{int}
+    """
+    name = sig.name
+    counter = status.counterr[name] + status.settings.counterstart_global
+    record = None
+    if manifest != None:
+        record = CarveManifest.createRecord(sig, status.getCurrentFile(), start_pos, end_pos,
+            tools.getOpenFileSize(binfile))
+    if status.settings.virtual:
+        manifest.add(record, binfile)
+    elif writer != None:
+        writer.write(name, counter, sig.extension, start_pos, end_pos, record)
+    else:
+        written = writeFile(name, counter, sig.extension, binfile, start_pos, end_pos,
+              status.settings.dest_folder, status.settings.output_level == 3, status)
+        if record != None:
+            manifest.addWritten(record, written, binfile)
+    status.foundFile(name, start_pos, end_pos)
+
+def _walkChunks(sig, start_pos):
+    """
+    Determines the end of a file consisting of chunks (signature type L{signatures.TYPE_CHUNKS}).
+    
+    Starting with the first chunk, the chunks are hopped by their lengths up to the final chunk
+    (L{signatures.chunks_end_type}). Only the chunk headers are read; if requested
+    (L{signatures.chunks_crc}) the CRC of each chunk is checked as well. Chunks with invalid types or
+    lengths, invalid CRCs and files exceeding the maximum file size of the signature are rejected.
+    
+    @param sig: Signature of the found file
+    @type sig: L{signatures.CompiledSignature}
+    @param start_pos: Position of the start sequence in the source file
+    @type start_pos: C{int}
+    @return: -1 if the end of the file could not be determined, otherwise the position of the last
+    byte of the file in the source file
+    @rtype: C{int}
+    """
+    limit = tools.getOpenFileSize(binfile)
+    if sig.max_filesize != None and start_pos + sig.max_filesize < limit:
+        limit = start_pos + sig.max_filesize
+    pos = start_pos + sig.chunks_offset
+    while pos + 12 <= limit:
+        header = tools.readAt(binfile, pos, 8)
+        length = struct.unpack('>I', header[:4])[0]
+        chunktype = header[4:]
+        if length > 0x7FFFFFFF or not chunktype.isalpha():
+            return -1
+        end = pos + 12 + length
+        if end > limit:
+            return -1
+        if sig.chunks_crc:
+            crc = zlib.crc32(chunktype)
+            done = 0
+            while done < length:
+                part = tools.readAt(binfile, pos + 8 + done, min(length - done, tools.COPY_BUFFERSIZE))
+                crc = zlib.crc32(part, crc)
+                done += len(part)
+            if struct.unpack('>I', tools.readAt(binfile, pos + 8 + length, 4))[0] != crc & 0xFFFFFFFF:
+                return -1
+        if chunktype == sig.chunks_end_type:
+            return end - 1
+        pos = end
+    return -1
+
+def _exceedsMaximum(sig, filesize):
+    """
+    Checks the size of a found file against the maximum file size of its signature.
+    
+    @param sig: Signature of the found file
+    @type sig: L{signatures.CompiledSignature}
+    @param filesize: Size of the found file
+    @type filesize: C{int}
+    @return: Indicates, whether the file is larger than allowed for its signature
+    @rtype: C{Boolean}
+    """
+    limit = sig.max_filesize
+    return limit != None and filesize > limit
@@ -1,30 +1,83 @@
 """
-The new and fast core of the FileExtractor. 
+The new and fast core of the FileExtractor.
 
-This module is only a stub. The actual implementation has now been shifted to a C-Module. This way
+This module is only a thin wrapper. The actual implementation has now been shifted to a C-Module. This way
 the extracting process can be speeded up significantly.
 
 It provides exactly the same interface as the original FileExtractorCore.
 
+The C-Module (L{fecore}) performs the scan loop - reading the source file and looking up the start and
+end sequences of all signatures. Only for the candidates found it calls back into Python; they
+are processed by the original core (see L{FileExtractorCore._processCandidates}), so that results
+are exactly the same for both cores. The C-Module has to be compiled in advance (see
+L{isAvailable}); examining one source file in several processes is left for the original core.
+
 FileExtractor is free software: you can redistribute it and/or modify
 it under the terms of the GNU General Public License as published by
 the Free Software Foundation, either version 3 of the License, or
 (at your option) any later version.
- 
+
 FileExtractor is distributed in the hope that it will be useful,
 but WITHOUT ANY WARRANTY; without even the implied warranty of
 MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
 GNU General Public License for more details.
- 
+
 You should have received a copy of the GNU General Public License
 along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 """
+import FileExtractorCore
+
+try:
+    import fecore
+except ImportError:
+    fecore = None
+
+def isAvailable():
+    """
+    Checks, whether the C-Module has been compiled (run C{python setup.py build .}).
+
+    @return: Indicates, whether this core may be used
+    @rtype: C{Boolean}
+    """
+    return fecore != None
 
 def getAvailableSignatures():
-    return None
-    
+    """
+    Forwards the request for available signatures to the original core.
+
+    @return: C{None} if error in signatures file, otherwise the list of signatures.
+    @rtype: C{List} of C{Signatures}
+    """
+    return FileExtractorCore.getAvailableSignatures()
+
 def init(status_passed):
-    return None
-    
+    """
+    Initalises the core for execution for one source file (see L{FileExtractorCore.init}).
+
+    @param status_passed: Status instance containing all information for the current execution.
+    @type status_passed: ExecutionSettings.ExecutionStatus
+    @return: Indicates, whether the initialisation was sucessful. (-1 / -2 for problems with signature file; 0 for success)
+    @rtype: C{int}
+    """
+    return FileExtractorCore.init(status_passed)
+
 def startSearch(status_passed):
-    return None
+    """
+    Invokes the search on the file - the source file is examined by the C-Module.
+
+    @param status_passed: Reference to the status instance for applying runtime information and
+    gaining settings for the running.
+    @type status_passed: ExecutionSettings.ExecutionStatus
+    return: Active Signatures; Overall Counter
+    rtype: C{List} of C{Signatures}; C{int}
+    """
+    status = status_passed
+    if status.settings.processes > 1 or status.settings.imaging != None:
+        return FileExtractorCore.startSearch(status)
+    scanner = fecore.Scanner(status.getCurrentFile(), status.file_start, status.file_end,
+        status.settings.blocksize, FileExtractorCore.sequences, FileExtractorCore.alignment,
+        FileExtractorCore.alignment_offset, FileExtractorCore.aligned)
+    try:
+        return FileExtractorCore.startSearch(status, scanner)
+    finally:
+        scanner.close()
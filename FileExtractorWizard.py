@@ -36,13 +36,12 @@ import signatures
 import FileExtractorCore
 import tools
 import FESettings
+from imagegenerator import Runtime
 
 
 _ID_WIZARD = 101
 _ID_INFO_SOURCES = 201
 _ID_B_DIR = 202
-_TIMER_ID = 301
-_TIMER_ID1 = 302
 DEBUG_FILENAME = FESettings.PATH_DEBUGFILE
 
 
@@ -68,6 +67,8 @@ class FileExtractorWizard(Wizard):
         self._page4.SetPrev(self._page3)
         
         self.SetPageSize((300,370))
+        self._pipelined = 0
+        self._recovering = 0
 
 
         EVT_WIZARD_PAGE_CHANGED(self, _ID_WIZARD, self._evtPageChanged)
@@ -85,9 +86,15 @@ class FileExtractorWizard(Wizard):
                 self.FindWindowById(wx.ID_BACKWARD).Disable()
                 self._startImageProcessing()
             elif self.GetCurrentPage() == self._page3:
-                self.FindWindowById(wx.ID_FORWARD).Disable()
-                self.FindWindowById(wx.ID_BACKWARD).Disable()
-                self._startFileRecovery()
+                if self._pipelined:
+                    # examination started together with the imaging
+                    if self._recovering:
+                        self.FindWindowById(wx.ID_FORWARD).Disable()
+                        self.FindWindowById(wx.ID_BACKWARD).Disable()
+                else:
+                    self.FindWindowById(wx.ID_FORWARD).Disable()
+                    self.FindWindowById(wx.ID_BACKWARD).Disable()
+                    self._startFileRecovery()
             elif self.GetCurrentPage() == self._page4:
                 self._displayResults()
 
@@ -107,7 +114,7 @@ class FileExtractorWizard(Wizard):
             i += 1
 
     def _initCore(self, corename, settings = None, ddloc = None):
-        from imagegenerator import CoreManager, Runtime
+        from imagegenerator import CoreManager
         manager = CoreManager.getInstance()
         redirectBuffer = DEBUG_FILENAME
         if settings == None:
@@ -137,8 +144,6 @@ class FileExtractorWizard(Wizard):
         dirDialog.Destroy()
 
     def _startImageProcessing(self):
-        from imagegenerator import Runtime
-
         corename = tools.determineCoreName( FESettings.getSettings().getValue("ig_default_core"))
         location_dd = tools.determineAbsPath( FESettings.getSettings().getValue("ig_location_dd"))
         location_dest = tools.determineAbsPath( os.path.join(FESettings.getSettings().getValue("ig_output_dir"), FESettings.getSettings().getValue("ig_output_filename")))
@@ -164,8 +169,12 @@ class FileExtractorWizard(Wizard):
                 ret = os.system(command)
                 # FIX ME: if not working ...
         redirectBuffer = DEBUG_FILENAME
+        hashes = FESettings.getSettings().getValue("ig_hashes")
+        if hashes:
+            hashes = hashes.replace(",", " ").split()
+        segment = int(FESettings.getSettings().getValue("ig_hash_segment") or 0)
         settings = Runtime.Settings(path_dd = location_dd, source = source, 
-                destination = location_dest, redirectOutput = redirectBuffer)
+                destination = location_dest, redirectOutput = redirectBuffer, hashes = hashes, segment = segment)
         #corename = tools.determineCoreName( getSettings("ig_default_core"))
         #print corename
         core = self._initCore(corename, settings)
@@ -173,16 +182,20 @@ class FileExtractorWizard(Wizard):
         status = Runtime.Status()
         status.setStarted()
         sizeEstimation = core.getSizeEstimationForPartition(settings.getSource())
+        if not sizeEstimation and os.path.isfile(settings.getSource()):
+            sizeEstimation = os.path.getsize(settings.getSource())
         if sizeEstimation:
             status.setEndFilesize(sizeEstimation)
-        thread.start_new_thread(core.createImage,(status,))
-        
-        self._mytimer = wx.Timer(self, _TIMER_ID)
-        self._mytimer.Start(1000, 0)
-        wx.EVT_TIMER(self, _TIMER_ID, self._updateValuesImaging)
         self._status = status
         self._settings = settings
+        self._page2._lSource.SetLabel("Source: " + self._settings.getSource())
+        status.addListener(self._imagingChanged, 1.0)
+        thread.start_new_thread(core.createImage,(status,))
 
+        # the image file is examined whilst being written, if its size is known in advance
+        self._pipelined = FESettings.getSettings().getValue("ig_pipeline") != "no" and sizeEstimation
+        if self._pipelined:
+            self._startFileRecovery(status)
         
 #        if self._callback != None:
 #            if status.getError() != None:
@@ -190,24 +203,33 @@ class FileExtractorWizard(Wizard):
 #            elif status.isFinished():
 #                self._callback.success(settings.getDestination())
 
-    def _updateValuesImaging(self, event):
-        self._page2._lSource.SetLabel("Source: " + self._settings.getSource())
-        elapsed = Tools.processTime(self._status.getElapsedTime())
-        if self._status.getEndFilesize():
-            self._page2._lFilesize.SetLabel("File Size: %s / %s (%d %%)" %(self._formatSize(self._status.getDestinationFileSize()), self._formatSize(self._status.getEndFilesize()), (self._status.getDestinationFileSize() * 100 / self._status.getEndFilesize())))
-            self._page2._gauge.SetValue(int(self._status.getDestinationFileSize() * 10000 / self._status.getEndFilesize()))
-            if  self._status.getDestinationFileSize() != 0 and  self._status.getEndFilesize() - self._status.getDestinationFileSize() != 0:
-                remaining = self._status.getElapsedTime() / self._status.getDestinationFileSize() * (self._status.getEndFilesize() - self._status.getDestinationFileSize())
-                remaining = Tools.processTime(remaining)
+    def _imagingChanged(self, event, snapshot):
+        # called within the thread of the imaging core
+        if event == Runtime.EVENT_FINISHED:
+            self._status.removeListener(self._imagingChanged)
+        wx.CallAfter(self._updateValuesImaging, snapshot)
+
+    def _updateValuesImaging(self, snapshot):
+        elapsed = Tools.processTime(snapshot.elapsed)
+        throughput = ""
+        if snapshot.throughput != None:
+            throughput = "  %.1f MB/s" %(snapshot.throughput)
+        if snapshot.endsize:
+            self._page2._lFilesize.SetLabel("File Size: %s / %s (%d %%)%s" %(self._formatSize(snapshot.size), self._formatSize(snapshot.endsize), (snapshot.size * 100 / snapshot.endsize), throughput))
+            self._page2._gauge.SetValue(int(snapshot.size * 10000 / snapshot.endsize))
+            if snapshot.remaining != None:
+                remaining = Tools.processTime(snapshot.remaining)
                 self._page2._lTimeElapsed.SetLabel("Time elapsed: " + elapsed[0] + ":" + elapsed[1] + ":" + elapsed[2] + "  (- " + remaining[0] + ":" + remaining[1] + ":" + remaining[2] + ")")
         else:
-            self._page2._lFilesize.SetLabel("File Size: %s" %(self._formatSize(self._status.getDestinationFileSize())))
+            self._page2._lFilesize.SetLabel("File Size: %s%s" %(self._formatSize(snapshot.size), throughput))
             val = self._page2._gauge.GetValue()
             self._page2._gauge.SetValue((val + 2000 ) % 10000)
             self._page2._lTimeElapsed.SetLabel("Time elapsed: " + elapsed[0] + ":" + elapsed[1] + ":" + elapsed[2])
+        if snapshot.read_stall or snapshot.write_stall:
+            self._page2._lStalls.SetLabel("Waited for: reading %d s, writing %d s" %(snapshot.read_stall, snapshot.write_stall))
             
-        if self._status.isFinished():
-            if self._status.getError() != None:
+        if snapshot.finished:
+            if snapshot.error != None:
                 print "error"
                 #self._lTitle.SetLabel("Error whilst Imaging")
             else:
@@ -215,10 +237,10 @@ class FileExtractorWizard(Wizard):
                 print "done - all fine"
             self._page2._lTimeElapsed.SetLabel("Time elapsed: " + elapsed[0] + ":" + elapsed[1] + ":" + elapsed[2])
             self._page2._gauge.SetValue(10000)
-            self._mytimer.Stop()
-            self._timeAllTogether = self._status.getElapsedTime()
+            self._timeAllTogether = snapshot.elapsed
             self.FindWindowById(wx.ID_FORWARD).Enable()
-            self.FindWindowById(wx.ID_BACKWARD).Enable()
+            if not self._recovering:
+                self.FindWindowById(wx.ID_BACKWARD).Enable()
       
     def _formatSize(self, size):
         if size / 1024 < 1:
@@ -227,7 +249,7 @@ class FileExtractorWizard(Wizard):
             return "%d.%d KB" %(size / 1024, (size % 1024) / 103)
         return "%d.%d MB" %(size / (1024  * 1024),  (size % (1024  * 1024))/ (103 * 1024))
         
-    def _startFileRecovery(self):
+    def _startFileRecovery(self, imaging = None):
         location_img = tools.determineAbsPath( os.path.join(FESettings.getSettings().getValue("ig_output_dir"), FESettings.getSettings().getValue("ig_output_filename")))
         if self._page1.if_dir.GetValue() == "Working Directory":
             location_dest = tools.determineAbsPath("./")
@@ -237,49 +259,63 @@ class FileExtractorWizard(Wizard):
         self.settings = ExecutionSettings(sourceFiles = [location_img], 
                                           signatures = signatures.getCopyOfAllSignauteres(),
                                           output_frequency = 2300, output_level = 0,
-                                          dest_folder = location_dest)
+                                          dest_folder = location_dest,
+                                          core = FESettings.getSettings().getValue("scan_core"),
+                                          imaging = imaging)
         self.status = ExecutionStatus(self.settings)
+        self.status.addListener(self._statusChanged, 1.0)
         self.startTime = time.time()
 
-        if FileExtractorCore.init(self.status) < 0:
-            print "Error on initialisation"
-            
+        self._core = tools.determineScanCore(self.settings.core)
+        if self._core == None:
+            print "Core not available: %s - using Python core" %(self.settings.core)
+            self._core = FileExtractorCore
+        self._recovering = 1
         thread.start_new_thread(self._startRecoveryInThred,(self.status,))
-
-        self._mytimer = wx.Timer(self, _TIMER_ID1)
-        self._mytimer.Start(1000, 0)
-        wx.EVT_TIMER(self, _TIMER_ID1, self._updateValuesRecovery)
         
     def _startRecoveryInThred(self, status):
-        FileExtractorCore.startSearch(status)
-        self._mytimer.Stop()
+        # initialised in here - with an imaging running, opening the image file waits for it
+        try:
+            if self._core.init(status) < 0:
+                print "Error on initialisation"
+            else:
+                self._core.startSearch(status)
+        except EnvironmentError, msg:
+            print "Error on recovery: %s" %(msg)
 
         now = time.time()
-        self._timeAllTogether += (now - self.startTime)
-        self._updateValuesRecovery(None)
+        if self._pipelined:
+            self._timeAllTogether = now - self.startTime
+        else:
+            self._timeAllTogether += (now - self.startTime)
+        self._recovering = 0
         self.FindWindowById(wx.ID_FORWARD).Enable()
         self.FindWindowById(wx.ID_BACKWARD).Enable()
         
-    def _updateValuesRecovery(self, event):
-        if not self.status.hasMoreSourceFiles():
+    def _statusChanged(self, event, snapshot):
+        if event == EVENT_PROGRESS:
+            wx.CallAfter(self._updateValuesRecovery, snapshot)
+        
+    def _updateValuesRecovery(self, snapshot):
+        if not snapshot.hasMoreSourceFiles():
             return
-        elapsed = self.status.getCurrentElapsedTime()
+        elapsed = snapshot.elapsed
         time1 = tools.processTime(elapsed)
         self.label_current_time_value = "Time elapsed: "+time1[0]+":"+time1[1]+":"+time1[2]
         
-        if  self.status.getCurrentFinished() != 0 and (self.status.getCurrentSize() - self.status.getCurrentFinished()) != 0:
-            remaining = self.status.getCurrentElapsedTime() / self.status.getCurrentFinished() * (self.status.getCurrentSize() - self.status.getCurrentFinished())
+        if  snapshot.progress != 0 and (snapshot.size - snapshot.progress) != 0:
+            remaining = snapshot.elapsed / snapshot.progress * (snapshot.size - snapshot.progress)
             remaining = tools.processTime(remaining)
             elapsed = time1
             self.label_current_time_value = "Time elapsed: " + elapsed[0] + ":" + elapsed[1] + ":" + elapsed[2] + "  (- " + remaining[0] + ":" + remaining[1] + ":" + remaining[2] + ")"
         
-        self.gauge_current_file_value = self.status.getCurrentFinished() * 10000 / self.status.getCurrentSize()
-        progress = int(round(self.status.getCurrentFinished() * 10000.0 / self.status.getCurrentSize())) 
-        self.label_current_percentage_value = "Finished: "+ self._formatSize(self.status.getCurrentFinished())+" / "+self._formatSize(self.status.getCurrentSize()) + " (" + str(progress / 100) +"."+ str(progress  % 100 / 10) + str(progress % 100 % 10) +" %)"
-        self.label_current_found_value = "Files recovered: " + str(self.status.getCurrentFound())
-        #self.label_overall_filesdone_value = "Current source file: "+ str(self.status.finished+1) + " / " + str(self.status.getSourceFileNumber())
-        progress_per_file = 10000.0 / self.status.getSourceFileNumber()
-        progressOverall = int(round(self.status.finished * progress_per_file + self.status.getCurrentFinished() * progress_per_file / self.status.getCurrentSize()))
+        self.gauge_current_file_value = snapshot.progress * 10000 / snapshot.size
+        progress = int(round(snapshot.progress * 10000.0 / snapshot.size)) 
+        self.label_current_percentage_value = "Finished: "+ self._formatSize(snapshot.progress)+" / "+self._formatSize(snapshot.size) + " (" + str(progress / 100) +"."+ str(progress  % 100 / 10) + str(progress % 100 % 10) +" %)"
+        self.label_current_found_value = "Files recovered: " + str(snapshot.found)
+        #self.label_overall_filesdone_value = "Current source file: "+ str(snapshot.finished+1) + " / " + str(snapshot.sourcefiles)
+        progress_per_file = 10000.0 / snapshot.sourcefiles
+        progressOverall = int(round(snapshot.finished * progress_per_file + snapshot.progress * progress_per_file / snapshot.size))
 
         self._page3.label_current_time.SetLabel(self.label_current_time_value)
         self._page3.gauge_current_file.SetValue(self.gauge_current_file_value)
@@ -298,7 +334,7 @@ class FileExtractorWizard(Wizard):
                                              location_dest)
 
         if FESettings.getSettings().getValue("ig_delete_imagefile") == "yes":
-            location_dest = tools.determineAbsPath( FESettings.getSettings().getValue("ig_output_dir"))
+            location_dest = tools.determineAbsPath( os.path.join(FESettings.getSettings().getValue("ig_output_dir"), FESettings.getSettings().getValue("ig_output_filename")))
             if os.path.exists(location_dest):
                 os.remove(location_dest)
                 print "Image file removed."
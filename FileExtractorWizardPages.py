@@ -154,6 +154,7 @@ class WizardPageImage(AbstractFileExtractorWizardPage):
         self._lFilesize.SetFont(font_headings)
         self._lTimeElapsed = wx.StaticText(panel_outer, -1, "Time elapsed: ")
         self._lTimeElapsed.SetFont(font_headings)
+        self._lStalls = wx.StaticText(panel_outer, -1, "")
 
         self._gauge = wx.Gauge(panel_outer, -1, 10000)
         self._gauge.SetValue(0)
@@ -170,7 +171,8 @@ class WizardPageImage(AbstractFileExtractorWizardPage):
         box.Add(self._lFilesize, 2, wx.EXPAND)
         box.Add(panel_fill3, 2, wx.EXPAND)
         box.Add(self._lTimeElapsed, 2, wx.EXPAND)
-        box.Add(panel_fill4, 3, wx.EXPAND)
+        box.Add(self._lStalls, 2, wx.EXPAND)
+        box.Add(panel_fill4, 1, wx.EXPAND)
         box.Add(self._gauge, 2, wx.EXPAND)
         box.Add(panel_fill5, 2, wx.EXPAND)
         contentPane.SetAutoLayout(True)
@@ -0,0 +1,127 @@
+"""
+Source file still being written by the ImageGenerator whilst it is examined.
+
+When imaging and examining are combined (see L{ExecutionSettings.ExecutionSettings.imaging}), the
+core starts examining the image file as soon as the imaging has started. The source file is then
+opened as L{GrowingFile} (see L{tools.openSourceFile}): reading waits until the imaging has written
+the bytes requested, so that the data is taken from the cache of the operating system instead of
+being read from disk a second time. The file is registered as listener with the status of the
+imaging (see L{imagegenerator.Runtime.Status.addListener}) and wakes up on each progress of it.
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+"""
+import os.path
+import threading
+import errno
+
+class GrowingFile:
+    """
+    Reference to a source file being written - supports the file operations used by the core.
+
+    @ivar size: Size of the source file, once written entirely (the size estimation of the imaging)
+    @type size: C{int}
+    @ivar _file: Reference to the source file
+    @type _file: C{file}
+    @ivar _imaging: Status of the imaging writing the source file
+    @type _imaging: L{imagegenerator.Runtime.Status}
+    @ivar _pos: Current position within the source file
+    @type _pos: C{int}
+    @ivar _changed: Condition notified on each event of the imaging
+    @type _changed: C{threading.Condition}
+    """
+    def __init__(self, filename, imaging):
+        """
+        Opens the source file - waits until the imaging has created it.
+
+        @param filename: Name of the source file
+        @type filename: C{String}
+        @param imaging: Status of the imaging writing the source file
+        @type imaging: L{imagegenerator.Runtime.Status}
+        @raise IOError: The imaging has finished without creating the source file
+        """
+        self._imaging = imaging
+        self._pos = 0
+        self._changed = threading.Condition()
+        imaging.addListener(self._imagingChanged, 0)
+        try:
+            self._wait(lambda: os.path.exists(filename))
+            if not os.path.exists(filename):
+                raise IOError(errno.ENOENT, "Imaging finished without creating the image file (%s)"
+                    %(imaging.getError() or "no error reported"), filename)
+            self._file = open(filename, 'rb')
+        except:
+            imaging.removeListener(self._imagingChanged)
+            raise
+        self.size = imaging.getEndFilesize()
+
+    def _imagingChanged(self, event, snapshot):
+        """
+        Listener for the status of the imaging - wakes up the threads waiting for it.
+        """
+        self._changed.acquire()
+        try:
+            self._changed.notifyAll()
+        finally:
+            self._changed.release()
+
+    def _wait(self, condition):
+        """
+        Waits until the given condition is true or the imaging has finished.
+
+        @param condition: Function checking the condition
+        @type condition: C{function}
+        """
+        self._changed.acquire()
+        try:
+            while not condition() and not self._imaging.isFinished():
+                self._changed.wait()
+        finally:
+            self._changed.release()
+
+    def waitFor(self, end):
+        """
+        Waits until the imaging has written the source file up to the given position (or has finished).
+
+        @param end: Position the source file is required up to
+        @type end: C{int}
+        """
+        end = min(end, self.size)
+        self._wait(lambda: self._imaging.getDestinationFileSize() >= end)
+
+    def read(self, size = -1):
+        if size < 0:
+            self.waitFor(self.size)
+        else:
+            self.waitFor(self._pos + size)
+        self._file.seek(self._pos)
+        data = self._file.read(size)
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset, whence = 0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self.size
+        self._pos = offset
+
+    def tell(self):
+        return self._pos
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._imaging.removeListener(self._imagingChanged)
+        self._file.close()
@@ -0,0 +1,409 @@
+"""
+Multi pattern matcher for the FileExtractor core.
+
+All start and end sequences of the active signatures are compiled into one matcher, which
+finds the occurrences of all of them within a block of the source file in one pass.
+
+Sequences may contain wildcards (C{None}) - for each sequence a run of fixed bytes (its anchor)
+is chosen. Anchors are chosen in a way, that all of them start with as few and as rare bytes as
+possible (zero and 0xFF bytes are very common in images of storage media). The anchors are looked
+up by an Aho-Corasick automaton with a complete transition table (C{fecore.Automaton}, see module
+L{fecore}) - each examined byte costs one table lookup, no matter how many sequences are registered.
+The remaining fixed parts of a sequence are verified for each candidate afterwards.
+
+If the C-Module has not been compiled, the anchors are put into a trie instead, which is turned into
+one regular expression; the trie is only walked in Python at positions where at least one anchor
+starts. This fallback is no automaton: the regular expression engine tries the alternatives one
+after another, so the effort for each examined byte grows with the number of sequences.
+
+@var MIN_ANCHOR: Minimum length of an anchor (if the run of fixed bytes is long enough)
+@type MIN_ANCHOR: C{int}
+@var BYTE_WEIGHTS: Weights for the frequency of bytes in source files (default 1)
+@type BYTE_WEIGHTS: C{Dict}
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+"""
+import re
+
+try:
+    import fecore
+    if not hasattr(fecore, 'Automaton'):     # compiled by an older version
+        fecore = None
+except ImportError:
+    fecore = None
+
+MIN_ANCHOR = 3
+BYTE_WEIGHTS = {'\x00': 16, '\xff': 16}
+
+class MultiMatcher:
+    """
+    Finds all occurrences of a set of sequences within a string.
+
+    Each sequence is registered together with an identifier; the identifiers are handed back
+    for each occurrence. Occurrences are sorted by their position; occurrences at the same
+    position are sorted in the order the sequences were registered.
+
+    Sequences may be restricted to aligned positions (e.g. start sequences at the beginning of
+    clusters). These ones are not part of the trie; they are only compared at aligned positions,
+    looking up their anchors (the longest run of fixed bytes) in dictionaries.
+
+    @ivar _patterns: List of registered sequences - each entry is a tuple (length of sequence,
+    offset of anchor, list of fixed runs as tuples (offset, string) apart from the anchor, identifier)
+    @type _patterns: C{List} of C{Tuples}
+    @ivar _trie: Root node of the trie for all anchors. Each node is a tuple of a dictionary (character
+    to child node) and a list of indices of the patterns whose anchor ends in this node.
+    @type _trie: C{Tuple}
+    @ivar _anchors: Anchors of the sequences apart from aligned ones - tuples (anchor, index of pattern)
+    @type _anchors: C{List} of C{Tuples}
+    @ivar _automaton: Automaton for these anchors (C{None} if the C-Module is not available or if there
+    are no sequences apart from aligned ones)
+    @type _automaton: C{fecore.Automaton}
+    @ivar _regex: Compiled regular expression matching the shortest anchors - if there is no automaton
+    (C{None} if there are no sequences apart from aligned ones)
+    @ivar _max_anchor: Maximum value of anchor offset plus anchor length for all patterns
+    @type _max_anchor: C{int}
+    @ivar _alignment: Positions of aligned sequences - tuple (alignment, offset of first position)
+    @type _alignment: C{Tuple} of C{int}
+    @ivar _aligned: Anchors of the aligned sequences - list of tuples (offset of anchor, length of anchor,
+    dictionary of anchors to lists of pattern indices)
+    @type _aligned: C{List} of C{Tuples}
+    """
+    def __init__(self, sequences, alignment = 1, alignment_offset = 0, aligned = None):
+        """
+        Compiles the matcher for the given sequences.
+
+        @param sequences: List of tuples (sequence, identifier); a sequence is a C{List} of C{int},
+        where C{None} is a wildcard for one byte.
+        @type sequences: C{List} of C{Tuples}
+        @param alignment: Aligned sequences are only found at multiples of this number of bytes
+        @type alignment: C{int}
+        @param alignment_offset: Position of the first aligned position (modulo the alignment)
+        @type alignment_offset: C{int}
+        @param aligned: Indicates for each sequence, whether it may only be found at aligned positions
+        (default: none of them)
+        @type aligned: C{List} of C{Boolean}
+        """
+        self._patterns = []
+        self._trie = ({}, [])
+        self._anchors = []
+        self._max_anchor = 0
+        self._alignment = (alignment, alignment_offset % alignment)
+        self._aligned = []
+        if aligned == None or alignment <= 1:
+            aligned = [0] * len(sequences)
+        seqs = [seq for seq, ident in sequences]
+        chosen = _chooseAnchors([seqs[i] for i in range(len(seqs)) if not aligned[i]])
+        for i in range(len(seqs)):
+            seq, ident = sequences[i]
+            if aligned[i]:
+                anchor_offset, anchor = _longestRun(seq)
+            else:
+                anchor_offset, anchor = chosen.pop(0)
+            runs = []
+            for offset, run in getFixedRuns(seq):
+                if offset <= anchor_offset < offset + len(run):
+                    # parts of the run in front of the anchor still need to be verified
+                    if anchor_offset > offset:
+                        runs.append((offset, run[:anchor_offset - offset]))
+                else:
+                    runs.append((offset, run))
+            self._patterns.append((len(seq), anchor_offset, runs, ident))
+            if aligned[i]:
+                for group in self._aligned:
+                    if group[0] == anchor_offset and group[1] == len(anchor):
+                        break
+                else:
+                    group = (anchor_offset, len(anchor), {})
+                    self._aligned.append(group)
+                group[2].setdefault(anchor, []).append(len(self._patterns) - 1)
+                continue
+            if anchor_offset + len(anchor) > self._max_anchor:
+                self._max_anchor = anchor_offset + len(anchor)
+            node = self._trie
+            for ch in anchor:
+                node = node[0].setdefault(ch, ({}, []))
+            node[1].append(len(self._patterns) - 1)
+            self._anchors.append((anchor, len(self._patterns) - 1))
+        self._compile(_trieToRegex(self._trie))
+
+    def _compile(self, pattern):
+        """
+        Builds the automaton for the anchors - or the regular expression, if the C-Module is not available.
+
+        @param pattern: Regular expression matching the shortest anchors (see L{_trieToRegex})
+        @type pattern: C{String}
+        """
+        self._automaton = None
+        self._regex = None
+        if not self._anchors:
+            return
+        if fecore != None:
+            self._automaton = fecore.Automaton([anchor for anchor, index in self._anchors])
+        else:
+            self._regex = re.compile(pattern)
+
+    def getState(self):
+        """
+        Provides the state of the matcher as plain data (see L{signaturedb}) - neither the automaton
+        nor the compiled regular expression are part of it, but the pattern of the latter.
+
+        @return: State of the matcher - only built-in types (C{marshal} may be used for storing it)
+        @rtype: C{Dict}
+        """
+        state = self.__dict__.copy()
+        del state['_regex']
+        del state['_automaton']
+        state['_pattern'] = _trieToRegex(self._trie)
+        return state
+
+    def setState(self, state):
+        """
+        Restores the state of the matcher (see L{getState}); the automaton or the regular expression
+        are built again.
+
+        @param state: State of a matcher
+        @type state: C{Dict}
+        """
+        state = dict(state)
+        pattern = state.pop('_pattern')
+        self.__dict__.update(state)
+        self._compile(pattern)
+
+    def __getstate__(self):
+        """
+        Provides the state of the matcher for pickling (see L{getState}).
+        """
+        return self.getState()
+
+    def __setstate__(self, state):
+        """
+        Restores the state of a pickled matcher (see L{setState}).
+        """
+        self.setState(state)
+
+    def find(self, data, base, lo, hi, end = None):
+        """
+        Finds all occurrences of the registered sequences starting within a given range.
+
+        Only occurrences, which are completely contained in L{data} (up to L{end}), are reported.
+
+        @param data: Content of the source file, starting at position L{base}
+        @type data: C{String} or C{mmap}
+        @param base: Position of the first byte of L{data} within the source file
+        @type base: C{int}
+        @param lo: First position in the source file to be examined
+        @type lo: C{int}
+        @param hi: Position in the source file to stop examining at (exclusive)
+        @type hi: C{int}
+        @param end: Position in the source file up to which the data may be regarded (exclusive); 
+        default is the end of L{data}
+        @type end: C{int}
+        @return: Sorted list of tuples (position in source file, identifier)
+        @rtype: C{List} of C{Tuples}
+        """
+        patterns = self._patterns
+        trie = self._trie
+        size = len(data)
+        if end != None and end - base < size:
+            size = end - base
+        found = []
+        if self._aligned:
+            self._findAligned(data, base, lo, hi, size, found)
+        endpos = hi - base + self._max_anchor
+        if endpos > size:
+            endpos = size
+        if self._automaton != None:
+            anchors = self._anchors
+            for i, k in self._automaton.find(data, lo - base, endpos):
+                index = anchors[k][1]
+                length, anchor_offset, runs, ident = patterns[index]
+                begin = i - anchor_offset
+                if begin < lo - base or begin >= hi - base or begin < 0 or begin + length > size:
+                    continue
+                for offset, run in runs:
+                    if data[begin + offset:begin + offset + len(run)] != run:
+                        break
+                else:
+                    found.append((base + begin, index, ident))
+        if self._regex == None:
+            found.sort()
+            return [(pos, ident) for pos, index, ident in found]
+        search = self._regex.search
+        match = search(data, lo - base, endpos)
+        while match:
+            i = match.start()
+            node = trie
+            j = i
+            while 1:
+                for index in node[1]:
+                    length, anchor_offset, runs, ident = patterns[index]
+                    begin = i - anchor_offset
+                    if begin < lo - base or begin >= hi - base or begin < 0 or begin + length > size:
+                        continue
+                    for offset, run in runs:
+                        if data[begin + offset:begin + offset + len(run)] != run:
+                            break
+                    else:
+                        found.append((base + begin, index, ident))
+                if j >= size:
+                    break
+                node = node[0].get(data[j])
+                if node == None:
+                    break
+                j += 1
+            match = search(data, i + 1, endpos)
+        found.sort()
+        return [(pos, ident) for pos, index, ident in found]
+
+    def _findAligned(self, data, base, lo, hi, size, found):
+        """
+        Finds the occurrences of the aligned sequences (see L{find} for the parameters).
+
+        @param size: Number of bytes of L{data} which may be regarded
+        @type size: C{int}
+        @param found: List the occurrences are appended to as tuples (position in source file,
+        index of pattern, identifier)
+        @type found: C{List} of C{Tuples}
+        """
+        patterns = self._patterns
+        alignment, alignment_offset = self._alignment
+        first = lo + (alignment_offset - lo) % alignment - base
+        stop = min(hi - base, size)
+        if first >= stop:
+            return
+        for anchor_offset, length, anchors in self._aligned:
+            # the first bytes of the anchors at all aligned positions - searched in one go
+            column = data[first + anchor_offset:stop + anchor_offset:alignment]
+            for anchor, indices in anchors.items():
+                k = column.find(anchor[0])
+                while k != -1:
+                    begin = first + k * alignment
+                    k = column.find(anchor[0], k + 1)
+                    if data[begin + anchor_offset:begin + anchor_offset + length] != anchor:
+                        continue
+                    for index in indices:
+                        seqlength, dummy, runs, ident = patterns[index]
+                        if begin + seqlength > size:
+                            continue
+                        for offset, run in runs:
+                            if data[begin + offset:begin + offset + len(run)] != run:
+                                break
+                        else:
+                            found.append((base + begin, index, ident))
+
+def _longestRun(seq):
+    """
+    Provides the longest run of fixed bytes of a sequence (the first one, if there are several).
+
+    @param seq: Sequence (C{None} is a wildcard)
+    @type seq: C{List} of C{int}
+    @return: Offset of the run and the run itself
+    @rtype: C{Tuple} (C{int}, C{String})
+    """
+    best = None
+    for offset, run in getFixedRuns(seq):
+        if best == None or len(run) > len(best[1]):
+            best = (offset, run)
+    return best
+
+def getFixedRuns(seq):
+    """
+    Splits a sequence into its runs of fixed bytes.
+
+    @param seq: Start or end sequence of a signature (C{None} is a wildcard)
+    @type seq: C{List} of C{int}
+    @return: List of tuples (offset within the sequence, run as String)
+    @rtype: C{List} of C{Tuples}
+    """
+    runs = []
+    current = ''
+    for i in range(len(seq) + 1):
+        if i < len(seq) and seq[i] != None:
+            current += chr(seq[i])
+            continue
+        if current:
+            runs.append((i - len(current), current))
+        current = ''
+    return runs
+
+def _chooseAnchors(seqs):
+    """
+    Chooses the anchor for each sequence.
+    
+    Any part of a run of fixed bytes with at least L{MIN_ANCHOR} bytes may be the anchor - entire
+    shorter runs only for sequences without any run of this length, as short anchors produce many
+    candidates. Leading bytes are chosen greedily - the byte covering most of the remaining
+    sequences in relation to its weight (see L{BYTE_WEIGHTS}) first. For each sequence the longest
+    anchor starting with a chosen byte is taken.
+    
+    @param seqs: Sequences to choose anchors for
+    @type seqs: C{List} of C{List} of C{int}
+    @return: List of tuples (offset within the sequence, anchor)
+    @rtype: C{List} of C{Tuples}
+    """
+    options = []
+    for seq in seqs:
+        runs = getFixedRuns(seq)
+        if not runs:
+            raise ValueError('Sequence without any fixed byte')
+        opts = []
+        shortest = min(MIN_ANCHOR, max([len(run) for offset, run in runs]))
+        for offset, run in runs:
+            if len(run) < shortest:
+                continue
+            if len(run) <= MIN_ANCHOR:
+                opts.append((offset, run))
+            else:
+                for k in range(len(run) - MIN_ANCHOR + 1):
+                    opts.append((offset + k, run[k:]))
+        options.append(opts)
+    chosen = [None] * len(seqs)
+    remaining = range(len(seqs))
+    while remaining:
+        counts = {}
+        for i in remaining:
+            for ch in set([run[0] for offset, run in options[i]]):
+                counts[ch] = counts.get(ch, 0) + 1
+        best = None
+        for ch in counts.keys():
+            rating = float(counts[ch]) / BYTE_WEIGHTS.get(ch, 1)
+            if best == None or rating > best_rating or (rating == best_rating and ch < best):
+                best, best_rating = ch, rating
+        left = []
+        for i in remaining:
+            for offset, run in options[i]:
+                if run[0] == best and (chosen[i] == None or len(run) > len(chosen[i][1])):
+                    chosen[i] = (offset, run)
+            if chosen[i] == None:
+                left.append(i)
+        remaining = left
+    return chosen
+
+def _trieToRegex(node):
+    """
+    Assembles a regular expression for all paths in the trie up to the first node holding an anchor.
+
+    There is no need to go any deeper - once the shortest anchor at a position matches, the trie
+    is walked for this position in order to find all longer anchors as well.
+    """
+    if node[1]:
+        return ''
+    alternatives = []
+    keys = node[0].keys()
+    keys.sort()
+    for ch in keys:
+        alternatives.append(re.escape(ch) + _trieToRegex(node[0][ch]))
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return '(?:' + '|'.join(alternatives) + ')'
@@ -25,18 +25,18 @@ from time import sleep
 import time
 import signatures
 import ResultDialog
-from ExecutionSettings import ExecutionSettings, ExecutionStatus
+from ExecutionSettings import ExecutionSettings, ExecutionStatus, EVENT_FOUND
 
 _ID_B_RESULT = 301
-_TIMER_ID = 501
+_UPDATE_INTERVAL = 1.0
 
 class ProgressDialog(wxDialog):
     """ Progress Dialog for the FileExtractor GUI FrontEnd
         
         A L{ExecutionSettings.ExecutionSettings} instance has to be passed to this class.
         A new L{ExecutionSettings.ExecutionStatus} instance will be created in here.
-        A timer is implemented which will lookup for changes in the status class once every
-        second. Changes are visualised with two progress bars (one for the current source
+        The dialog is registered as listener with the status instance and receives the
+        progress once every second. Changes are visualised with two progress bars (one for the current source
         file and one for the overall progress) and textual output (for elapsed time,
         files found and percentage finished).
         
@@ -51,9 +51,8 @@ class ProgressDialog(wxDialog):
         
         Creates a wxDialog (size L{wxSize(400,500)}) and fills the content. All events are
         registered with their private functions. After setting up the components, the
-        function L{ExecutionController} is called in a new thread. A new timer is
-        created, so that the function L{updateControls} is called once every second.
-        Finally, the dialog window is adjusted at the centre of the parent window.
+        function L{ExecutionController} is called in a new thread, which registers
+        L{_statusChanged} with the status instance. Finally, the dialog window is adjusted at the centre of the parent window.
         
         This constructor calls the L{wxPython.wx.wxDialog.ShowModal} itself; hence, it must not be 
         invoked from the outside after initalisation.
@@ -176,13 +175,9 @@ class ProgressDialog(wxDialog):
         self.label_overall_found_value = "Files Found: 0"
         self.label_overall_time_value = "Time elapsed: 00:00:00"
         
-        mytimer = wxTimer(self, _TIMER_ID)
-        mytimer.Start(1000)
-        
         thread.start_new_thread(self.ExecutionController,())
         
         EVT_BUTTON(self, _ID_B_RESULT, self._ShowResult)
-        EVT_TIMER(self, _TIMER_ID, self.updateControls)
         
         self.CentreOnParent()
         self.ShowModal()
@@ -198,41 +193,62 @@ class ProgressDialog(wxDialog):
         This message is invoked whenever the "Start" button is pressed on the dialog.
         """
         self.status = ExecutionStatus(self.settings)
+        self.status.addListener(self._statusChanged, _UPDATE_INTERVAL)
         self.startTime = time.time()
+        core = tools.determineScanCore(self.settings.core)
+        if core == None:
+            print "Core not available: %s - using Python core" %(self.settings.core)
+            core = FileExtractorCore
         for srcFile in self.settings.sourceFiles:
-            if FileExtractorCore.init(self.status) < 0:
+            if core.init(self.status) < 0:
                 print "Error for " + srcFile
-            signs, counter = FileExtractorCore.startSearch(self.status)
+            signs, counter = core.startSearch(self.status)
+    
+    def _statusChanged(self, event, snapshot):
+        """
+        Listener for the status instance (see L{ExecutionSettings.ExecutionStatus.addListener}).
+        
+        Invoked within the thread of the core - the controls are updated within the GUI thread. Found
+        files are shown with the next progress event.
+        
+        @param event: Event sent by the status instance
+        @type event: C{int}
+        @param snapshot: Status at the time of the event
+        @type snapshot: L{ExecutionSettings.StatusSnapshot}
+        """
+        if event != EVENT_FOUND:
+            wxCallAfter(self.updateControls, snapshot)
     
-    def updateControls(self, event):
+    def updateControls(self, snapshot):
         """
-        Updates all the controls in the dialog with the values provided by the L{self.status}
-        instance.
+        Updates all the controls in the dialog with the values provided by a snapshot of the 
+        L{self.status} instance.
         
-        This message is invoked once every second by a timer installed in this class.
+        This message is invoked within the GUI thread for each event passed by L{_statusChanged}.
         
-        @param event: Timer event.
+        @param snapshot: Status at the time of the event
+        @type snapshot: L{ExecutionSettings.StatusSnapshot}
         """
         # calculation
-        if self.status.hasMoreSourceFiles():
-            self.label_current_filename_value = "Source filename: " + self.status.getCurrentFile()
-            elapsed = self.status.getCurrentElapsedTime()
+        if snapshot.hasMoreSourceFiles():
+            self.label_current_filename_value = "Source filename: " + snapshot.sourcefile
+            elapsed = snapshot.elapsed
             time1 = tools.processTime(elapsed)
             self.label_current_time_value = "Time elapsed: "+time1[0]+":"+time1[1]+":"+time1[2]
             
-            if  self.status.getCurrentFinished() != 0 and (self.status.getCurrentSize() - self.status.getCurrentFinished()) != 0:
-                remaining = self.status.getCurrentElapsedTime() / self.status.getCurrentFinished() * (self.status.getCurrentSize() - self.status.getCurrentFinished())
+            if  snapshot.progress != 0 and (snapshot.size - snapshot.progress) != 0:
+                remaining = snapshot.elapsed / snapshot.progress * (snapshot.size - snapshot.progress)
                 remaining = tools.processTime(remaining)
                 elapsed = time1
                 self.label_current_time_value = "Time elapsed: " + elapsed[0] + ":" + elapsed[1] + ":" + elapsed[2] + "  (remaining: " + remaining[0] + ":" + remaining[1] + ":" + remaining[2] + ")"
             
-            self.gauge_current_file_value = self.status.getCurrentFinished() * 10000 / self.status.getCurrentSize()
-            progress = int(round(self.status.getCurrentFinished() * 10000.0 / self.status.getCurrentSize())) 
-            self.label_current_percentage_value = "Finished: "+ str(progress / 100) +"."+ str(progress  % 100 / 10) + str(progress % 100 % 10) +"% ("+ self._formatSize(self.status.getCurrentFinished())+" / "+self._formatSize(self.status.getCurrentSize()) + ")"
-            self.label_current_found_value = "Files Found: " + str(self.status.getCurrentFound())
-            self.label_overall_filesdone_value = "Current source file: "+ str(self.status.finished+1) + " / " + str(self.status.getSourceFileNumber())
-            progress_per_file = 10000.0 / self.status.getSourceFileNumber()
-            progressOverall = int(round(self.status.finished * progress_per_file + self.status.getCurrentFinished() * progress_per_file / self.status.getCurrentSize()))
+            self.gauge_current_file_value = snapshot.progress * 10000 / snapshot.size
+            progress = int(round(snapshot.progress * 10000.0 / snapshot.size)) 
+            self.label_current_percentage_value = "Finished: "+ str(progress / 100) +"."+ str(progress  % 100 / 10) + str(progress % 100 % 10) +"% ("+ self._formatSize(snapshot.progress)+" / "+self._formatSize(snapshot.size) + ")"
+            self.label_current_found_value = "Files Found: " + str(snapshot.found)
+            self.label_overall_filesdone_value = "Current source file: "+ str(snapshot.finished+1) + " / " + str(snapshot.sourcefiles)
+            progress_per_file = 10000.0 / snapshot.sourcefiles
+            progressOverall = int(round(snapshot.finished * progress_per_file + snapshot.progress * progress_per_file / snapshot.size))
         else:
             self.label_current_filename_value = "Source filename: "
             self.label_current_time_value = "Time elapsed: "
@@ -240,12 +256,12 @@ class ProgressDialog(wxDialog):
             progress = 10000.0
             self.label_current_percentage_value = "Finished: "+ str(progress / 100) +"."+ str(progress % 100 / 10) + str(progress % 100 % 10) +" % "
             self.label_current_found_value = "Files Found: "
-            self.label_overall_filesdone_value = "Current source file: "+ str(self.status.getSourceFileNumber()) + " / " + str(self.status.getSourceFileNumber())
-            progress_per_file = 10000.0 / self.status.getSourceFileNumber()
+            self.label_overall_filesdone_value = "Current source file: "+ str(snapshot.sourcefiles) + " / " + str(snapshot.sourcefiles)
+            progress_per_file = 10000.0 / snapshot.sourcefiles
             progressOverall = 10000.0
         self.gauge_overall_value = progressOverall
         self.label_overall_percentage_value = "Finished: "+str(progressOverall/100)+"."+str(progressOverall%100/10)+ str(progressOverall%100%10) +" %"
-        self.label_overall_found_value = "Files Found: " + str(self.status.getOverallFound())
+        self.label_overall_found_value = "Files Found: " + str(snapshot.foundOverall)
         now = time.time()
         time1 = tools.processTime(now - self.startTime)
         self.label_overall_time_value = "Time elapsed: "+time1[0]+":"+time1[1]+":"+time1[2]
@@ -261,7 +277,7 @@ class ProgressDialog(wxDialog):
         self.label_current_found.SetLabel(self.label_current_found_value)
         self.label_overall_found.SetLabel(self.label_overall_found_value)
         self.label_overall_time.SetLabel(self.label_overall_time_value)
-        if not self.status.hasMoreSourceFiles():
+        if not snapshot.hasMoreSourceFiles():
             self.bResultButton.Enable(true)
 
     def _formatSize(self, size):
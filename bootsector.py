@@ -0,0 +1,120 @@
+"""
+Determines the allocation unit (cluster) of a file system from its boot sector.
+
+Files on FAT, exFAT, NTFS and ext2/3/4 file systems always start at the beginning of a cluster
+(block). Knowing the size of the clusters and the position of the first one, start sequences only
+need to be looked up at these positions (see L{ExecutionSettings.ExecutionSettings.alignment}).
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+
+@var SECTOR_SIZE: Size of a sector - the alignment used if no file system is recognised
+@type SECTOR_SIZE: C{int}
+@var EXT_SUPERBLOCK: Offset of the superblock of ext2/3/4 file systems
+@type EXT_SUPERBLOCK: C{int}
+"""
+import struct
+import tools
+
+SECTOR_SIZE = 512
+EXT_SUPERBLOCK = 1024
+
+def detectAlignment(filehandle, start):
+    """
+    Looks up the cluster size of the file system starting at the given position of the source file.
+
+    @param filehandle: Reference to the source file
+    @type filehandle: Reference to file or C{mmap}
+    @param start: Position of the file system (its boot sector) within the source file
+    @type start: C{int}
+    @return: C{None} if no file system is recognised, otherwise the size of a cluster and the position
+    of the first cluster within the source file modulo the cluster size
+    @rtype: C{Tuple} of C{int}
+    """
+    boot = tools.readAt(filehandle, start, SECTOR_SIZE)
+    found = None
+    if len(boot) == SECTOR_SIZE:
+        if boot[3:11] == 'EXFAT   ':
+            found = _exfat(boot)
+        elif boot[3:11] == 'NTFS    ':
+            found = _ntfs(boot)
+        elif boot[510:512] == '\x55\xAA':
+            found = _fat(boot)
+    if found == None:
+        found = _ext(tools.readAt(filehandle, start + EXT_SUPERBLOCK, 64))
+    if found == None:
+        return None
+    cluster, first = found
+    return cluster, (start + first) % cluster
+
+def _fat(boot):
+    """
+    Examines the boot sector of a FAT12/16/32 file system.
+
+    @return: C{None} if not valid, otherwise cluster size and offset of the data area
+    @rtype: C{Tuple} of C{int}
+    """
+    bps, spc, reserved, fats, rootentries, fatsize16 = struct.unpack('<HBHBHxxxH', boot[11:24])
+    fatsize = fatsize16 or struct.unpack('<I', boot[36:40])[0]
+    if not _isPowerOfTwo(bps, 512, 4096) or not _isPowerOfTwo(spc, 1, 128) or fats == 0 or fatsize == 0:
+        return None
+    rootsectors = (rootentries * 32 + bps - 1) / bps
+    return bps * spc, (reserved + fats * fatsize + rootsectors) * bps
+
+def _ntfs(boot):
+    """
+    Examines the boot sector of a NTFS file system - clusters are counted from the boot sector.
+
+    @return: C{None} if not valid, otherwise cluster size and offset of the first cluster
+    @rtype: C{Tuple} of C{int}
+    """
+    bps, spc = struct.unpack('<HB', boot[11:14])
+    if spc > 0x80:
+        spc = 1 << (256 - spc)
+    if not _isPowerOfTwo(bps, 512, 4096) or not _isPowerOfTwo(spc, 1, 1 << 16):
+        return None
+    return bps * spc, 0
+
+def _exfat(boot):
+    """
+    Examines the boot sector of an exFAT file system.
+
+    @return: C{None} if not valid, otherwise cluster size and offset of the cluster heap
+    @rtype: C{Tuple} of C{int}
+    """
+    heap = struct.unpack('<I', boot[88:92])[0]
+    bps_shift, spc_shift = ord(boot[108]), ord(boot[109])
+    if bps_shift < 9 or bps_shift > 12 or bps_shift + spc_shift > 25:
+        return None
+    return 1 << (bps_shift + spc_shift), heap << bps_shift
+
+def _ext(superblock):
+    """
+    Examines the superblock of an ext2/3/4 file system - blocks are counted from the start of the
+    file system.
+
+    @return: C{None} if not valid, otherwise block size and offset of the first block
+    @rtype: C{Tuple} of C{int}
+    """
+    if len(superblock) < 64 or superblock[56:58] != '\x53\xEF':
+        return None
+    log_blocksize = struct.unpack('<I', superblock[24:28])[0]
+    if log_blocksize > 6:
+        return None
+    return 1024 << log_blocksize, 0
+
+def _isPowerOfTwo(value, lowest, highest):
+    """
+    Checks, whether a value is a power of two within the given range.
+    """
+    return lowest <= value <= highest and value & (value - 1) == 0
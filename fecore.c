@@ -0,0 +1,879 @@
+/*
+ * Native scan loop for the FileExtractor core (see FileExtractorCoreNew).
+ *
+ * Provides the type Scanner, which reads a source file block by block and looks up all
+ * occurrences of a set of sequences (start and end sequences of signatures). Iterating a
+ * scanner gives one tuple (next position to be examined, candidates) per block, where the
+ * candidates are tuples (position in source file, identifier) sorted by their position and
+ * in the order the sequences were registered - exactly as delivered by
+ * MultiMatcher.MultiMatcher.find(). Only the processing of the candidates is left for Python.
+ * As for the MultiMatcher, sequences may be restricted to aligned positions.
+ *
+ * Sequences are looked up by an anchor each - a run of fixed bytes. All anchors are compiled
+ * into one Aho-Corasick automaton, which is turned into a complete transition table (a DFA):
+ * each examined byte costs one table lookup, no matter how many sequences are registered.
+ * Sequences are only compared where their anchor has been found. The automaton is provided
+ * to Python as well (type Automaton, see MultiMatcher).
+ *
+ * Compile with
+ *     python setup.py build .
+ *
+ * FileExtractor is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * FileExtractor is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+ */
+#include <Python.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <errno.h>
+
+#ifdef _WIN32
+#define fseeko _fseeki64
+#endif
+
+/* Maximum length of the anchor of a sequence in the scanner */
+#define MAX_ANCHOR 16
+
+/* One registered sequence */
+typedef struct {
+    Py_ssize_t length;
+    unsigned char *bytes;
+    unsigned char *fixed;       /* 1 for fixed bytes, 0 for wildcards */
+    Py_ssize_t anchor;          /* offset of the run of fixed bytes candidates are looked up by */
+    Py_ssize_t anchorlen;
+    int aligned;                /* only looked up at aligned positions */
+    PyObject *ident;
+} Sequence;
+
+/* Aho-Corasick automaton with a complete transition table */
+typedef struct {
+    Py_ssize_t states;
+    int *next;                  /* next[state * 256 + byte] - following state */
+    Py_ssize_t *first;          /* outputs of state s are out[first[s]] to out[first[s + 1] - 1] */
+    Py_ssize_t *out;            /* patterns whose anchor ends in a state (also via failure links) */
+    Py_ssize_t *anchorlen;      /* length of the anchor of each pattern */
+} Dfa;
+
+/* One occurrence of a sequence */
+typedef struct {
+    PY_LONG_LONG pos;
+    Py_ssize_t index;
+} Hit;
+
+typedef struct {
+    PyObject_HEAD
+    FILE *file;
+    Sequence *sequences;
+    Py_ssize_t count;
+    Dfa dfa;                    /* automaton for the anchors of the sequences not aligned */
+    Py_ssize_t *unaligned;      /* indices of these sequences - patterns of the automaton */
+    Py_ssize_t maxlength;
+    Py_ssize_t maxanchor;       /* maximum offset of the end of an anchor */
+    Py_ssize_t *aligned;        /* indices of the aligned sequences */
+    Py_ssize_t alignedcount;
+    long alignment;
+    PY_LONG_LONG alignment_offset;
+    PY_LONG_LONG pos;           /* next position to be examined */
+    PY_LONG_LONG read_pos;      /* next position to be read */
+    PY_LONG_LONG file_end;
+    long blocksize;
+    unsigned char *buffer;      /* holds the source file from pos on */
+    Py_ssize_t buffered;
+    int finished;
+    Hit *hits;
+    Py_ssize_t hitcount;
+    Py_ssize_t hitcapacity;
+} Scanner;
+
+static PyTypeObject ScannerType;
+
+static void
+dfaFree(Dfa *dfa)
+{
+    PyMem_Free(dfa->next);
+    PyMem_Free(dfa->first);
+    PyMem_Free(dfa->out);
+    PyMem_Free(dfa->anchorlen);
+    memset(dfa, 0, sizeof(Dfa));
+}
+
+/*
+ * Builds the automaton for the given anchors - pattern i is found, wherever anchors[i]
+ * (lengths[i] bytes) occurs. First, the anchors are put into a trie (the goto function); the
+ * states are visited breadth first afterwards for determining their failure links, which
+ * complete the transition table and the outputs of each state. Returns -1 if running out of
+ * memory (the exception is set).
+ */
+static int
+dfaBuild(Dfa *dfa, unsigned char **anchors, Py_ssize_t *lengths, Py_ssize_t count)
+{
+    Py_ssize_t i, j, s, t, states = 1, total = 1, head, tail, outputs;
+    Py_ssize_t *terminal = NULL, *fail = NULL, *order = NULL, *own = NULL, *pos = NULL;
+    int c, result = -1;
+
+    memset(dfa, 0, sizeof(Dfa));
+    for (i = 0; i < count; i++)
+        total += lengths[i];
+    dfa->next = PyMem_Malloc(total * 256 * sizeof(int));
+    dfa->anchorlen = PyMem_Malloc((count + 1) * sizeof(Py_ssize_t));
+    terminal = PyMem_Malloc((count + 1) * sizeof(Py_ssize_t));
+    fail = PyMem_Malloc(total * sizeof(Py_ssize_t));
+    order = PyMem_Malloc(total * sizeof(Py_ssize_t));
+    own = PyMem_Malloc(total * sizeof(Py_ssize_t));
+    if (dfa->next == NULL || dfa->anchorlen == NULL || terminal == NULL || fail == NULL ||
+            order == NULL || own == NULL)
+        goto done;
+    for (i = 0; i < total * 256; i++)
+        dfa->next[i] = -1;
+    memset(own, 0, total * sizeof(Py_ssize_t));
+
+    /* goto function */
+    for (i = 0; i < count; i++) {
+        s = 0;
+        for (j = 0; j < lengths[i]; j++) {
+            c = anchors[i][j];
+            if (dfa->next[s * 256 + c] < 0)
+                dfa->next[s * 256 + c] = (int) states++;
+            s = dfa->next[s * 256 + c];
+        }
+        terminal[i] = s;
+        dfa->anchorlen[i] = lengths[i];
+        own[s]++;
+    }
+
+    /* failure links and transitions in breadth first order */
+    head = tail = 0;
+    fail[0] = 0;
+    order[tail++] = 0;
+    while (head < tail) {
+        s = order[head++];
+        for (c = 0; c < 256; c++) {
+            t = dfa->next[s * 256 + c];
+            if (t < 0) {
+                dfa->next[s * 256 + c] = s == 0 ? 0 : dfa->next[fail[s] * 256 + c];
+                continue;
+            }
+            fail[t] = s == 0 ? 0 : dfa->next[fail[s] * 256 + c];
+            order[tail++] = t;
+        }
+    }
+
+    /* outputs - own patterns of a state followed by those of its failure state */
+    dfa->first = PyMem_Malloc((states + 1) * sizeof(Py_ssize_t));
+    pos = PyMem_Malloc((states + 1) * sizeof(Py_ssize_t));
+    if (dfa->first == NULL || pos == NULL)
+        goto done;
+    for (i = 0; i < states; i++) {
+        s = order[i];
+        pos[s] = own[s] + (s == 0 ? 0 : pos[fail[s]]);      /* number of outputs */
+    }
+    outputs = 0;
+    for (s = 0; s < states; s++) {
+        dfa->first[s] = outputs;
+        outputs += pos[s];
+    }
+    dfa->first[states] = outputs;
+    dfa->out = PyMem_Malloc((outputs + 1) * sizeof(Py_ssize_t));
+    if (dfa->out == NULL)
+        goto done;
+    for (s = 0; s < states; s++)
+        pos[s] = dfa->first[s];
+    for (i = 0; i < count; i++)
+        dfa->out[pos[terminal[i]]++] = i;
+    for (i = 1; i < states; i++) {
+        s = order[i];
+        for (j = dfa->first[fail[s]]; j < dfa->first[fail[s] + 1]; j++)
+            dfa->out[pos[s]++] = dfa->out[j];
+    }
+    dfa->states = states;
+    result = 0;
+
+done:
+    PyMem_Free(terminal);
+    PyMem_Free(fail);
+    PyMem_Free(order);
+    PyMem_Free(own);
+    PyMem_Free(pos);
+    if (result < 0) {
+        dfaFree(dfa);
+        PyErr_NoMemory();
+    }
+    return result;
+}
+
+/*
+ * Chooses the anchor of a sequence - the run of fixed bytes with most bytes apart from zero
+ * and 0xFF (very common in images of storage media), the longest one among these; only its
+ * first MAX_ANCHOR bytes are used.
+ */
+static void
+chooseAnchor(Sequence *seq)
+{
+    Py_ssize_t i, start = -1, rare = 0, best = -1, bestlen = 0, bestrare = -1;
+
+    seq->anchor = -1;
+    seq->anchorlen = 0;
+    for (i = 0; i <= seq->length; i++) {
+        if (i < seq->length && seq->fixed[i]) {
+            if (start < 0) {
+                start = i;
+                rare = 0;
+            }
+            if (seq->bytes[i] != 0x00 && seq->bytes[i] != 0xFF)
+                rare++;
+            continue;
+        }
+        if (start >= 0 && (rare > bestrare || (rare == bestrare && i - start > bestlen))) {
+            best = start;
+            bestlen = i - start;
+            bestrare = rare;
+        }
+        start = -1;
+    }
+    if (best < 0)
+        return;
+    seq->anchor = best;
+    seq->anchorlen = bestlen < MAX_ANCHOR ? bestlen : MAX_ANCHOR;
+}
+
+static int
+compileSequence(Sequence *seq, PyObject *item)
+{
+    PyObject *list, *value;
+    Py_ssize_t i;
+    long byte;
+
+    if (!PyTuple_Check(item) || PyTuple_GET_SIZE(item) != 2) {
+        PyErr_SetString(PyExc_TypeError, "sequences must be tuples (sequence, identifier)");
+        return -1;
+    }
+    list = PySequence_Fast(PyTuple_GET_ITEM(item, 0), "sequence must be a list");
+    if (list == NULL)
+        return -1;
+    seq->length = PySequence_Fast_GET_SIZE(list);
+    seq->bytes = PyMem_Malloc(seq->length + 1);
+    seq->fixed = PyMem_Malloc(seq->length + 1);
+    if (seq->bytes == NULL || seq->fixed == NULL) {
+        Py_DECREF(list);
+        PyErr_NoMemory();
+        return -1;
+    }
+    for (i = 0; i < seq->length; i++) {
+        value = PySequence_Fast_GET_ITEM(list, i);
+        if (value == Py_None) {
+            seq->bytes[i] = 0;
+            seq->fixed[i] = 0;
+            continue;
+        }
+        byte = PyInt_AsLong(value);
+        if (byte == -1 && PyErr_Occurred()) {
+            Py_DECREF(list);
+            return -1;
+        }
+        if (byte < 0 || byte > 255) {
+            Py_DECREF(list);
+            PyErr_SetString(PyExc_ValueError, "byte value out of range");
+            return -1;
+        }
+        seq->bytes[i] = (unsigned char) byte;
+        seq->fixed[i] = 1;
+    }
+    Py_DECREF(list);
+    chooseAnchor(seq);
+    if (seq->anchor < 0) {
+        PyErr_SetString(PyExc_ValueError, "Sequence without any fixed byte");
+        return -1;
+    }
+    seq->ident = PyTuple_GET_ITEM(item, 1);
+    Py_INCREF(seq->ident);
+    return 0;
+}
+
+static PyObject *
+Scanner_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    static char *kwlist[] = {"filename", "start", "end", "blocksize", "sequences",
+        "alignment", "alignment_offset", "aligned", NULL};
+    Scanner *self;
+    const char *filename;
+    PY_LONG_LONG start, end, alignment_offset = 0;
+    long blocksize, alignment = 1;
+    PyObject *sequences, *fast, *aligned = Py_None, *flag;
+    Py_ssize_t i, j, anchorend;
+    unsigned char **anchors = NULL;
+    Py_ssize_t *lengths = NULL;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "sLLlO|lLO", kwlist,
+            &filename, &start, &end, &blocksize, &sequences, &alignment, &alignment_offset, &aligned))
+        return NULL;
+    if (blocksize < 1)
+        blocksize = 1;
+    if (alignment < 1)
+        alignment = 1;
+    self = (Scanner *) type->tp_alloc(type, 0);
+    if (self == NULL)
+        return NULL;
+    self->pos = start;
+    self->read_pos = start;
+    self->file_end = end;
+    self->blocksize = blocksize;
+    self->alignment = alignment;
+    self->alignment_offset = (alignment_offset % alignment + alignment) % alignment;
+
+    fast = PySequence_Fast(sequences, "sequences must be a list");
+    if (fast == NULL)
+        goto error;
+    self->count = PySequence_Fast_GET_SIZE(fast);
+    self->sequences = PyMem_Malloc((self->count + 1) * sizeof(Sequence));
+    if (self->sequences == NULL) {
+        Py_DECREF(fast);
+        PyErr_NoMemory();
+        goto error;
+    }
+    memset(self->sequences, 0, (self->count + 1) * sizeof(Sequence));
+    for (i = 0; i < self->count; i++) {
+        if (compileSequence(&self->sequences[i], PySequence_Fast_GET_ITEM(fast, i)) < 0) {
+            Py_DECREF(fast);
+            goto error;
+        }
+        if (self->sequences[i].length > self->maxlength)
+            self->maxlength = self->sequences[i].length;
+        if (alignment > 1 && aligned != Py_None) {
+            flag = PySequence_GetItem(aligned, i);
+            if (flag == NULL) {
+                Py_DECREF(fast);
+                goto error;
+            }
+            self->sequences[i].aligned = PyObject_IsTrue(flag);
+            Py_DECREF(flag);
+            if (self->sequences[i].aligned < 0) {
+                Py_DECREF(fast);
+                goto error;
+            }
+        }
+        if (self->sequences[i].aligned) {
+            self->alignedcount++;
+            continue;
+        }
+        anchorend = self->sequences[i].anchor + self->sequences[i].anchorlen;
+        if (anchorend > self->maxanchor)
+            self->maxanchor = anchorend;
+    }
+    Py_DECREF(fast);
+    self->aligned = PyMem_Malloc((self->alignedcount + 1) * sizeof(Py_ssize_t));
+    self->unaligned = PyMem_Malloc((self->count - self->alignedcount + 1) * sizeof(Py_ssize_t));
+    anchors = PyMem_Malloc((self->count + 1) * sizeof(unsigned char *));
+    lengths = PyMem_Malloc((self->count + 1) * sizeof(Py_ssize_t));
+    if (self->aligned == NULL || self->unaligned == NULL || anchors == NULL || lengths == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    for (i = 0, j = 0; i < self->count; i++) {
+        if (self->sequences[i].aligned) {
+            self->aligned[j++] = i;
+            continue;
+        }
+        anchors[i - j] = self->sequences[i].bytes + self->sequences[i].anchor;
+        lengths[i - j] = self->sequences[i].anchorlen;
+        self->unaligned[i - j] = i;
+    }
+    if (dfaBuild(&self->dfa, anchors, lengths, self->count - self->alignedcount) < 0)
+        goto error;
+    PyMem_Free(anchors);
+    PyMem_Free(lengths);
+    anchors = NULL;
+    lengths = NULL;
+
+    self->buffer = PyMem_Malloc(blocksize + self->maxlength + 1);
+    if (self->buffer == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    self->file = fopen(filename, "rb");
+    if (self->file == NULL) {
+        PyErr_SetFromErrnoWithFilename(PyExc_IOError, (char *) filename);
+        goto error;
+    }
+    return (PyObject *) self;
+
+error:
+    PyMem_Free(anchors);
+    PyMem_Free(lengths);
+    Py_DECREF(self);
+    return NULL;
+}
+
+static void
+Scanner_dealloc(Scanner *self)
+{
+    Py_ssize_t i;
+
+    if (self->file != NULL)
+        fclose(self->file);
+    if (self->sequences != NULL) {
+        for (i = 0; i < self->count; i++) {
+            PyMem_Free(self->sequences[i].bytes);
+            PyMem_Free(self->sequences[i].fixed);
+            Py_XDECREF(self->sequences[i].ident);
+        }
+        PyMem_Free(self->sequences);
+    }
+    dfaFree(&self->dfa);
+    PyMem_Free(self->unaligned);
+    PyMem_Free(self->aligned);
+    PyMem_Free(self->buffer);
+    free(self->hits);
+    self->ob_type->tp_free((PyObject *) self);
+}
+
+static int
+compareHits(const void *a, const void *b)
+{
+    const Hit *x = (const Hit *) a, *y = (const Hit *) b;
+
+    if (x->pos != y->pos)
+        return x->pos < y->pos ? -1 : 1;
+    if (x->index != y->index)
+        return x->index < y->index ? -1 : 1;
+    return 0;
+}
+
+/* Compares a sequence with the data at the given position - returns 1 if it matches. */
+static int
+matchSequence(Sequence *seq, const unsigned char *data)
+{
+    Py_ssize_t m;
+
+    if (memcmp(data, seq->bytes, seq->length) == 0)
+        return 1;
+    for (m = 0; m < seq->length; m++)
+        if (seq->fixed[m] && data[m] != seq->bytes[m])
+            return 0;
+    return 1;
+}
+
+/* Remembers an occurrence of a sequence - returns -1 if running out of memory. */
+static int
+addHit(Scanner *self, Py_ssize_t pos, Py_ssize_t index)
+{
+    Hit *grown;
+
+    if (self->hitcount == self->hitcapacity) {
+        grown = realloc(self->hits, (self->hitcapacity * 2 + 64) * sizeof(Hit));
+        if (grown == NULL)
+            return -1;
+        self->hits = grown;
+        self->hitcapacity = self->hitcapacity * 2 + 64;
+    }
+    self->hits[self->hitcount].pos = pos;
+    self->hits[self->hitcount].index = index;
+    self->hitcount++;
+    return 0;
+}
+
+/*
+ * Looks up all sequences starting in [lo, hi) of the buffer, which are completely contained
+ * in the first size bytes; base is the position of the buffer within the source file.
+ * Aligned sequences are only compared at aligned positions. Runs without holding the
+ * interpreter lock. Returns -1 if running out of memory.
+ */
+static int
+scanBuffer(Scanner *self, PY_LONG_LONG base, Py_ssize_t lo, Py_ssize_t hi, Py_ssize_t size)
+{
+    const unsigned char *data = self->buffer;
+    const int *next = self->dfa.next;
+    const Py_ssize_t *first = self->dfa.first;
+    Py_ssize_t i, j, index, begin, stop, state = 0;
+    Sequence *seq;
+
+    self->hitcount = 0;
+    if (self->alignedcount > 0) {
+        begin = lo + (Py_ssize_t) (((self->alignment_offset - (base + lo)) % self->alignment
+            + self->alignment) % self->alignment);
+        for (; begin < hi; begin += self->alignment) {
+            for (j = 0; j < self->alignedcount; j++) {
+                seq = &self->sequences[self->aligned[j]];
+                if (begin + seq->length > size || !matchSequence(seq, data + begin))
+                    continue;
+                if (addHit(self, begin, self->aligned[j]) < 0)
+                    return -1;
+            }
+        }
+    }
+    stop = hi + self->maxanchor;
+    if (stop > size)
+        stop = size;
+    if (self->alignedcount == self->count)
+        stop = lo;
+    for (i = lo; i < stop; i++) {
+        state = next[state * 256 + data[i]];
+        if (first[state] == first[state + 1])
+            continue;
+        /* anchors ending at i */
+        for (j = first[state]; j < first[state + 1]; j++) {
+            index = self->unaligned[self->dfa.out[j]];
+            seq = &self->sequences[index];
+            begin = i + 1 - seq->anchorlen - seq->anchor;
+            if (begin < lo || begin >= hi || begin + seq->length > size)
+                continue;
+            if (!matchSequence(seq, data + begin))
+                continue;
+            if (addHit(self, begin, index) < 0)
+                return -1;
+        }
+    }
+    qsort(self->hits, self->hitcount, sizeof(Hit), compareHits);
+    return 0;
+}
+
+static PyObject *
+positionToPython(PY_LONG_LONG pos)
+{
+    if (pos <= LONG_MAX)
+        return PyInt_FromLong((long) pos);
+    return PyLong_FromLongLong(pos);
+}
+
+static PyObject *
+Scanner_iternext(Scanner *self)
+{
+    PY_LONG_LONG toread, carry, base, limit;
+    size_t got = 0;
+    int failed = 0, nomem = 0;
+    Py_ssize_t i, lo = 0, hi = 0;
+    PyObject *candidates, *item;
+
+    if (self->finished || self->pos >= self->file_end)
+        return NULL;
+
+    toread = self->blocksize - self->read_pos % self->blocksize;
+    if (toread > self->file_end - self->read_pos)
+        toread = self->file_end - self->read_pos;
+    carry = self->read_pos - self->pos;     /* bytes read already but not examined yet */
+    base = self->pos;
+    if (carry > 0 && self->buffered > carry)
+        memmove(self->buffer, self->buffer + self->buffered - carry, (size_t) carry);
+    self->hitcount = 0;
+
+    Py_BEGIN_ALLOW_THREADS
+    if (fseeko(self->file, self->read_pos, SEEK_SET) != 0)
+        failed = 1;
+    else {
+        got = fread(self->buffer + carry, 1, (size_t) toread, self->file);
+        if (got < (size_t) toread && ferror(self->file))
+            failed = 1;
+    }
+    if (!failed) {
+        self->read_pos += got;
+        self->buffered = (Py_ssize_t) (carry + got);
+        if (self->read_pos >= self->file_end || got == 0)
+            limit = self->read_pos;     /* last block - examine up to the very end */
+        else
+            limit = self->read_pos - self->maxlength + 1;
+        if (limit > self->pos) {
+            lo = (Py_ssize_t) (self->pos - base);
+            hi = (Py_ssize_t) (limit - base);
+            if (scanBuffer(self, base, lo, hi, self->buffered) < 0)
+                nomem = 1;
+            self->pos = limit;
+        }
+        if (got == 0)
+            self->finished = 1;
+    }
+    Py_END_ALLOW_THREADS
+
+    if (failed) {
+        self->finished = 1;
+        return PyErr_SetFromErrno(PyExc_IOError);
+    }
+    if (nomem)
+        return PyErr_NoMemory();
+
+    candidates = PyList_New(self->hitcount);
+    if (candidates == NULL)
+        return NULL;
+    for (i = 0; i < self->hitcount; i++) {
+        item = Py_BuildValue("(NO)", positionToPython(base + self->hits[i].pos),
+            self->sequences[self->hits[i].index].ident);
+        if (item == NULL) {
+            Py_DECREF(candidates);
+            return NULL;
+        }
+        PyList_SET_ITEM(candidates, i, item);
+    }
+    return Py_BuildValue("(NN)", positionToPython(self->pos), candidates);
+}
+
+static PyObject *
+Scanner_close(Scanner *self)
+{
+    if (self->file != NULL)
+        fclose(self->file);
+    self->file = NULL;
+    self->finished = 1;
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef Scanner_methods[] = {
+    {"close", (PyCFunction) Scanner_close, METH_NOARGS,
+     "Closes the source file."},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+static PyTypeObject ScannerType = {
+    PyObject_HEAD_INIT(NULL)
+    0,                                  /* ob_size */
+    "fecore.Scanner",                   /* tp_name */
+    sizeof(Scanner),                    /* tp_basicsize */
+    0,                                  /* tp_itemsize */
+    (destructor) Scanner_dealloc,       /* tp_dealloc */
+    0,                                  /* tp_print */
+    0,                                  /* tp_getattr */
+    0,                                  /* tp_setattr */
+    0,                                  /* tp_compare */
+    0,                                  /* tp_repr */
+    0,                                  /* tp_as_number */
+    0,                                  /* tp_as_sequence */
+    0,                                  /* tp_as_mapping */
+    0,                                  /* tp_hash */
+    0,                                  /* tp_call */
+    0,                                  /* tp_str */
+    0,                                  /* tp_getattro */
+    0,                                  /* tp_setattro */
+    0,                                  /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                 /* tp_flags */
+    "Scanner(filename, start, end, blocksize, sequences, alignment=1, alignment_offset=0, aligned=None)\n\n"
+    "Examines the source file from start to end in blocks of blocksize bytes for the\n"
+    "given sequences (list of tuples (sequence, identifier), where a sequence is a list\n"
+    "of byte values and None for wildcards). Iterating gives one tuple (next position to\n"
+    "be examined, list of candidates (position, identifier)) per block. Sequences flagged\n"
+    "in aligned are only looked up at positions alignment_offset + k * alignment.", /* tp_doc */
+    0,                                  /* tp_traverse */
+    0,                                  /* tp_clear */
+    0,                                  /* tp_richcompare */
+    0,                                  /* tp_weaklistoffset */
+    PyObject_SelfIter,                  /* tp_iter */
+    (iternextfunc) Scanner_iternext,    /* tp_iternext */
+    Scanner_methods,                    /* tp_methods */
+    0,                                  /* tp_members */
+    0,                                  /* tp_getset */
+    0,                                  /* tp_base */
+    0,                                  /* tp_dict */
+    0,                                  /* tp_descr_get */
+    0,                                  /* tp_descr_set */
+    0,                                  /* tp_dictoffset */
+    0,                                  /* tp_init */
+    0,                                  /* tp_alloc */
+    Scanner_new,                        /* tp_new */
+};
+
+/* Automaton for looking up a set of anchors from Python (see MultiMatcher) */
+typedef struct {
+    PyObject_HEAD
+    Dfa dfa;
+} Automaton;
+
+static PyObject *
+Automaton_new(PyTypeObject *type, PyObject *args, PyObject *kwds)
+{
+    static char *kwlist[] = {"anchors", NULL};
+    Automaton *self;
+    PyObject *anchorlist, *fast, *item;
+    unsigned char **anchors = NULL;
+    Py_ssize_t *lengths = NULL;
+    Py_ssize_t i, count;
+    char *bytes;
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "O", kwlist, &anchorlist))
+        return NULL;
+    self = (Automaton *) type->tp_alloc(type, 0);
+    if (self == NULL)
+        return NULL;
+    fast = PySequence_Fast(anchorlist, "anchors must be a list");
+    if (fast == NULL)
+        goto error;
+    count = PySequence_Fast_GET_SIZE(fast);
+    anchors = PyMem_Malloc((count + 1) * sizeof(unsigned char *));
+    lengths = PyMem_Malloc((count + 1) * sizeof(Py_ssize_t));
+    if (anchors == NULL || lengths == NULL) {
+        Py_DECREF(fast);
+        PyErr_NoMemory();
+        goto error;
+    }
+    for (i = 0; i < count; i++) {
+        item = PySequence_Fast_GET_ITEM(fast, i);
+        if (PyString_AsStringAndSize(item, &bytes, &lengths[i]) < 0) {
+            Py_DECREF(fast);
+            goto error;
+        }
+        if (lengths[i] == 0) {
+            Py_DECREF(fast);
+            PyErr_SetString(PyExc_ValueError, "empty anchor");
+            goto error;
+        }
+        anchors[i] = (unsigned char *) bytes;
+    }
+    i = dfaBuild(&self->dfa, anchors, lengths, count);
+    Py_DECREF(fast);
+    if (i < 0)
+        goto error;
+    PyMem_Free(anchors);
+    PyMem_Free(lengths);
+    return (PyObject *) self;
+
+error:
+    PyMem_Free(anchors);
+    PyMem_Free(lengths);
+    Py_DECREF(self);
+    return NULL;
+}
+
+static void
+Automaton_dealloc(Automaton *self)
+{
+    dfaFree(&self->dfa);
+    self->ob_type->tp_free((PyObject *) self);
+}
+
+static PyObject *
+Automaton_find(Automaton *self, PyObject *args)
+{
+    Py_buffer view;
+    Py_ssize_t start, end, i, j, count = 0, capacity = 0, state = 0;
+    const unsigned char *data;
+    const int *next = self->dfa.next;
+    const Py_ssize_t *first = self->dfa.first;
+    Py_ssize_t *hits = NULL, *grown;
+    int nomem = 0;
+    PyObject *result, *item;
+
+    if (!PyArg_ParseTuple(args, "s*nn", &view, &start, &end))
+        return NULL;
+    if (start < 0)
+        start = 0;
+    if (end > view.len)
+        end = view.len;
+    data = view.buf;
+
+    Py_BEGIN_ALLOW_THREADS
+    for (i = start; i < end && !nomem; i++) {
+        state = next[state * 256 + data[i]];
+        if (first[state] == first[state + 1])
+            continue;
+        for (j = first[state]; j < first[state + 1]; j++) {
+            if (count + 2 > capacity) {
+                grown = realloc(hits, (capacity * 2 + 128) * sizeof(Py_ssize_t));
+                if (grown == NULL) {
+                    nomem = 1;
+                    break;
+                }
+                hits = grown;
+                capacity = capacity * 2 + 128;
+            }
+            hits[count++] = i + 1 - self->dfa.anchorlen[self->dfa.out[j]];
+            hits[count++] = self->dfa.out[j];
+        }
+    }
+    Py_END_ALLOW_THREADS
+
+    PyBuffer_Release(&view);
+    if (nomem) {
+        free(hits);
+        return PyErr_NoMemory();
+    }
+    result = PyList_New(count / 2);
+    if (result != NULL) {
+        for (i = 0; i < count / 2; i++) {
+            item = Py_BuildValue("(nn)", hits[2 * i], hits[2 * i + 1]);
+            if (item == NULL) {
+                Py_CLEAR(result);
+                break;
+            }
+            PyList_SET_ITEM(result, i, item);
+        }
+    }
+    free(hits);
+    return result;
+}
+
+static PyMethodDef Automaton_methods[] = {
+    {"find", (PyCFunction) Automaton_find, METH_VARARGS,
+     "find(data, start, end) -> list of tuples (position, index of anchor)\n\n"
+     "Finds all occurrences of the anchors starting at or after start and ending before end\n"
+     "(a string or a buffer such as mmap), sorted by the position of their last byte."},
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+static PyTypeObject AutomatonType = {
+    PyObject_HEAD_INIT(NULL)
+    0,                                  /* ob_size */
+    "fecore.Automaton",                 /* tp_name */
+    sizeof(Automaton),                  /* tp_basicsize */
+    0,                                  /* tp_itemsize */
+    (destructor) Automaton_dealloc,     /* tp_dealloc */
+    0,                                  /* tp_print */
+    0,                                  /* tp_getattr */
+    0,                                  /* tp_setattr */
+    0,                                  /* tp_compare */
+    0,                                  /* tp_repr */
+    0,                                  /* tp_as_number */
+    0,                                  /* tp_as_sequence */
+    0,                                  /* tp_as_mapping */
+    0,                                  /* tp_hash */
+    0,                                  /* tp_call */
+    0,                                  /* tp_str */
+    0,                                  /* tp_getattro */
+    0,                                  /* tp_setattro */
+    0,                                  /* tp_as_buffer */
+    Py_TPFLAGS_DEFAULT,                 /* tp_flags */
+    "Automaton(anchors)\n\n"
+    "Aho-Corasick automaton with a complete transition table for a list of strings (anchors);\n"
+    "the effort for each examined byte does not depend on the number of anchors.", /* tp_doc */
+    0,                                  /* tp_traverse */
+    0,                                  /* tp_clear */
+    0,                                  /* tp_richcompare */
+    0,                                  /* tp_weaklistoffset */
+    0,                                  /* tp_iter */
+    0,                                  /* tp_iternext */
+    Automaton_methods,                  /* tp_methods */
+    0,                                  /* tp_members */
+    0,                                  /* tp_getset */
+    0,                                  /* tp_base */
+    0,                                  /* tp_dict */
+    0,                                  /* tp_descr_get */
+    0,                                  /* tp_descr_set */
+    0,                                  /* tp_dictoffset */
+    0,                                  /* tp_init */
+    0,                                  /* tp_alloc */
+    Automaton_new,                      /* tp_new */
+};
+
+static PyMethodDef FecoreMethods[] = {
+    {NULL, NULL, 0, NULL}        /* Sentinel */
+};
+
+PyMODINIT_FUNC
+initfecore(void)
+{
+    PyObject *m;
+
+    if (PyType_Ready(&ScannerType) < 0 || PyType_Ready(&AutomatonType) < 0)
+        return;
+    m = Py_InitModule3("fecore", FecoreMethods, "Native scan loop for the FileExtractor core.");
+    if (m == NULL)
+        return;
+    Py_INCREF(&ScannerType);
+    PyModule_AddObject(m, "Scanner", (PyObject *) &ScannerType);
+    Py_INCREF(&AutomatonType);
+    PyModule_AddObject(m, "Automaton", (PyObject *) &AutomatonType);
+}
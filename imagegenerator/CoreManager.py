@@ -101,3 +101,5 @@ def getInstance():
 
 import GeneratorCoreLinux
 import GeneratorCoreWin32
+import GeneratorCoreNative
+import GeneratorCoreRescue
@@ -0,0 +1,267 @@
+"""
+Core for the ImageGenerator - Implementation copying the source within the process.
+
+Instead of passing the request to the command C{dd}, the source is copied by this module itself. The
+source is read in large blocks (a multiple of the block size in the settings, so that reads stay
+aligned to sectors) by a reader thread, whilst the calling thread writes the previous block to the
+image file; two buffers are passed between the threads. Where available, the operating system is
+told that the source is read sequentially and that copied ranges are not needed in the cache anymore.
+The number of bytes written is put into the status instance after each block, together with the time
+waited for reading and writing (see L{Runtime.Status.addStalls}). If requested, the
+hashes of the image file are calculated from the blocks written (see L{ImageHasher}).
+
+Listing and size estimation of sources are passed to the core for the running operating system
+(L{GeneratorCoreLinux} or L{GeneratorCoreWin32}); it is chosen on creating the core. These modules
+are imported at the end of this module only, as importing them loads all cores (see L{CoreManager}) -
+including L{GeneratorCoreRescue}, which requires the class of this module. Reading devices requires the according permissions
+for the process.
+
+This module registers itself with the L{CoreManager} as a core.
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+
+
+@var NAME_IMPL: Name of this implementation
+@type NAME_IMPL: C{String}
+@var BUFFER_SIZE: Size of one block read from the source in bytes (rounded to the block size in the settings)
+@type BUFFER_SIZE: C{int}
+@var BUFFERS: Number of buffers passed between reader and writer
+@type BUFFERS: C{int}
+@var FADV_SEQUENTIAL: Advice for posix_fadvise - data is accessed sequentially
+@type FADV_SEQUENTIAL: C{int}
+@var FADV_DONTNEED: Advice for posix_fadvise - data is not accessed again
+@type FADV_DONTNEED: C{int}
+"""
+import GeneratorCoreAbstract
+import ImageHasher
+import io
+import os
+import threading
+import Queue
+import time
+
+NAME_IMPL = "Native"
+BUFFER_SIZE = 1024 * 1024
+BUFFERS = 2
+
+FADV_SEQUENTIAL = 2
+FADV_DONTNEED = 4
+
+try:
+    import ctypes
+    import ctypes.util
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'))
+    _fadvise = getattr(_libc, 'posix_fadvise64', None) or _libc.posix_fadvise
+    _fadvise.argtypes = [ctypes.c_int, ctypes.c_longlong, ctypes.c_longlong, ctypes.c_int]
+except (ImportError, OSError, AttributeError, TypeError):
+    _fadvise = None
+
+class GeneratorCore(GeneratorCoreAbstract.CoreInterface):
+    """
+    Class for implementing the core copying the source itself.
+
+    @ivar _settings: Settings for the execution
+    @type _settings: L{Runtime.Settings}
+    @ivar _platform: Core for the running operating system - for listing sources
+    @type _platform: L{GeneratorCoreAbstract.CoreInterface}
+    @ivar _stop: Indicates, that the reader shall stop (imaging has ended or failed)
+    @type _stop: C{Boolean}
+    """
+    def __init__(self, settings):
+        """
+        Initialises the core.
+
+        The parameters are assigned to instance variables and the super constructor
+        (L{GeneratorCoreAbstract.CoreInterface.__init__}) is called for initialising the name of the
+        implementation.
+        """
+        GeneratorCoreAbstract.CoreInterface.__init__(self, NAME_IMPL)
+        self._settings = settings
+        if os.name == "nt":
+            self._platform = GeneratorCoreWin32.GeneratorCore(settings)
+        else:
+            self._platform = GeneratorCoreLinux.GeneratorCore(settings)
+        self._stop = 0
+
+    def createImage(self, status):
+        """
+        Copies the source into the image file.
+
+        The source is opened and its size is put into the status instance as estimation for the
+        image file (if not set before). A reader thread (L{_read}) fills the buffers, which are
+        written to the image file here. After each block, the number of bytes written is updated in
+        the status instance. If hashes are requested, each block is hashed as well and the hashes are
+        written next to the image file at the end (see L{Runtime.Settings.getHashFile}). Afterwards, the
+        status object is set to finished. If reading or writing fails, the error field in the status
+        instance is set.
+
+        @param status: Reference to the status object used for this execution
+        @type status: L{Runtime.Status}
+        @return: 0 if the image has been created, 1 otherwise
+        @rtype: C{int}
+        """
+        blocksize = self._settings.getBlocksize()
+        buffersize = max(BUFFER_SIZE / blocksize, 1) * blocksize
+        self._stop = 0
+        infile = outfile = reader = hasher = None
+        try:
+            try:
+                if self._settings.getHashes():
+                    hasher = ImageHasher.ImageHasher(self._settings.getHashes(), self._settings.getSegment())
+                infile = io.FileIO(self._settings.getSource(), 'r')
+                size = _getSize(infile)
+                if size and not status.getEndFilesize():
+                    status.setEndFilesize(size)
+                _advise(infile, 0, 0, FADV_SEQUENTIAL)
+                outfile = io.FileIO(self._settings.getDestination(), 'w')
+
+                free = Queue.Queue()
+                full = Queue.Queue()
+                for i in range(BUFFERS):
+                    free.put(bytearray(buffersize))
+                reader = threading.Thread(target = self._read, args = (infile, free, full))
+                reader.setDaemon(True)
+                reader.start()
+
+                copied = 0
+                while 1:
+                    waiting = time.time()
+                    item = full.get()
+                    if item == None:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    buffer, length = item
+                    writing = time.time()
+                    _writeAll(outfile, memoryview(buffer)[:length])
+                    status.addStalls(writing - waiting, time.time() - writing)
+                    if hasher:
+                        hasher.update(memoryview(buffer)[:length].tobytes())
+                    copied += length
+                    status.updateDestinationFileSize(copied)
+                    free.put(buffer)
+                if hasher:
+                    hasher.close()
+                    hasher.write(self._settings.getHashFile(), self._settings.getSource(), self._settings.getDestination())
+                    status.setHashes(hasher.getHashes())
+            except ValueError, msg:
+                status.setError("Native Core: \nUnsupported hash algorithm\n%s" %(str(msg)))
+                return 1
+            except EnvironmentError, msg:
+                status.setError("Native Core: \nError whilst imaging\n%s" %(str(msg)))
+                return 1
+        finally:
+            if reader:
+                self._stop = 1
+                free.put(None)
+                reader.join()
+            if hasher:
+                hasher.close()
+            if outfile:
+                outfile.close()
+            if infile:
+                infile.close()
+            status.setFinished()
+        return 0
+
+    def _read(self, infile, free, full):
+        """
+        Main loop of the reader thread - reads the source into free buffers until its end.
+
+        Filled buffers are passed as tuples (buffer, number of bytes) to the queue of full buffers;
+        the end of the source is indicated by C{None} and a failure by the exception raised.
+
+        @param infile: Opened source
+        @type infile: C{io.FileIO}
+        @param free: Buffers to be filled
+        @type free: C{Queue.Queue} of C{bytearray}
+        @param full: Filled buffers
+        @type full: C{Queue.Queue}
+        """
+        offset = 0
+        try:
+            while 1:
+                buffer = free.get()
+                if self._stop:
+                    return
+                length = infile.readinto(buffer)
+                if not length:
+                    full.put(None)
+                    return
+                _advise(infile, offset, length, FADV_DONTNEED)
+                offset += length
+                full.put((buffer, length))
+        except EnvironmentError, msg:
+            full.put(msg)
+
+    def getPossibleSources(self):
+        """
+        Provides the sources known to the core for the running operating system.
+        """
+        return self._platform.getPossibleSources()
+
+    def getSourceInfo(self):
+        """
+        Explains the sources provided by L{getPossibleSources}.
+        """
+        return self._platform.getSourceInfo()
+
+    def getSizeEstimationForPartition(self, partitionName):
+        """
+        Estimates the size of a partition by means of the core for the running operating system.
+        """
+        return self._platform.getSizeEstimationForPartition(partitionName)
+
+    def getDefaultDDLocation(self):
+        """
+        No command C{dd} is required for this implementation.
+
+        @return: An empty location
+        @rtype: C{String}
+        """
+        return ""
+
+def _getSize(filehandle):
+    """
+    Determines the size of a source by seeking its end (works for devices as well).
+
+    @return: Size in bytes; C{None} if the size cannot be determined
+    @rtype: C{int}
+    """
+    try:
+        size = filehandle.seek(0, 2)
+        filehandle.seek(0)
+        return size
+    except EnvironmentError:
+        return None
+
+def _advise(filehandle, offset, length, advice):
+    """
+    Passes an advice about accessing a file to the operating system, if supported.
+    """
+    if _fadvise != None:
+        _fadvise(filehandle.fileno(), offset, length, advice)
+
+def _writeAll(filehandle, data):
+    """
+    Writes the entire data - the raw file may accept parts only.
+    """
+    while len(data):
+        written = filehandle.write(data)
+        data = data[written:]
+
+import GeneratorCoreLinux
+import GeneratorCoreWin32
+import CoreManager
+CoreManager.getInstance().registerCore(NAME_IMPL, GeneratorCore)
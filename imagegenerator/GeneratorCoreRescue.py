@@ -0,0 +1,186 @@
+"""
+Core for the ImageGenerator - Implementation for rescuing failing media.
+
+Other than C{dd}, this core does not give up at the first unreadable sector. The source is read in
+two passes:
+    1. All untried ranges are read in large blocks; a block, which cannot be read, is marked as
+    failed and skipped.
+    2. All failed ranges (and the ranges, which stayed unreadable in earlier runs) are read again
+    sector by sector (the block size in the settings); sectors, which cannot be read, are marked
+    as bad.
+
+Unreadable ranges are filled with zeros in the image file or left untouched (see
+L{Runtime.Settings.getFill}), so that everything else is found at its original position. The state
+of all ranges is kept in a map file (see L{RescueMap}) - if the map file exists for the image
+file, a later run continues the rescue and only reads the ranges not read so far.
+
+This module registers itself with the L{CoreManager} as a core.
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+
+
+@var NAME_IMPL: Name of this implementation
+@type NAME_IMPL: C{String}
+@var MAP_SAVE_INTERVAL: Delay between two savings of the map file during the rescue in seconds
+@type MAP_SAVE_INTERVAL: C{int}
+"""
+import GeneratorCoreAbstract
+import GeneratorCoreNative
+import RescueMap
+import Runtime
+import CoreManager
+import io
+import os.path
+import time
+
+NAME_IMPL = "Rescue"
+MAP_SAVE_INTERVAL = 10
+
+class GeneratorCore(GeneratorCoreNative.GeneratorCore):
+    """
+    Class for implementing the core rescuing failing media.
+
+    @ivar _settings: Settings for the execution
+    @type _settings: L{Runtime.Settings}
+    @ivar _rescued: Number of bytes read successfully so far
+    @type _rescued: C{int}
+    @ivar _nextSave: Time for saving the map file next time
+    @type _nextSave: C{float}
+    """
+    def __init__(self, settings):
+        """
+        Initialises the core.
+
+        The parameters are assigned to instance variables and the super constructor
+        (L{GeneratorCoreAbstract.CoreInterface.__init__}) is called for initialising the name of the
+        implementation.
+        """
+        GeneratorCoreNative.GeneratorCore.__init__(self, settings)
+        GeneratorCoreAbstract.CoreInterface.__init__(self, NAME_IMPL)
+        self._rescued = 0
+        self._nextSave = 0
+
+    def createImage(self, status):
+        """
+        Rescues the source into the image file.
+
+        If both the map file and the image file exist, the map is loaded and the image file is
+        continued; otherwise, a new image file is created. The size of the source is put into the
+        status instance as estimation for the image file, the number of bytes rescued is updated
+        after each block. The map file is saved frequently and at the end, also if the rescue is
+        interrupted. Afterwards, the status object is set to finished.
+
+        @param status: Reference to the status object used for this execution
+        @type status: L{Runtime.Status}
+        @return: 0 if the entire source has been read, 2 if ranges stayed unreadable (the image file is
+        complete otherwise), 1 on any other error
+        @rtype: C{int}
+        """
+        mapname = self._settings.getMapFile()
+        destination = self._settings.getDestination()
+        blocksize = self._settings.getBlocksize()
+        buffersize = max(GeneratorCoreNative.BUFFER_SIZE / blocksize, 1) * blocksize
+        infile = outfile = rescuemap = None
+        try:
+            try:
+                infile = io.FileIO(self._settings.getSource(), 'r')
+                size = GeneratorCoreNative._getSize(infile)
+                if size == None:
+                    status.setError("Rescue Core: \nSize of source cannot be determined")
+                    return 1
+                status.setEndFilesize(size)
+                GeneratorCoreNative._advise(infile, 0, 0, GeneratorCoreNative.FADV_SEQUENTIAL)
+                if os.path.exists(mapname) and os.path.exists(destination):
+                    rescuemap = RescueMap.loadMap(mapname, size)
+                    outfile = io.FileIO(destination, 'r+')
+                else:
+                    rescuemap = RescueMap.RescueMap(size)
+                    outfile = io.FileIO(destination, 'w')
+                outfile.truncate(size)
+                self._rescued = rescuemap.getSize(RescueMap.GOOD)
+                status.updateDestinationFileSize(self._rescued)
+                self._nextSave = time.time() + MAP_SAVE_INTERVAL
+
+                rescuemap.phase = 1
+                for start, length in rescuemap.getRanges([RescueMap.UNTRIED]):
+                    self._copyRange(infile, outfile, rescuemap, start, length, buffersize, RescueMap.FAILED, status)
+                rescuemap.phase = 2
+                for start, length in rescuemap.getRanges([RescueMap.FAILED, RescueMap.BAD]):
+                    self._copyRange(infile, outfile, rescuemap, start, length, blocksize, RescueMap.BAD, status)
+
+                bad = rescuemap.getSize(RescueMap.BAD)
+                if bad:
+                    status.setError("Rescue Core: \n%d Bytes could not be read\nCheck map file '%s'." %(bad, mapname))
+                    return 2
+            except EnvironmentError, msg:
+                status.setError("Rescue Core: \nError whilst imaging\n%s" %(str(msg)))
+                return 1
+        finally:
+            if rescuemap:
+                try:
+                    rescuemap.save(mapname)
+                except EnvironmentError, msg:
+                    status.setError("Rescue Core: \nMap file '%s' cannot be written\n%s" %(mapname, str(msg)))
+            if outfile:
+                outfile.close()
+            if infile:
+                infile.close()
+            status.setFinished()
+        return 0
+
+    def _copyRange(self, infile, outfile, rescuemap, start, length, chunksize, failstate, status):
+        """
+        Copies one range of the source in chunks of the given size and updates the map.
+
+        Chunks are aligned to multiples of their size. Chunks, which cannot be read, are marked with
+        the given state and, if requested, filled with zeros. Errors on writing the image file are
+        passed to the caller.
+
+        @param chunksize: Number of bytes read at once
+        @type chunksize: C{int}
+        @param failstate: State for chunks, which cannot be read (L{RescueMap.FAILED} or L{RescueMap.BAD})
+        @type failstate: C{String}
+        """
+        pos = start
+        end = start + length
+        while pos < end:
+            count = min(chunksize - pos % chunksize, end - pos)
+            reading = time.time()
+            try:
+                infile.seek(pos)
+                data = infile.read(count)
+            except EnvironmentError:
+                data = None
+            writing = time.time()
+            if data:
+                outfile.seek(pos)
+                GeneratorCoreNative._writeAll(outfile, data)
+                status.addStalls(writing - reading, time.time() - writing)
+                rescuemap.mark(pos, len(data), RescueMap.GOOD)
+                self._rescued += len(data)
+                status.updateDestinationFileSize(self._rescued)
+                pos += len(data)
+            else:
+                rescuemap.mark(pos, count, failstate)
+                if self._settings.getFill() == Runtime.FILL_ZERO:
+                    outfile.seek(pos)
+                    GeneratorCoreNative._writeAll(outfile, '\x00' * count)
+                status.addStalls(writing - reading, time.time() - writing)
+                pos += count
+            rescuemap.position = pos
+            if time.time() >= self._nextSave:
+                rescuemap.save(self._settings.getMapFile())
+                self._nextSave = time.time() + MAP_SAVE_INTERVAL
+
+CoreManager.getInstance().registerCore(NAME_IMPL, GeneratorCore)
@@ -72,9 +72,9 @@ class GeneratorCore(GeneratorCoreAbstract.CoreInterface):
         Invokes the OS command for the image generation.
         
         The filesize observer (L{Runtime.FileSizeObserver}) is started and after assembling the command
-        it is started using the L{os.system} method. Afterwards, the status object is set to finished.
-        Corrosponging to the return value of the system call, the error field in the status instance
-        is set.
+        it is started using the L{os.system} method. Corrosponging to the return value of the system
+        call, the error field in the status instance is set. Afterwards, the status object is set to
+        finished.
         
         @param status: Reference to the status object used for this execution
         @type status: L{Runtime.Status}
@@ -88,9 +88,10 @@ class GeneratorCore(GeneratorCoreAbstract.CoreInterface):
         print command
         ret = os.system(command)
         
-        status.setFinished()
         if ret != 0:
             status.setError("Error whilst imaging")
+        filesize_observer.update()
+        status.setFinished()
         return ret
         
     def _assembleCommand(self):
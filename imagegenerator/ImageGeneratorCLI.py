@@ -3,8 +3,9 @@
 Command line interface for the ImageGenerator. 
 
 Also holds a class for generating runtime output containing the file size of the created
-image file (class L{OutputObserver}). This class is its own thread, this is nessecary because
-the execution of the command itself would block the thread otherwise.
+image file, the throughput and the remaining time (class L{OutputObserver}). It is registered as
+listener with the status instance (see L{Runtime.Status.addListener}), this is nessecary because
+the execution of the command itself blocks the thread.
 
 This module can start the application. It is checking for the call of the __main__ function and
 will in case initalise and start the ImageGenerator CLI version.
@@ -31,7 +32,6 @@ along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 import Runtime
 import CoreManager
 import sys
-import threading, time
 import ImageSettings
 
 OUTPUT_DELAY = 1    # in seconds; delay between 2 outputs
@@ -99,6 +99,10 @@ class ImageGeneratorCLI:
         
         destination = raw_input("Destination file (image file): ")
         settings.setDestination(destination)
+
+        hashes = raw_input("Hashes of the image file, e.g. md5,sha256 (Native core only; empty for none): ")
+        if hashes.strip() != "":
+            settings.setHashes(hashes.replace(",", " ").split())
         
         status = Runtime.Status()
         output = OutputObserver(status)
@@ -115,6 +119,10 @@ class ImageGeneratorCLI:
                 secs = '0' + secs
             print ("\nImage created sucessfully. Size of image: %d Bytes. Time: %s mins %s secs." 
                 %(status.getDestinationFileSize(), mins, secs ))
+            if status.getHashes():
+                for name, digest in status.getHashes():
+                    print ("%s: %s" %(name, digest))
+                print ("Hashes written to %s." %(settings.getHashFile()))
         else:
             print ("\nAn error occured during the imaging - error code: %d." %ret)
             print ("Output of the OS command:")
@@ -126,61 +134,84 @@ class ImageGeneratorCLI:
                 print (st)
             print ("-" * 80)
 
-class OutputObserver(threading.Thread):
+class OutputObserver:
     """
-    Observes the status object and print frequent output about the file size of the image file.
+    Listens to the status object and print frequent output about the progress of the image file.
     
     @ivar _status: Reference to the status object
     @type _status: L{Runtime.Status}
     @ivar _buffer: Buffer, to print the output to. 
     @type _buffer: C{Buffer} - must support the functions C{write()} and C{flush()}
+    @ivar _length: Length of the line printed last time (to be overwritten by the next one)
+    @type _length: C{int}
     """
     def __init__(self, status, buffer = sys.stdout):
         """
         Initialises the OutputObserver instance.
         
-        The thread is initialised and the parameters are assigned instance variables.
+        The parameters are assigned instance variables.
         
         @param status: Status instance for this execution.
         @type status: L{Runtime.Status}
         @param buffer: Buffer, to print the output to. Default is standard output.
         @type buffer: C{Buffer} - must support the functions C{write()} and C{flush()}
         """
-        threading.Thread.__init__(self)
         self._status = status
         self._buffer = buffer
+        self._length = 0
         
-    def run(self):
+    def start(self):
         """
-        Is invoked whenever the method C{start()} (inherited from thread) is called from outside.
-        
-        Invokes the private method _observe inside this class.
+        Registers this observer with the status instance - output is printed every L{OUTPUT_DELAY} 
+        seconds from now on.
         """
-        self._observe()
+        self._status.addListener(self._statusChanged, OUTPUT_DELAY)
         
-    def _observe(self):
+    def _statusChanged(self, event, snapshot):
         """
-        Checks the file size of the output file and print output frequently.
+        Prints the progress pushed by the status instance.
         
-        Runs as long as the function L{Runtime.Status.isFinished} returns true. The size of the 
-        destination file is gained from the status object and printed to the before defined 
-        buffer. After a delay of L{OUTPUT_DELAY} seconds this process is performed again
-        and again.
+        The line printed before is overwritten with the size of the destination file, the elapsed
+        time, the throughput, the remaining time and the time spent waiting for reading and writing.
+        Once the imaging has finished, this observer unregisters itself.
+        
+        @param event: Event sent by the status instance
+        @type event: C{int}
+        @param snapshot: Current status of the imaging
+        @type snapshot: L{Runtime.ImagingSnapshot}
         """
-        while not self._status.isFinished():
-            size = self._status.getDestinationFileSize()
-            self._buffer.write(chr(0x08) * 80)
-            self._buffer.write("Current size of image file: " + str(size) + " Bytes.")
-            time1 = self._status.getElapsedTime()
-            mins = str (int(time1) / 60)
-            if len(mins) < 2:
-                mins = '0' + mins
-            secs = str (int(time1) % 60)
-            if len(secs) < 2:
-                secs = '0' + secs
-            self._buffer.write(" Time elapsed: %s:%s" %(mins,secs))
-            self._buffer.flush()
-            time.sleep (OUTPUT_DELAY)
+        if event == Runtime.EVENT_FINISHED:
+            self._status.removeListener(self._statusChanged)
+            return
+        st = "Current size of image file: " + str(snapshot.size) + " Bytes."
+        st += " Time elapsed: %s" %(_formatTime(snapshot.elapsed))
+        if snapshot.throughput != None:
+            st += " %.1f MB/s" %(snapshot.throughput)
+        if snapshot.remaining != None:
+            st += " Remaining: %s" %(_formatTime(snapshot.remaining))
+        if snapshot.read_stall or snapshot.write_stall:
+            st += " (waited %ds reading, %ds writing)" %(snapshot.read_stall, snapshot.write_stall)
+        self._buffer.write(chr(0x08) * self._length)
+        self._buffer.write(st.ljust(self._length))
+        self._buffer.flush()
+        self._length = max(len(st), self._length)
+
+def _formatTime(seconds):
+    """
+    Formats a period as minutes and seconds.
+    
+    @param seconds: Period in seconds
+    @type seconds: C{float}
+    @return: Period formatted as mm:ss
+    @rtype: C{String}
+    """
+    mins = str (int(seconds) / 60)
+    if len(mins) < 2:
+        mins = '0' + mins
+    secs = str (int(seconds) % 60)
+    if len(secs) < 2:
+        secs = '0' + secs
+    return "%s:%s" %(mins, secs)
         
 if __name__ == "__main__":
     arguments = sys.argv
@@ -0,0 +1,177 @@
+"""
+Calculates hashes of an image file whilst it is created, so that its integrity may be proven without
+reading it once more.
+
+The imaging core passes each block written to the image file to an L{ImageHasher}; the hashes are
+calculated in a thread of their own, so that copying continues meanwhile. Besides the hashes of the
+entire image, hashes for each segment of a fixed size (piecewise hashes) may be calculated - they
+point out the damaged parts of an image file later on. Finally, all hashes are written to a file
+next to the image file (see L{Runtime.Settings.getHashFile})::
+
+    # Hashes of ImageGenerator
+    source  /dev/sdb
+    image  /tmp/image
+    size  1073741824
+    md5  9e107d9d372bb6826bd81d3542a419d6
+    sha256  d7a8fbb307d7809469ca9abcb0082e4f8d5651e46d3cdb762d02d0bf37c9e592
+    # piecewise hashes - position, size, algorithm, hash
+    0x00000000  0x01000000  md5  ...
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+
+
+@var QUEUE_LENGTH: Number of blocks waiting for being hashed at most
+@type QUEUE_LENGTH: C{int}
+"""
+import hashlib
+import threading
+import Queue
+
+QUEUE_LENGTH = 8
+
+class ImageHasher:
+    """
+    Hashes the blocks of an image file in a thread of its own.
+
+    @ivar _hashes: Hash objects for the entire image - tuples (name of algorithm, hash object)
+    @type _hashes: C{List} of C{Tuples}
+    @ivar _segment: Size of the segments for piecewise hashes (0 for none)
+    @type _segment: C{int}
+    @ivar _pieces: Piecewise hashes calculated so far - tuples (position, size, name of algorithm, hash)
+    @type _pieces: C{List} of C{Tuples}
+    @ivar _current: Position and hash objects of the current segment (C{None} before the first block of a segment)
+    @type _current: C{Tuple}
+    @ivar _size: Number of bytes hashed so far
+    @type _size: C{int}
+    @ivar _queue: Blocks waiting for being hashed
+    @type _queue: C{Queue.Queue}
+    @ivar _thread: Thread calculating the hashes
+    @type _thread: C{threading.Thread}
+    """
+    def __init__(self, algorithms, segment = 0):
+        """
+        Starts the thread calculating the hashes.
+
+        @param algorithms: Names of the hash algorithms (as for C{hashlib.new})
+        @type algorithms: C{List} of C{String}
+        @param segment: Size of the segments for piecewise hashes in bytes (0 for none)
+        @type segment: C{int}
+        """
+        self._hashes = [(name, hashlib.new(name)) for name in algorithms]
+        self._segment = segment
+        self._pieces = []
+        self._current = None
+        self._size = 0
+        self._queue = Queue.Queue(QUEUE_LENGTH)
+        self._thread = threading.Thread(target = self._run)
+        self._thread.setDaemon(True)
+        self._thread.start()
+
+    def update(self, data):
+        """
+        Passes the next block of the image file for being hashed.
+
+        Blocks, if the thread has fallen behind by L{QUEUE_LENGTH} blocks. The data must not be
+        changed afterwards.
+
+        @param data: Next block of the image file
+        @type data: C{String}
+        """
+        self._queue.put(data)
+
+    def close(self):
+        """
+        Waits until all blocks have been hashed and stops the thread.
+        """
+        if self._thread != None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def getHashes(self):
+        """
+        Provides the hashes of the entire image file (call L{close} first).
+
+        @return: Tuples (name of algorithm, hash in hexadecimal)
+        @rtype: C{List} of C{Tuples}
+        """
+        return [(name, hash.hexdigest()) for name, hash in self._hashes]
+
+    def write(self, filename, source, destination):
+        """
+        Writes all hashes to a file (call L{close} first).
+
+        @param filename: Name of the file for the hashes
+        @type filename: C{String}
+        @param source: Name of the source imaged
+        @type source: C{String}
+        @param destination: Name of the image file
+        @type destination: C{String}
+        """
+        file = open(filename, 'w')
+        try:
+            file.write("# Hashes of ImageGenerator\n")
+            file.write("source  %s\n" %(source))
+            file.write("image  %s\n" %(destination))
+            file.write("size  %d\n" %(self._size))
+            for name, digest in self.getHashes():
+                file.write("%s  %s\n" %(name, digest))
+            if self._segment:
+                file.write("# piecewise hashes - position, size, algorithm, hash\n")
+                for pos, length, name, digest in self._pieces:
+                    file.write("0x%08X  0x%08X  %s  %s\n" %(pos, length, name, digest))
+        finally:
+            file.close()
+
+    def _run(self):
+        """
+        Main loop of the thread - hashes blocks until receiving C{None} from the queue.
+        """
+        while 1:
+            data = self._queue.get()
+            if data == None:
+                break
+            for name, hash in self._hashes:
+                hash.update(data)
+            if self._segment:
+                self._updatePieces(data)
+            else:
+                self._size += len(data)
+        if self._current != None:
+            self._finishPiece()
+
+    def _updatePieces(self, data):
+        """
+        Adds a block to the piecewise hashes - the block is split at the borders of segments.
+        """
+        pos = 0
+        while pos < len(data):
+            if self._current == None:
+                self._current = (self._size, [(name, hashlib.new(name)) for name, hash in self._hashes])
+            count = min(self._segment - (self._size - self._current[0]), len(data) - pos)
+            for name, hash in self._current[1]:
+                hash.update(buffer(data, pos, count))
+            pos += count
+            self._size += count
+            if self._size - self._current[0] == self._segment:
+                self._finishPiece()
+
+    def _finishPiece(self):
+        """
+        Remembers the hashes of the current segment.
+        """
+        start, hashes = self._current
+        for name, hash in hashes:
+            self._pieces.append((start, self._size - start, name, hash.hexdigest()))
+        self._current = None
@@ -24,9 +24,10 @@ along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 @type DEF_SIZE: Couple of 2 C{int}
 @var _ID_OK: ID for event handling
 @type _ID_OK: C{int}
-@var _TIMER_ID: ID for timer event handling
-@type _TIMER_ID: C{int}
+@var _UPDATE_INTERVAL: Minimum delay between two updates of the dialog in seconds
+@type _UPDATE_INTERVAL: C{float}
 """
+import Runtime
 import Tools
 import wx
 
@@ -34,7 +35,7 @@ DEF_TITLE = "Progress of imaging process"
 DEF_SIZE = (400, 400)
 
 _ID_OK = 201
-_TIMER_ID = 501
+_UPDATE_INTERVAL = 1.0
 
 class ProgressDialog(wx.Dialog):
     """
@@ -43,8 +44,8 @@ class ProgressDialog(wx.Dialog):
     Maintains some status information and a progress bar, which is, based on time,
     progressing from the beginning to the end all the time. 
     
-    The status instance is constantly observed (controlled by a time) and new data
-    in there is updated to the fields on the dialog.
+    The dialog is registered as listener with the status instance (see L{Runtime.Status.addListener});
+    the progress pushed by the core is updated to the fields on the dialog.
     
     @ivar _settings: Settings instance for this generation
     @type _settings: L{Runtime.Settings}
@@ -55,8 +56,8 @@ class ProgressDialog(wx.Dialog):
         """
         Initialises the progress dialog.
         
-        The controls are placed and the events are registerd. The timer is also
-        initialised. 
+        The controls are placed and the events are registerd. The dialog is also
+        registered as listener with the status instance. 
         
         Finally, the constructor brings up the dialog itself in a
         modal manner. So, do NOT call L{ShowModal} from the outside!
@@ -86,12 +87,16 @@ class ProgressDialog(wx.Dialog):
         self._lStartTime = wx.StaticText(panel_outer, -1, "Start Time: ")
         self._lFilesize = wx.StaticText(panel_outer, -1, "File Size: ")
         self._lTimeElapsed = wx.StaticText(panel_outer, -1, "Time elapsed: ")
+        self._lStalls = wx.StaticText(panel_outer, -1, "Waited for: ")
 
         self._gauge = wx.Gauge(panel_outer, -1, 10000)
         self._gauge.SetValue(0)
         
         self._bOK = wx.Button(panel_outer, _ID_OK, "OK")
-        self._updateValues(None)
+        self._lSource.SetLabel("Source: " + self._settings.getSource())
+        self._lDestination.SetLabel("Image File: " + self._settings.getDestination())
+        starttime = Tools.processTime(int(self._status.getStartTime()) % (60 * 60 * 24))
+        self._lStartTime.SetLabel("Start Time: " + starttime[0] + ":" + starttime[1] + ":" + starttime[2])
 
         panel_fill_hor1 = wx.Panel(panel_outer, -1)
 ##        panel_fill_hor1.SetBackgroundColour(wx.RED)
@@ -112,6 +117,7 @@ class ProgressDialog(wx.Dialog):
         box.Add(panel_fill_hor2, 1, wx.EXPAND)
         box.Add(self._lFilesize, 1, wx.EXPAND)
         box.Add(self._lTimeElapsed, 1, wx.EXPAND)
+        box.Add(self._lStalls, 1, wx.EXPAND)
         box.Add(panel_fill_hor3, 1, wx.EXPAND)
         box.Add(self._gauge, 1, wx.EXPAND)
         box.Add(panel_fill_hor4, 1, wx.EXPAND)
@@ -137,50 +143,64 @@ class ProgressDialog(wx.Dialog):
         self.SetSizer(boxo)
         self.Layout()
         
-        self._mytimer = wx.Timer(self, _TIMER_ID)
-        self._mytimer.Start(1000, 0)
-        
         self._bOK.Enable(0)
-        wx.EVT_TIMER(self, _TIMER_ID, self._updateValues)
         wx.EVT_BUTTON(self, _ID_OK, self._evtOK)
+        self._status.addListener(self._statusChanged, _UPDATE_INTERVAL)
+        # the imaging might have finished before registering
+        self._updateValues(self._status.getSnapshot())
         self.ShowModal()
 
-    def _updateValues(self, event):
+    def _statusChanged(self, event, snapshot):
+        """
+        Listener for the status instance - passes the snapshot to the thread of the GUI.
+        
+        Once the imaging has finished, the dialog unregisters itself.
+        
+        @param event: Event sent by the status instance
+        @type event: C{int}
+        @param snapshot: Current status of the imaging
+        @type snapshot: L{Runtime.ImagingSnapshot}
+        """
+        if event == Runtime.EVENT_FINISHED:
+            self._status.removeListener(self._statusChanged)
+        wx.CallAfter(self._updateValues, snapshot)
+
+    def _updateValues(self, snapshot):
         """
         Function to be called frequently for updating the controls on the dialog window.
         
-        This function is called by the time every second. It gains the latest data from 
-        the status instance and updates the values for the controls. The gauge for the 
-        progress is just put forward a certain amount of progress.
+        This function is called for each snapshot pushed by the status instance (at most every
+        L{_UPDATE_INTERVAL} seconds) and updates the values for the controls. If the size of the
+        image is unknown, the gauge for the progress is just put forward a certain amount of progress.
         
-        If the status instance indicates the end of the execution, the title of the dialog
+        If the snapshot indicates the end of the execution, the title of the dialog
         is either set to "finished" or to "error" depending on the value for error in the
-        status instance.
+        snapshot.
         
-        @param event: Event causing this function.
+        @param snapshot: Status of the imaging to be shown
+        @type snapshot: L{Runtime.ImagingSnapshot}
         """
-        self._lSource.SetLabel("Source: " + self._settings.getSource())
-        self._lDestination.SetLabel("Image File: " + self._settings.getDestination())
-        starttime = Tools.processTime(int(self._status.getStartTime()) % (60 * 60 * 24))
-        self._lStartTime.SetLabel("Start Time: " + starttime[0] + ":" + starttime[1] + ":" + starttime[2])
-
-        elapsed = Tools.processTime(self._status.getElapsedTime())
-        if self._status.getEndFilesize():
-            self._lFilesize.SetLabel("File Size: %s / %s (%d %%)" %(self._formatSize(self._status.getDestinationFileSize()), self._formatSize(self._status.getEndFilesize()), (self._status.getDestinationFileSize() * 100 / self._status.getEndFilesize())))
-            self._gauge.SetValue(int(self._status.getDestinationFileSize() * 10000 / self._status.getEndFilesize()))
-            if  self._status.getDestinationFileSize() != 0 and  self._status.getEndFilesize() - self._status.getDestinationFileSize() != 0:
-                remaining = self._status.getElapsedTime() / self._status.getDestinationFileSize() * (self._status.getEndFilesize() - self._status.getDestinationFileSize())
-                remaining = Tools.processTime(remaining)
+        elapsed = Tools.processTime(snapshot.elapsed)
+        throughput = ""
+        if snapshot.throughput != None:
+            throughput = "  %.1f MB/s" %(snapshot.throughput)
+        if snapshot.endsize:
+            self._lFilesize.SetLabel("File Size: %s / %s (%d %%)%s" %(self._formatSize(snapshot.size), self._formatSize(snapshot.endsize), (snapshot.size * 100 / snapshot.endsize), throughput))
+            self._gauge.SetValue(int(snapshot.size * 10000 / snapshot.endsize))
+            if snapshot.remaining != None:
+                remaining = Tools.processTime(snapshot.remaining)
                 self._lTimeElapsed.SetLabel("Time elapsed: " + elapsed[0] + ":" + elapsed[1] + ":" + elapsed[2] + "  (remaining: " + remaining[0] + ":" + remaining[1] + ":" + remaining[2] + ")")
         else:
-            self._lFilesize.SetLabel("File Size: %s" %(self._formatSize(self._status.getDestinationFileSize())))
+            self._lFilesize.SetLabel("File Size: %s%s" %(self._formatSize(snapshot.size), throughput))
             val = self._gauge.GetValue()
             self._gauge.SetValue((val + 2000 ) % 10000)
             self._lTimeElapsed.SetLabel("Time elapsed: " + elapsed[0] + ":" + elapsed[1] + ":" + elapsed[2])
+        if snapshot.read_stall or snapshot.write_stall:
+            self._lStalls.SetLabel("Waited for: reading %d s, writing %d s" %(snapshot.read_stall, snapshot.write_stall))
         
         
-        if self._status.isFinished():
-            if self._status.getError() != None:
+        if snapshot.finished:
+            if snapshot.error != None:
                 self._lTitle.SetLabel("Error whilst Imaging")
             else:
                 self._lTitle.SetLabel("Imaging finished")
@@ -199,11 +219,10 @@ class ProgressDialog(wx.Dialog):
         """
         Event handler function, called when the OK button is pressed.
         
-        Stops the timer and end the modality of the dialog. Finally, the dialog is destroyed.
+        Ends the modality of the dialog. Finally, the dialog is destroyed.
         
         @param event: Event causing this function.
         """
-        self._mytimer.Stop()
         self.EndModal(1)
         self.Destroy()
     
@@ -0,0 +1,208 @@
+"""
+Map of a source being rescued - remembers which ranges have been read, which have failed and which
+have not been tried yet.
+
+The map is stored in a text file next to the image (see L{GeneratorCoreRescue}), so that a later run
+continues with the ranges not read so far. The layout of the file is similar to the map files of GNU
+ddrescue - comment lines starting with '#', one line with the current position and pass and one line
+for each range with position, size and state (positions and sizes in hexadecimal)::
+
+    # Rescue map of ImageGenerator
+    0x00000000  1
+    0x00000000  0x00100000  +
+    0x00100000  0x00010000  *
+    0x00110000  0x00EF0000  ?
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+
+
+@var UNTRIED: State of ranges not read yet
+@type UNTRIED: C{String}
+@var FAILED: State of ranges, which could not be read in large blocks
+@type FAILED: C{String}
+@var BAD: State of ranges, which could not be read sector by sector either
+@type BAD: C{String}
+@var GOOD: State of ranges read successfully
+@type GOOD: C{String}
+"""
+import os
+import os.path
+import bisect
+
+UNTRIED = '?'
+FAILED = '*'
+BAD = '-'
+GOOD = '+'
+
+class RescueMap:
+    """
+    Ranges of a source with their state.
+
+    @ivar size: Size of the source in bytes
+    @type size: C{int}
+    @ivar position: Position the rescue has got to
+    @type position: C{int}
+    @ivar phase: Current pass of the rescue (1 for large blocks, 2 for retrying sector by sector)
+    @type phase: C{int}
+    @ivar _ranges: Adjacent ranges covering the source - lists (start, length, state); neighbouring
+    ranges never share their state
+    @type _ranges: C{List} of C{Lists}
+    @ivar _starts: First byte of each range in L{_ranges} - for looking up ranges by position
+    @type _starts: C{List} of C{int}
+    """
+    def __init__(self, size):
+        """
+        Creates a map with the entire source untried.
+
+        @param size: Size of the source in bytes
+        @type size: C{int}
+        """
+        self.size = size
+        self.position = 0
+        self.phase = 1
+        self._ranges = [[0, size, UNTRIED]]
+        self._starts = [0]
+
+    def mark(self, start, length, state):
+        """
+        Sets the state of a range; the ranges around are split or merged as required.
+
+        Only the ranges overlapping the given one and their neighbours are looked up (by bisection)
+        and replaced - hence, the effort does not depend on the number of ranges in the map.
+
+        @param start: First byte of the range
+        @type start: C{int}
+        @param length: Number of bytes
+        @type length: C{int}
+        @param state: New state of the range (L{UNTRIED}, L{FAILED}, L{BAD} or L{GOOD})
+        @type state: C{String}
+        """
+        end = min(start + length, self.size)
+        start = max(start, 0)
+        if start >= end:
+            return
+        # ranges lo to hi - 1 overlap the given range; their neighbours are merged as well
+        lo = bisect.bisect_right(self._starts, start) - 1
+        hi = bisect.bisect_left(self._starts, end)
+        first, last = self._ranges[lo], self._ranges[hi - 1]
+        ranges = [[start, end - start, state]]
+        if first[0] < start:
+            ranges.insert(0, [first[0], start - first[0], first[2]])
+        if last[0] + last[1] > end:
+            ranges.append([end, last[0] + last[1] - end, last[2]])
+        if lo > 0:
+            lo -= 1
+            ranges.insert(0, list(self._ranges[lo]))
+        if hi < len(self._ranges):
+            ranges.append(list(self._ranges[hi]))
+            hi += 1
+        merged = []
+        for r in ranges:
+            if merged and merged[-1][2] == r[2]:
+                merged[-1][1] += r[1]
+            else:
+                merged.append(r)
+        self._ranges[lo:hi] = merged
+        self._starts[lo:hi] = [r[0] for r in merged]
+
+    def getRanges(self, states):
+        """
+        Provides the ranges in one of the given states.
+
+        @param states: States of interest
+        @type states: C{List} of C{String}
+        @return: Tuples (start, length) in ascending order
+        @rtype: C{List} of C{Tuples}
+        """
+        return [(start, length) for start, length, state in self._ranges if state in states]
+
+    def getSize(self, state):
+        """
+        Sums up the size of all ranges in the given state.
+
+        @return: Number of bytes
+        @rtype: C{int}
+        """
+        sum = 0
+        for start, length, rstate in self._ranges:
+            if rstate == state:
+                sum += length
+        return sum
+
+    def isComplete(self):
+        """
+        @return: Indicates, whether the entire source has been read
+        @rtype: C{Boolean}
+        """
+        return len(self._ranges) == 1 and self._ranges[0][2] == GOOD
+
+    def save(self, filename):
+        """
+        Writes the map; a temporary file is written first, so that an interruption does not leave
+        a broken map.
+
+        @param filename: Name of the map file
+        @type filename: C{String}
+        """
+        tmpname = filename + '.tmp'
+        file = open(tmpname, 'w')
+        try:
+            file.write("# Rescue map of ImageGenerator\n")
+            file.write("# current_pos  current_pass\n")
+            file.write("0x%08X  %d\n" %(self.position, self.phase))
+            file.write("#      pos        size  status\n")
+            for start, length, state in self._ranges:
+                file.write("0x%08X  0x%08X  %s\n" %(start, length, state))
+        finally:
+            file.close()
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmpname, filename)
+
+def loadMap(filename, size):
+    """
+    Reads a map written before (see L{RescueMap.save}).
+
+    Ranges beyond the given size are ignored, a size not covered by the map is added as untried.
+
+    @param filename: Name of the map file
+    @type filename: C{String}
+    @param size: Size of the source in bytes
+    @type size: C{int}
+    @return: Map read from the file
+    @rtype: L{RescueMap}
+    """
+    rescuemap = RescueMap(size)
+    file = open(filename, 'r')
+    try:
+        status = None
+        for line in file:
+            line = line.strip()
+            if line == "" or line.startswith('#'):
+                continue
+            values = line.split()
+            if status == None:
+                status = values
+                rescuemap.position = int(values[0], 16)
+                if len(values) > 1 and values[1].isdigit():
+                    rescuemap.phase = int(values[1])
+                continue
+            start, length, state = int(values[0], 16), int(values[1], 16), values[2]
+            if state not in [UNTRIED, BAD, GOOD]:
+                state = FAILED          # states of other tools for ranges tried already
+            if start < size and length > 0:
+                rescuemap.mark(start, min(length, size - start), state)
+    finally:
+        file.close()
+    return rescuemap
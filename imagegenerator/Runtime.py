@@ -2,6 +2,11 @@
 Runtime classes for the ImageGenerator. Contains a settings class for static information 
 and a status class for dynamic information about a generation respectively.
 
+The imaging core pushes its progress into the status instance; the status passes it on to its
+listeners (see L{Status.addListener}) together with the throughput, the remaining time and the
+time the copying waited for reading and writing (see L{ImagingSnapshot}). Cores unable to report
+their progress (the ones running C{dd}) are observed by a L{FileSizeObserver} instead.
+
 FileExtractor is free software: you can redistribute it and/or modify
 it under the terms of the GNU General Public License as published by
 the Free Software Foundation, either version 3 of the License, or
@@ -24,9 +29,30 @@ along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 @type DEF_DEST: C{String}
 @var DEF_FILESIZECHECK_DELAY: Default value for the delay for the FileSizeObserver for checking next time
 @type DEF_FILESIZECHECK_DELAY: C{int}
+@var DEF_MAPFILE: Default value for the map file of a rescue (C{None} for the name of the image file plus '.map')
+@type DEF_MAPFILE: C{String}
+@var DEF_FILL: Default value for treating ranges of the source, which cannot be read
+@type DEF_FILL: C{String}
+@var FILL_ZERO: Unreadable ranges are filled with zeros in the image file
+@type FILL_ZERO: C{String}
+@var FILL_SKIP: Unreadable ranges are left untouched in the image file
+@type FILL_SKIP: C{String}
+@var DEF_HASHES: Default value for the hash algorithms calculated for the image file (C{None} for no hashes)
+@type DEF_HASHES: C{List} of C{String}
+@var DEF_SEGMENT: Default value for the size of segments for piecewise hashes (0 for none)
+@type DEF_SEGMENT: C{int}
+@var DEF_PROGRESS_INTERVAL: Default value for the minimum delay between two progress events for a listener in seconds
+@type DEF_PROGRESS_INTERVAL: C{float}
+@var DEF_RATE_WINDOW: Default value for the period the throughput is averaged over in seconds
+@type DEF_RATE_WINDOW: C{float}
+@var EVENT_PROGRESS: Event - more bytes have been copied
+@type EVENT_PROGRESS: C{int}
+@var EVENT_FINISHED: Event - the generation has been finished
+@type EVENT_FINISHED: C{int}
 
 """
 import time, threading
+import traceback
 import Tools
 
 DEF_PATH_DD = None
@@ -36,6 +62,19 @@ DEF_BLOCKSIZE = 512
 
 DEF_FILESIZECHECK_DELAY = 1  #  seconds
 
+FILL_ZERO = "zero"
+FILL_SKIP = "skip"
+DEF_MAPFILE = None
+DEF_FILL = FILL_ZERO
+DEF_HASHES = None
+DEF_SEGMENT = 0
+
+DEF_PROGRESS_INTERVAL = 1.0
+DEF_RATE_WINDOW = 5.0
+
+EVENT_PROGRESS = 1
+EVENT_FINISHED = 2
+
 class Settings:
     """
     Maintains static information for a generation.
@@ -50,9 +89,18 @@ class Settings:
     @type blocksize: C{int}
     @ivar redirectOutput: Buffer, to which the output of the OS command shall be redirected to. (might be a file)
     @type redirectOutput: C{Buffer}
+    @ivar mapfile: Map file of a rescue (C{None} for the name of the image file plus '.map')
+    @type mapfile: C{String}
+    @ivar fill: Treatment of unreadable ranges during a rescue (L{FILL_ZERO} or L{FILL_SKIP})
+    @type fill: C{String}
+    @ivar hashes: Hash algorithms calculated for the image file whilst copying (C{None} for no hashes)
+    @type hashes: C{List} of C{String}
+    @ivar segment: Size of segments for piecewise hashes of the image file (0 for none)
+    @type segment: C{int}
     """
     def __init__(self, path_dd = DEF_PATH_DD, source = DEF_SOURCE, destination = DEF_DEST,
-            blocksize = DEF_BLOCKSIZE, redirectOutput = None):
+            blocksize = DEF_BLOCKSIZE, redirectOutput = None, mapfile = DEF_MAPFILE, fill = DEF_FILL,
+            hashes = DEF_HASHES, segment = DEF_SEGMENT):
         """
         Initialises the settings instance. All parameters have default values. Check the
         instance variables in this module.
@@ -67,12 +115,24 @@ class Settings:
         @type blocksize: C{int}
         @param redirectOutput: Buffer, to which the output of the OS command shall be redirected to. (might be a file)
         @type redirectOutput: C{Buffer}
+        @param mapfile: Map file of a rescue (C{None} for the name of the image file plus '.map')
+        @type mapfile: C{String}
+        @param fill: Treatment of unreadable ranges during a rescue (L{FILL_ZERO} or L{FILL_SKIP})
+        @type fill: C{String}
+        @param hashes: Hash algorithms calculated for the image file whilst copying (C{None} for no hashes)
+        @type hashes: C{List} of C{String}
+        @param segment: Size of segments for piecewise hashes of the image file (0 for none)
+        @type segment: C{int}
         """
         self.path_dd = path_dd
         self.source = source
         self.destination = destination
         self.blocksize = blocksize
         self.redirectOutput = redirectOutput
+        self.mapfile = mapfile
+        self.fill = fill
+        self.hashes = hashes
+        self.segment = segment
         
     def getPathDD(self):
         """
@@ -145,6 +205,83 @@ class Settings:
         @rtype: C{Buffer}
         """
         return self.redirectOutput
+
+    def getMapFile(self):
+        """
+        GETTER
+
+        @return: Name of the map file of a rescue - the name of the image file plus '.map', if not set
+        @rtype: C{String}
+        """
+        if self.mapfile == None:
+            return self.destination + ".map"
+        return self.mapfile
+
+    def setMapFile(self, mapfile):
+        """
+        SETTER
+
+        @param mapfile: Name of the map file of a rescue (C{None} for the name of the image file plus '.map')
+        @type mapfile: C{String}
+        """
+        self.mapfile = mapfile
+
+    def getFill(self):
+        """
+        GETTER
+
+        @return: Treatment of unreadable ranges during a rescue (L{FILL_ZERO} or L{FILL_SKIP})
+        @rtype: C{String}
+        """
+        return self.fill
+
+    def setFill(self, fill):
+        """
+        SETTER
+
+        @param fill: Treatment of unreadable ranges during a rescue (L{FILL_ZERO} or L{FILL_SKIP})
+        @type fill: C{String}
+        """
+        self.fill = fill
+
+    def getHashes(self):
+        """
+        GETTER
+
+        @return: Hash algorithms calculated for the image file whilst copying (C{None} for no hashes)
+        @rtype: C{List} of C{String}
+        """
+        return self.hashes
+
+    def setHashes(self, hashes, segment = DEF_SEGMENT):
+        """
+        SETTER
+
+        @param hashes: Hash algorithms calculated for the image file whilst copying (C{None} for no hashes)
+        @type hashes: C{List} of C{String}
+        @param segment: Size of segments for piecewise hashes of the image file (0 for none)
+        @type segment: C{int}
+        """
+        self.hashes = hashes
+        self.segment = segment
+
+    def getSegment(self):
+        """
+        GETTER
+
+        @return: Size of segments for piecewise hashes of the image file (0 for none)
+        @rtype: C{int}
+        """
+        return self.segment
+
+    def getHashFile(self):
+        """
+        GETTER
+
+        @return: Name of the file the hashes of the image file are written to - the name of the image file plus '.hash'
+        @rtype: C{String}
+        """
+        return self.destination + ".hash"
     
 class Status:
     """
@@ -160,6 +297,18 @@ class Status:
     @type _endtime: C{Float}
     @ivar _error: Error message for any error occured during exectution.
     @type _error: C{String}
+    @ivar _hashes: Hashes of the image file calculated whilst copying - tuples (name of algorithm, hash)
+    @type _hashes: C{List} of C{Tuples}
+    @ivar _samples: Progress within the last L{DEF_RATE_WINDOW} seconds - tuples (time, bytes copied)
+    @type _samples: C{List} of C{Tuples}
+    @ivar _read_stall: Seconds the copying has waited for reading the source
+    @type _read_stall: C{float}
+    @ivar _write_stall: Seconds the copying has waited for writing the image file
+    @type _write_stall: C{float}
+    @ivar _listeners: Registered listeners - lists (listener, interval, time of next progress event)
+    @type _listeners: C{List} of C{Lists}
+    @ivar _lock: Lock for the progress and the listeners
+    @type _lock: C{threading.RLock}
     """
     def __init__(self):
         """
@@ -171,12 +320,150 @@ class Status:
         self._endtime = None
         self._error = None
         self._end_filesize = None       # final file size estimation
+        self._hashes = None
+        self._samples = []
+        self._read_stall = 0
+        self._write_stall = 0
+        self._listeners = []
+        self._lock = threading.RLock()
     
     def updateDestinationFileSize(self, value):
         """
         Updates the instance variable L{_dest_filesize} with the given value.
+        
+        The value is remembered for the throughput and the listeners are notified (see L{addListener}).
         """
-        self._dest_filesize = value
+        self._lock.acquire()
+        try:
+            self._dest_filesize = value
+            now = time.time()
+            self._samples.append((now, value))
+            while len(self._samples) > 2 and self._samples[1][0] < now - DEF_RATE_WINDOW:
+                del self._samples[0]
+        finally:
+            self._lock.release()
+        self._notify(EVENT_PROGRESS)
+    
+    def addStalls(self, read, write):
+        """
+        Adds the time the copying has waited for reading the source and for writing the image file.
+        
+        @param read: Seconds waited for reading
+        @type read: C{float}
+        @param write: Seconds waited for writing
+        @type write: C{float}
+        """
+        self._lock.acquire()
+        try:
+            self._read_stall += read
+            self._write_stall += write
+        finally:
+            self._lock.release()
+    
+    def getThroughput(self):
+        """
+        Provides the throughput, averaged over the last L{DEF_RATE_WINDOW} seconds.
+        
+        @return: Bytes per second; C{None} if not enough progress has been reported yet
+        @rtype: C{float}
+        """
+        self._lock.acquire()
+        try:
+            if len(self._samples) < 2 or self._samples[-1][0] <= self._samples[0][0]:
+                return None
+            return (self._samples[-1][1] - self._samples[0][1]) / (self._samples[-1][0] - self._samples[0][0])
+        finally:
+            self._lock.release()
+    
+    def getRemainingTime(self):
+        """
+        Estimates the remaining time from the current throughput (see L{getThroughput}).
+        
+        @return: Remaining time in seconds; C{None} if the size of the image file or the throughput are unknown
+        @rtype: C{float}
+        """
+        throughput = self.getThroughput()
+        if not throughput or not self._end_filesize:
+            return None
+        return max(self._end_filesize - self._dest_filesize, 0) / throughput
+    
+    def addListener(self, listener, interval = DEF_PROGRESS_INTERVAL):
+        """
+        Registers a listener for the progress of this generation.
+        
+        The listener is called as C{listener(event, snapshot)} with the event (L{EVENT_PROGRESS} or
+        L{EVENT_FINISHED}) and an L{ImagingSnapshot}. Listeners are called within the thread of the
+        core; GUI listeners have to pass the snapshot to their own thread (e.g. C{wx.CallAfter}).
+        
+        @param listener: Function to be called for each event
+        @type listener: C{function}
+        @param interval: Minimum number of seconds between two progress events for this listener
+        (0 for every update of the progress)
+        @type interval: C{float}
+        """
+        self._lock.acquire()
+        try:
+            self._listeners = self._listeners + [[listener, interval, 0]]
+        finally:
+            self._lock.release()
+    
+    def removeListener(self, listener):
+        """
+        Unregisters a listener (see L{addListener}).
+        
+        @param listener: Function registered before
+        @type listener: C{function}
+        """
+        self._lock.acquire()
+        try:
+            self._listeners = [x for x in self._listeners if x[0] != listener]
+        finally:
+            self._lock.release()
+    
+    def getSnapshot(self):
+        """
+        Provides a consistent copy of the dynamic information of this generation.
+        
+        @return: Copy of the current status
+        @rtype: L{ImagingSnapshot}
+        """
+        self._lock.acquire()
+        try:
+            return ImagingSnapshot(self)
+        finally:
+            self._lock.release()
+    
+    def _notify(self, event):
+        """
+        Sends an event to the listeners - progress events only to those listeners whose interval has passed.
+        
+        The listeners are called without holding the lock; an exception raised by a listener is
+        reported and does not interrupt the imaging.
+        
+        @param event: Event to be sent
+        @type event: C{int}
+        """
+        self._lock.acquire()
+        try:
+            now = time.time()
+            due = []
+            for entry in self._listeners:
+                if event == EVENT_PROGRESS:
+                    if now < entry[2]:
+                        continue
+                    entry[2] = now + entry[1]
+                due.append(entry[0])
+            if not due:
+                return
+            snapshot = ImagingSnapshot(self)
+        finally:
+            self._lock.release()
+        for listener in due:
+            try:
+                listener(event, snapshot)
+            except Exception:
+                print "Error in listener for the imaging progress:"
+                traceback.print_exc()
     
     def getDestinationFileSize(self):
         """
@@ -205,9 +492,15 @@ class Status:
         @param value: Value to be assigned to the instance variable for completed generation.
         @type value: C{Boolean}
         """
-        self._isFinished = value
+        self._lock.acquire()
+        try:
+            self._isFinished = value
+            if value:
+                self._endtime = time.time()
+        finally:
+            self._lock.release()
         if value:
-            self._endtime = time.time()
+            self._notify(EVENT_FINISHED)
         
     def setStarted(self, value = 1):
         """
@@ -295,6 +588,57 @@ class Status:
         """
         return self._end_filesize
 
+    def setHashes(self, hashes):
+        """
+        SETTER
+
+        @param hashes: Hashes of the image file - tuples (name of algorithm, hash in hexadecimal)
+        @type hashes: C{List} of C{Tuples}
+        """
+        self._hashes = hashes
+
+    def getHashes(self):
+        """
+        GETTER
+
+        @return: Hashes of the image file - tuples (name of algorithm, hash in hexadecimal); C{None} if not calculated
+        @rtype: C{List} of C{Tuples}
+        """
+        return self._hashes
+
+class ImagingSnapshot:
+    """
+    Consistent copy of the dynamic information of a generation (see L{Status.getSnapshot}).
+    
+    @ivar size: Number of bytes copied
+    @ivar endsize: Size of the image file, once finished (C{None} if unknown)
+    @ivar elapsed: Elapsed time in seconds
+    @ivar throughput: Throughput in MB per second, averaged over the last L{DEF_RATE_WINDOW} seconds (C{None} if unknown)
+    @ivar remaining: Estimated remaining time in seconds (C{None} if unknown)
+    @ivar read_stall: Seconds the copying has waited for reading the source
+    @ivar write_stall: Seconds the copying has waited for writing the image file
+    @ivar finished: Indicates, whether the generation has been finished
+    @ivar error: Error message (C{None} if no error occured)
+    """
+    def __init__(self, status):
+        """
+        Copies the values from a status - the status has to be locked by the caller.
+        
+        @param status: Status to be copied
+        @type status: L{Status}
+        """
+        self.size = status.getDestinationFileSize()
+        self.endsize = status.getEndFilesize()
+        self.elapsed = status.getElapsedTime()
+        self.throughput = status.getThroughput()
+        if self.throughput != None:
+            self.throughput = self.throughput / (1024 * 1024)
+        self.remaining = status.getRemainingTime()
+        self.read_stall = status._read_stall
+        self.write_stall = status._write_stall
+        self.finished = status.isFinished()
+        self.error = status.getError()
+
 class FileSizeObserver(threading.Thread):
     """
     Responsible for observing a file and updating its file size to the given status instance.
@@ -332,10 +676,17 @@ class FileSizeObserver(threading.Thread):
         """
         while not self.status.isFinished():
             time.sleep(self.delay)
-            if Tools.isFileExistent(self.filename):
-                size = Tools.getFileSize(self.filename)
-                self.status.updateDestinationFileSize(size)
+            self.update()
         # update for a last time
+        self.update()
+        
+    def update(self):
+        """
+        Checks the file size of the given file once and updates it to the status instance.
+        
+        Cores call this function before setting the status to finished, so that the listeners of
+        the status are informed about the final size (see L{Status.addListener}).
+        """
         if Tools.isFileExistent(self.filename):
             size = Tools.getFileSize(self.filename)
             self.status.updateDestinationFileSize(size)
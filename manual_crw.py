@@ -7,6 +7,11 @@ In fact, this is a very dirty implementation - but seems to work for the pics we
 from a partition for a speciifc camera. (It asumes 3 entries in  the "main dir" within the file
 and the first entry must be of type 0x0520) - check CRW docs for more details.
 
+A CRW file is a CIFF heap: the header (its length is stored behind the byte order) is followed by the
+records of the heap and finally by the directory of the heap, which is terminated by the offset of the
+directory relative to the start of the heap. Candidates for the directory are verified by this offset.
+The source file is searched in chunks and the search is given up behind L{MAX_FILESIZE} bytes.
+
 FileExtractor is free software: you can redistribute it and/or modify
 it under the terms of the GNU General Public License as published by
 the Free Software Foundation, either version 3 of the License, or
@@ -29,8 +34,13 @@ along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 @type sequ1: C{List} of C{int}
 @var sequ2: Again, another sequence which was at the same location within all our CRW files right at the end.
 @type sequ2: C{List} of C{int}
+@var MAX_FILESIZE: Maximum size of a CRW file - the search for the end of the file is given up behind
+@type MAX_FILESIZE: C{int}
+@var CHUNKSIZE: Number of bytes read at once when searching for the directory
+@type CHUNKSIZE: C{int}
 """
 
+import struct
 import tools
 
 sequ = [0x03, 0x00, 0x05, 0x20]
@@ -38,6 +48,9 @@ sequ_zeros = [0x00, 0x00, 0x00, 0x00, 0x00]
 sequ1 = [0x07, 0x20]
 sequ2 = [0x0A, 0x30]
 
+MAX_FILESIZE = 128 * 1024 * 1024
+CHUNKSIZE = 1024 * 1024
+
 def crw_getendaddress(file, offset, debug_output):
     """
     Calculate the end address of a CRW file.
@@ -52,8 +65,11 @@ def crw_getendaddress(file, offset, debug_output):
     the end of a CRW file. Not sure, whether is works for all CRWs, but it worked for ours and
     recovered more than 2000 pictures.
     
+    The source file is searched for the directory from its current position on in chunks of
+    L{CHUNKSIZE} bytes; the search is given up L{MAX_FILESIZE} bytes behind the start of the file.
+    
     @param file: Source file the start sequence was found in
-    @type file: Reference to a file
+    @type file: Reference to a file or C{mmap}
     @param offset: Position of the start sequence within the source file
     @type offset: C{int}
     @param debug_output: Indicates, whether to produce output to standard out.
@@ -62,35 +78,49 @@ def crw_getendaddress(file, offset, debug_output):
     @return: -1 if the end of the file could not be determined, otherwise the offset inside the
     source file for the end of the found file measured from the beginning of the source file.
     @rtype: C{int}
-    
-    @attention: There is no limitation implemented for the file size of the found file. Consequently,
-    this function will examine the source file from the start offset up to the end, which can
-    take quite a while.
-    @todo: Implement a break criterion and limit the file size.
     """
     if debug_output:
         print ("\tEntered function in additional module manual_crw for calculating")
-        print ("\tend address for CRW file (depending on the file size this may last several minutes)")
-    st = file.read(len(sequ)-1)
-    while (len(st)>1):
-        ch = file.read(1)
-        st = st + ch
-        if ord(st[0]) == sequ[0]:
-            if tools.checkString(st, sequ):
-                pos = file.tell() - len(sequ)
-                file.seek(pos + 7)
-                st1 = file.read(5)
-                if tools.checkString(st1, sequ_zeros):
-                    file.seek(pos + 12)
-                    st2 = file.read(2)
-                    if tools.checkString(st2, sequ1):
-                        file.seek(pos + 22)
-                        st2 = file.read(2)
-                        if tools.checkString(st2, sequ2):
-                            if debug_output:
-                                print("\t--- Leave function - calculated end address: 0x%x" %(pos+35))
-                            return pos + 35
-        st = st[1:]
+        print ("\tend address for CRW file")
+    limit = min(offset + MAX_FILESIZE, tools.getOpenFileSize(file))
+    heap_start = offset + struct.unpack('<I', tools.readAt(file, offset + 2, 4))[0]
+    seqstring = ''.join([chr(x) for x in sequ])
+    pos = file.tell()
+    while pos < limit:
+        chunk = tools.readAt(file, pos, min(CHUNKSIZE, limit - pos) + len(seqstring) - 1)
+        found = chunk.find(seqstring)
+        while found != -1:
+            if _isDirectory(file, pos + found, heap_start):
+                if debug_output:
+                    print("\t--- Leave function - calculated end address: 0x%x" %(pos + found + 35))
+                return pos + found + 35
+            found = chunk.find(seqstring, found + 1)
+        pos += CHUNKSIZE
     if debug_output:
         print ("\t--- Leave function now - no end address could be determined")
     return -1
+
+def _isDirectory(file, pos, heap_start):
+    """
+    Checks, whether the directory of a CRW file starts at the given position.
+    
+    The directory is accepted if it is followed by its offset relative to the start of the heap (as
+    defined by CIFF) or if the sequences found in all our CRW files are at their positions.
+    
+    @param file: Source file
+    @type file: Reference to a file or C{mmap}
+    @param pos: Position of the directory candidate (the directory sequence L{sequ})
+    @type pos: C{int}
+    @param heap_start: Position of the heap of the CRW file
+    @type heap_start: C{int}
+    @return: Indicates, whether the candidate is the directory
+    @rtype: C{Boolean}
+    """
+    directory = tools.readAt(file, pos, 36)
+    if len(directory) < 36:
+        return 0
+    if struct.unpack('<I', directory[32:36])[0] == pos - heap_start:
+        return 1
+    return tools.checkString(directory[7:12], sequ_zeros) and \
+        tools.checkString(directory[12:14], sequ1) and \
+        tools.checkString(directory[22:24], sequ2)
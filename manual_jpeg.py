@@ -0,0 +1,135 @@
+"""
+Extension for signatures. JPEG in the signatures module is marked as signature type
+manual. This module is the extension in order to dertermine the end of a JPEG file
+within a binfile.
+
+A JPEG file is a sequence of marker segments. Apart from a few standalone markers, each segment
+carries its length right behind the marker - the segment is skipped without examining its content.
+This way, thumbnails embedded in APPn segments (EXIF) do not matter at all. Only the entropy coded
+data behind a start of scan (SOS) segment needs to be searched for the next marker. The file ends
+with the first end of image (EOI) marker outside the entropy coded data.
+
+Invalid structures (missing markers, invalid lengths) are reported as no end address found; hence,
+random occurences of the start sequence are not written at all.
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+
+
+@var MAX_FILESIZE: Maximum size of a JPEG file - the search for the end of the file is given up behind
+@type MAX_FILESIZE: C{int}
+@var CHUNKSIZE: Number of bytes read at once when searching entropy coded data
+@type CHUNKSIZE: C{int}
+@var SOI: Start of image marker
+@type SOI: C{int}
+@var EOI: End of image marker
+@type EOI: C{int}
+@var SOS: Start of scan marker
+@type SOS: C{int}
+@var STANDALONE: Markers without a length (temporary and restart markers)
+@type STANDALONE: C{List} of C{int}
+"""
+
+import struct
+import tools
+
+MAX_FILESIZE = 64 * 1024 * 1024
+CHUNKSIZE = 64 * 1024
+
+SOI = 0xD8
+EOI = 0xD9
+SOS = 0xDA
+STANDALONE = [0x01] + range(0xD0, 0xD8)
+
+def jpeg_getendaddress(file, offset, debug_output):
+    """
+    Calculate the end address of a JPEG file.
+
+    This function must be implemented with exactly these parameters in order to use it for
+    the L{FileExtractorCore}. It determines the end of a JPEG file within a binary source file
+    by walking the marker segments of the file (see module description).
+
+    @param file: Source file the start sequence was found in
+    @type file: Reference to a file or C{mmap}
+    @param offset: Position of the start sequence (start of image marker) within the source file
+    @type offset: C{int}
+    @param debug_output: Indicates, whether to produce output to standard out.
+    @type debug_output: C{Boolean}
+
+    @return: -1 if the end of the file could not be determined, otherwise the offset inside the
+    source file for the end of the found file measured from the beginning of the source file.
+    @rtype: C{int}
+    """
+    limit = min(offset + MAX_FILESIZE, tools.getOpenFileSize(file))
+    pos = offset + 2                # behind start of image
+    scanned = 0
+    while pos < limit:
+        header = tools.readAt(file, pos, 4)
+        if len(header) < 2 or header[0] != '\xFF':
+            break
+        marker = ord(header[1])
+        if marker == 0xFF:          # fill byte
+            pos += 1
+            continue
+        if marker == EOI:
+            if not scanned:
+                break
+            if debug_output:
+                print("\t--- Leave function - calculated end address: 0x%x" %(pos + 1))
+            return pos + 1
+        if marker in STANDALONE:
+            pos += 2
+            continue
+        if marker == SOI or marker == 0x00 or len(header) < 4:
+            break
+        length = struct.unpack('>H', header[2:4])[0]
+        if length < 2:
+            break
+        pos += 2 + length
+        if marker == SOS:
+            scanned = 1
+            pos = _findMarker(file, pos, limit)
+            if pos < 0:
+                break
+    if debug_output:
+        print ("\t--- Leave function now - no end address could be determined")
+    return -1
+
+def _findMarker(file, pos, limit):
+    """
+    Looks up the next marker behind entropy coded data.
+
+    Within entropy coded data, 0xFF bytes are followed by a zero byte (stuffing); restart markers
+    are part of the entropy coded data as well.
+
+    @param file: Source file
+    @type file: Reference to a file or C{mmap}
+    @param pos: Position of the entropy coded data within the source file
+    @type pos: C{int}
+    @param limit: Position to give up the search at
+    @type limit: C{int}
+    @return: Position of the next marker or -1 if none was found
+    @rtype: C{int}
+    """
+    while pos < limit:
+        chunk = tools.readAt(file, pos, min(CHUNKSIZE, limit - pos) + 1)
+        if len(chunk) < 2:
+            return -1
+        i = chunk.find('\xFF')
+        while i != -1 and i + 1 < len(chunk):
+            following = ord(chunk[i + 1])
+            if following != 0x00 and following != 0xFF and not (0xD0 <= following <= 0xD7):
+                return pos + i
+            i = chunk.find('\xFF', i + 1)
+        pos += len(chunk) - 1
+    return -1
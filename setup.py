@@ -15,7 +15,8 @@ You should have received a copy of the GNU General Public License
 along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 
 Run with 
-    python setup.py build /         - or
+    python setup.py build /         (nothing to be built - packages stay independent of the architecture) - or
+    python setup.py build .         (compile the native core in place, if a compiler is available) - or
     python setup.py install /        - or
     python setup.py sdist
 """
@@ -24,7 +25,8 @@ import sys
 import os
 import os.path
 import shutil
-from distutils.core import setup
+from distutils.core import setup, Extension
+from distutils.errors import CCompilerError, DistutilsError
 
 filesToMove = [
                ['fileextractor.desktop', 'usr/share/applications', 'fileextractor.desktop'], 
@@ -43,7 +45,18 @@ filesToLink = [
 
 
 def doBuild(path):
-    pass
+    # the native core is optional - without it the Python core is used (see tools.determineScanCore)
+    if path != '.':
+        return
+    print "building native core for fileextractor"
+    try:
+        setup (
+            name = "fecore",
+            ext_modules = [Extension('fecore', sources = ['fecore.c'])],
+            script_args = ['build_ext', '--inplace']
+            )
+    except (SystemExit, CCompilerError, DistutilsError), msg:
+        print "native core not built (%s) - the Python core is used instead" %(msg)
 
 def doInstall(path):
     print "installing fileextractor"
@@ -78,7 +91,7 @@ if __name__ == "__main__":
     if sys.argv[1] == 'sdist':
         doSetup()
     elif sys.argv[1] == 'build':
-        doBuild(sys.argv[2])
+        doBuild(len(sys.argv) > 2 and sys.argv[2] or '')
     elif sys.argv[1] == 'install':
         if sys.argv[2].startswith('--root='):
             dest = sys.argv[2][7:]
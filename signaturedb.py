@@ -0,0 +1,303 @@
+"""
+External signature database for FileExtractor.
+
+Apart from the signatures in module L{signatures}, signatures may be loaded from a database - a folder
+holding signature files (L{EXTENSION}). Each signature file is a JSON document containing one signature
+or a list of signatures. A signature is an object with the same keys as the signature dictionaries (see
+module L{signatures}); sequences are either lists of numbers (C{null} for wildcards) or strings of hex
+bytes (C{??} for wildcards); the signature type is given by its name (see L{TYPE_NAMES}) and functions
+for the manual type are given by their dotted path. Example::
+
+    [{"name": "ZIP", "description": "ZIP Archive", "extension": "zip",
+      "start_sequence": "50 4B 03 04", "filesize_type": "end_sequence",
+      "end_sequence": "50 4B 05 06 ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? ?? 00 00"},
+     {"name": "JPEG2", "extension": "jpg", "start_sequence": [255, 216, 255, 224],
+      "filesize_type": "manual", "manual_functionname": "manual_jpeg.jpeg_getendaddress"}]
+
+The parsed signatures and the matchers compiled for them (see L{getMatcher}) are kept in a cache file
+(L{CACHE_NAME}) inside the database folder. The cache is only used as long as neither the signature
+files nor the version of the cache (L{CACHE_VERSION}) have changed; otherwise it is rebuilt. Hence,
+a large database is neither parsed nor compiled again for each run. The cache holds plain data only
+(written with C{marshal}) - the state of the matchers (see L{MultiMatcher.MultiMatcher.getState}), whose
+regular expressions are compiled again when loading them; no code is run for reading the cache.
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+
+@var CACHE_VERSION: Version of the cache format - to be increased whenever the format of the cache or
+the matcher (L{MultiMatcher.MultiMatcher}) changes
+@type CACHE_VERSION: C{int}
+@var CACHE_NAME: Name of the cache file inside the database folder
+@type CACHE_NAME: C{String}
+@var EXTENSION: Extension of signature files
+@type EXTENSION: C{String}
+@var MAX_MATCHERS: Maximum number of matchers kept in the cache (one for each combination of active signatures)
+@type MAX_MATCHERS: C{int}
+@var TYPE_NAMES: Names of the signature types in signature files
+@type TYPE_NAMES: C{Dict}
+"""
+import os
+import os.path
+import sys
+import json
+import marshal
+import signatures
+from MultiMatcher import MultiMatcher
+
+CACHE_VERSION = 3
+CACHE_NAME = 'signatures.cache'
+EXTENSION = '.json'
+MAX_MATCHERS = 16
+
+TYPE_NAMES = {'end_sequence': signatures.TYPE_END_SEQUENCE, 'file_size': signatures.TYPE_FILE_SIZE,
+    'manual': signatures.TYPE_MANUAL, 'chunks': signatures.TYPE_CHUNKS}
+
+_cachefile = None           # cache file of the loaded database
+_cache = None               # content of the cache file
+_matchers = {}              # matchers compiled or restored from the cache in this process
+
+def loadDatabase(folder):
+    """
+    Loads all signatures from a signature database.
+
+    The signatures are taken from the cache, if it is up to date; otherwise the signature files are
+    parsed (in the order of their names) and the cache is rebuilt. The matchers found in the cache are
+    provided by L{getMatcher} from now on.
+
+    @param folder: Folder of the signature database
+    @type folder: C{String}
+    @return: C{None} if the database could not be loaded, otherwise the list of signatures
+    @rtype: C{List} of Signature C{Dictionaries}
+    """
+    global _cachefile, _cache
+    try:
+        filenames = [f for f in os.listdir(folder) if f.endswith(EXTENSION)]
+        filenames.sort()
+        fingerprint = []
+        for filename in filenames:
+            st = os.stat(os.path.join(folder, filename))
+            fingerprint.append((filename, st.st_size, st.st_mtime))
+    except EnvironmentError, msg:
+        print ('Signature database cannot be read: %s' %(msg))
+        return None
+    cachefile = os.path.join(folder, CACHE_NAME)
+    cache = _readCache(cachefile)
+    if cache == None or cache['files'] != fingerprint:
+        signs = []
+        for filename in filenames:
+            loaded = _readSignatureFile(os.path.join(folder, filename))
+            if loaded == None:
+                return None
+            signs.extend(loaded)
+        if signatures.normaliseSignatures(signs) < 0:
+            print ('Error in Signature Database - required Entry missing or wrong value in at least one signature')
+            return None
+        cache = {'version': CACHE_VERSION, 'files': fingerprint, 'signatures': signs, 'matchers': {}}
+        _writeCache(cachefile, cache)
+
+    signs = []
+    for sig in cache['signatures']:
+        sig = dict(sig)
+        if sig.has_key(signatures.filesizemanual_functionname):
+            function = _resolveFunction(sig[signatures.filesizemanual_functionname])
+            if function == None:
+                print ('Error in Signature Database - function not found: %s' %(sig[signatures.filesizemanual_functionname]))
+                return None
+            sig[signatures.filesizemanual_functionname] = function
+        signs.append(sig)
+    _cachefile = cachefile
+    _cache = cache
+    return signs
+
+def addSignatures(signs, loaded):
+    """
+    Adds loaded signatures to a list of signatures - signatures with the same name are replaced.
+
+    @param signs: List of signatures the loaded ones are added to
+    @type signs: C{List} of Signature C{Dictionaries}
+    @param loaded: Signatures loaded from a database (see L{loadDatabase})
+    @type loaded: C{List} of Signature C{Dictionaries}
+    """
+    for sig in loaded:
+        for i in range(len(signs)):
+            if signs[i][signatures.name] == sig[signatures.name]:
+                signs[i] = sig
+                break
+        else:
+            signs.append(sig)
+
+def getMatcher(sequences, alignment = 1, alignment_offset = 0, aligned = None):
+    """
+    Provides the matcher for the given sequences.
+
+    Matchers are compiled only once for each list of sequences; if a signature database has been
+    loaded, newly compiled matchers are stored in its cache.
+
+    @param sequences: List of tuples (sequence, identifier) - see L{MultiMatcher.MultiMatcher}
+    @type sequences: C{List} of C{Tuples}
+    @param alignment: Alignment of the aligned sequences (see L{MultiMatcher.MultiMatcher})
+    @type alignment: C{int}
+    @param alignment_offset: First aligned position (see L{MultiMatcher.MultiMatcher})
+    @type alignment_offset: C{int}
+    @param aligned: Indicates for each sequence, whether it may only be found at aligned positions
+    @type aligned: C{List} of C{Boolean}
+    @return: Matcher for the sequences
+    @rtype: L{MultiMatcher.MultiMatcher}
+    """
+    key = tuple([(tuple(seq), ident) for seq, ident in sequences])
+    if alignment > 1 and aligned != None:
+        key = (key, alignment, alignment_offset % alignment, tuple(aligned))
+    matcher = _matchers.get(key)
+    if matcher != None:
+        return matcher
+    if _cache != None and _cache['matchers'].has_key(key):
+        matcher = MultiMatcher([])
+        matcher.setState(_cache['matchers'][key])
+    else:
+        matcher = MultiMatcher(sequences, alignment, alignment_offset, aligned)
+        if _cache != None:
+            if len(_cache['matchers']) >= MAX_MATCHERS:
+                _cache['matchers'].clear()
+            _cache['matchers'][key] = matcher.getState()
+            _writeCache(_cachefile, _cache)
+    if len(_matchers) >= MAX_MATCHERS:
+        _matchers.clear()
+    _matchers[key] = matcher
+    return matcher
+
+def _readSignatureFile(filename):
+    """
+    Parses one signature file.
+
+    @param filename: Name of the signature file
+    @type filename: C{String}
+    @return: C{None} if the file is invalid, otherwise the signatures (functions are given by their path)
+    @rtype: C{List} of Signature C{Dictionaries}
+    """
+    try:
+        sigfile = open(filename, 'r')
+        try:
+            content = json.load(sigfile)
+        finally:
+            sigfile.close()
+        if isinstance(content, dict):
+            content = [content]
+        signs = []
+        for entry in content:
+            sig = {}
+            for key, value in entry.items():
+                if isinstance(value, unicode):
+                    value = str(value)
+                sig[str(key)] = value
+            for key in [signatures.start_seq, signatures.end_seq]:
+                if sig.has_key(key):
+                    sig[key] = _parseSequence(sig[key])
+            if isinstance(sig.get(signatures.filesize_type), str):
+                if not TYPE_NAMES.has_key(sig[signatures.filesize_type]):
+                    raise ValueError('unknown signature type: %s' %(sig[signatures.filesize_type]))
+                sig[signatures.filesize_type] = TYPE_NAMES[sig[signatures.filesize_type]]
+            signs.append(sig)
+        return signs
+    except EnvironmentError, msg:
+        print ('Signature file cannot be read: %s' %(msg))
+    except (ValueError, TypeError, AttributeError, UnicodeError), msg:
+        print ('Error in Signature File %s - %s' %(filename, msg))
+    return None
+
+def _parseSequence(value):
+    """
+    Converts a sequence from a signature file.
+
+    @param value: List of numbers or C{None} - or a string of hex bytes, C{??} for wildcards
+    @type value: C{List} or C{String}
+    @return: Sequence as used in signatures (C{None} for wildcards)
+    @rtype: C{List} of C{int}
+    """
+    if isinstance(value, str):
+        value = value.split()
+    seq = []
+    for x in value:
+        if x == '??':
+            x = None
+        elif isinstance(x, str):
+            x = int(x, 16)
+        if x != None and (not isinstance(x, int) or x < 0 or x > 255):
+            raise ValueError('invalid byte in sequence: %s' %(x))
+        seq.append(x)
+    return seq
+
+def _resolveFunction(path):
+    """
+    Looks up a function by its dotted path (module and name of function).
+
+    @param path: Path of the function, e.g. C{manual_jpeg.jpeg_getendaddress}
+    @type path: C{String}
+    @return: The function or C{None}, if it is not available
+    @rtype: C{function}
+    """
+    if not isinstance(path, str) or path.find('.') == -1:
+        return None
+    modulename, functionname = path.rsplit('.', 1)
+    try:
+        __import__(modulename)
+    except ImportError:
+        return None
+    return getattr(sys.modules[modulename], functionname, None)
+
+def _readCache(cachefile):
+    """
+    Reads the cache of a signature database.
+
+    @param cachefile: Name of the cache file
+    @type cachefile: C{String}
+    @return: Content of the cache or C{None}, if there is no valid cache of the current version
+    @rtype: C{Dict}
+    """
+    try:
+        cf = open(cachefile, 'rb')
+        try:
+            cache = marshal.load(cf)
+        finally:
+            cf.close()
+    except EnvironmentError:
+        return None
+    except (EOFError, ValueError, TypeError):     # damaged file
+        return None
+    if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+        return None
+    return cache
+
+def _writeCache(cachefile, cache):
+    """
+    Writes the cache of a signature database.
+
+    The cache is written to a temporary file, which is renamed afterwards (as for L{tools.savePickle}).
+    If the cache cannot be written (e.g. read-only media), the database is simply used without cache.
+
+    @param cachefile: Name of the cache file
+    @type cachefile: C{String}
+    @param cache: Content of the cache
+    @type cache: C{Dict}
+    """
+    tmpfile = cachefile + '.tmp'
+    try:
+        cf = open(tmpfile, 'wb')
+        try:
+            marshal.dump(cache, cf, 2)
+        finally:
+            cf.close()
+        if os.name == 'nt' and os.path.exists(cachefile):
+            os.remove(cachefile)
+        os.rename(tmpfile, cachefile)
+    except EnvironmentError:
+        pass
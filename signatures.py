@@ -2,13 +2,15 @@
 Maintains all signatures for FileExtractor.
 
 Each sequence in here is responsible for one file type. All file types are identified by start sequences.
-Basically, three different types of signatures are available. They are different in the determination
+Basically, four different types of signatures are available. They are different in the determination
 of the end of files. Type one (indicated by L{TYPE_END_SEQUENCE}) provides an end sequence for the file
 type. Type two (indicated by L{TYPE_FILE_SIZE}) indicates, that the information about the file size
 is encoded in the file itself - the offset has to be provided measured from the beginning of the
 file. Type three (indicated by L{TYPE_MANUAL}) is for the remaining file types. Non of the two previous
 ways may be used for a file type - so there is still a way to implement yourself the algorithm for
-finding the end of a file. For more information on signatures please check the project web-site.
+finding the end of a file. Type four (indicated by L{TYPE_CHUNKS}) is for file types consisting of
+chunks as in PNG files (4 bytes length, 4 bytes chunk type, data and 4 bytes CRC); the chunks are
+walked up to the final chunk. For more information on signatures please check the project web-site.
 
 Each signature (file type) is represented by a dictionary. Each dictionary must provide certain keys. 
 The strings for the required keys are provided in this module. (L{name} for the UNIQUE name of 
@@ -16,8 +18,10 @@ a signature, L{description} for an optional description, L{extension} for the fi
 L{start_seq} for the start sequence and L{filesize_type} for the type of signauture; i.e how to
 identify the end of a file. Further fields are available; however, there requirements depends on 
 the signature type. These ones are L{end_seq} (Type 1), L{skip_end_seqs} (Type 1), 
-l{filesize_address_offset} (Type 2), L{filesize_info_correction} (Type 2) and 
-L{filesizemanual_functionname} (Type 3). After all a global C{List} is maintains which holds 
+l{filesize_address_offset} (Type 2), L{filesize_info_correction} (Type 2), 
+L{filesizemanual_functionname} (Type 3), L{chunks_end_type} (Type 4), L{chunks_offset} (Type 4) and
+L{chunks_crc} (Type 4). The optional field L{max_filesize} limits the size of
+files of a type; larger ones are regarded as false positives and skipped. After all a global C{List} is maintains which holds 
 all the signatures (L{signs}). Take care, that after creating the dictionary for a new signature,
 you don't forget to add the dictionary to the list.
 
@@ -60,17 +64,28 @@ along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 @type filesizemanual_functionname: C{String}
 @var filesize_info_correction: Key value for the dictionary entry for filesize_info_correction
 @type filesize_info_correction: C{String}
+@var max_filesize: Key value for the dictionary entry for max_filesize
+@type max_filesize: C{String}
+@var chunks_end_type: Key value for the dictionary entry for chunks_end_type
+@type chunks_end_type: C{String}
+@var chunks_offset: Key value for the dictionary entry for chunks_offset
+@type chunks_offset: C{String}
+@var chunks_crc: Key value for the dictionary entry for chunks_crc
+@type chunks_crc: C{String}
 @var TYPE_END_SEQUENCE: Constant variable - assigned to signature dictionary key filesize_type if Type 1
 @type TYPE_END_SEQUENCE: C{int}
 @var TYPE_FILE_SIZE: Constant variable - assigned to signature dictionary key filesize_type if Type 2
 @type TYPE_FILE_SIZE: C{int}
 @var TYPE_MANUAL: Constant variable - assigned to signature dictionary key filesize_type if Type 3
 @type TYPE_MANUAL: C{int}
+@var TYPE_CHUNKS: Constant variable - assigned to signature dictionary key filesize_type if Type 4
+@type TYPE_CHUNKS: C{int}
 """
 
 TYPE_END_SEQUENCE = 0
 TYPE_FILE_SIZE = 1
 TYPE_MANUAL = 2
+TYPE_CHUNKS = 3
 
 signs = []
 name = 'name'
@@ -78,11 +93,15 @@ description = 'description'
 extension = 'extension'
 start_seq = 'start_sequence'
 end_seq = 'end_sequence'
-skip_end_seqs = 'skip_end_seqs'     # required for jpegs - the first occurence for the end sequence needs to be skipped
+skip_end_seqs = 'skip_end_seqs'     # required for CR2 - occurences of the end sequence of embedded thumbnails need to be skipped
 filesize_type = 'filesize_type'
 filesize_address_offsets = 'filesize_addresses'
 filesizemanual_functionname = 'manual_functionname'
 filesize_info_correction = 'filesize_info_correction'
+max_filesize = 'max_filesize'       # optional - larger files are skipped (None for no limit)
+chunks_end_type = 'chunks_end_type' # type of the final chunk
+chunks_offset = 'chunks_offset'     # optional - offset of the first chunk (default: behind the start sequence)
+chunks_crc = 'chunks_crc'           # optional - files with invalid chunk CRCs are skipped
 
 # signature for jpeg files
 _jpeg = {}
@@ -90,9 +109,10 @@ _jpeg[name] = 'JPEG'
 _jpeg[description] = 'JPEG Image File'
 _jpeg[extension] = 'jpeg'
 _jpeg[start_seq] = [0xFF, 0xD8, 0xFF, 0xE1]
-_jpeg[end_seq] = [0xFF, 0xD9]
-_jpeg[skip_end_seqs] = 1
-_jpeg[filesize_type] = TYPE_END_SEQUENCE
+_jpeg[filesize_type] = TYPE_MANUAL
+import manual_jpeg
+_jpeg[filesizemanual_functionname] = manual_jpeg.jpeg_getendaddress
+_jpeg[max_filesize] = manual_jpeg.MAX_FILESIZE
 
 _bmp = {}
 _bmp[name] = 'BMP'
@@ -101,6 +121,7 @@ _bmp[extension] = 'bmp'
 _bmp[start_seq] = [0x42, 0x4D, None, None, None, None, 0x00, 0x00, 0x00, 0x00, 0x36, None, 0x00, 0x00]
 _bmp[filesize_address_offsets] = [0x05,0x04,0x03,0x02]
 _bmp[filesize_type] = TYPE_FILE_SIZE
+_bmp[max_filesize] = 256 * 1024 * 1024
 
 _gif = {}
 _gif[name] = 'GIF'
@@ -110,6 +131,7 @@ _gif[start_seq] = [0x47, 0x49, 0x46, 0x38]
 _gif[end_seq] = [0x00, 0x3B]
 _gif[skip_end_seqs] = 0
 _gif[filesize_type] = TYPE_END_SEQUENCE
+_gif[max_filesize] = 64 * 1024 * 1024
 
 # signature for CRW  files (Canon picture file format)
 # mpilgerm 2005-04-15
@@ -121,6 +143,7 @@ _crw[start_seq] = [0x49, 0x49, 0x1A, 0x00, 0x00, 0x00, 0x48, 0x45, 0x41, 0x50, 0
 _crw[filesize_type] = TYPE_MANUAL
 import manual_crw
 _crw[filesizemanual_functionname] = manual_crw.crw_getendaddress
+_crw[max_filesize] = manual_crw.MAX_FILESIZE
 
 # signature for CR2  files (Canon picture file format)
 # mpilgerm 2005-04-14
@@ -132,6 +155,7 @@ _cr2[start_seq] = [0x49, 0x49, 0x2A, 0x00, 0x10, 0x00, 0x00, 0x00, 0x43, 0x52, 0
 _cr2[end_seq] = [0xFF, 0xD9]
 _cr2[skip_end_seqs] = 2
 _cr2[filesize_type] = TYPE_END_SEQUENCE
+_cr2[max_filesize] = 128 * 1024 * 1024
 
 # signature for THM  files (Canon picture help file format)
 # mpilgerm 2005-04-14
@@ -140,9 +164,9 @@ _thm[name] = 'THM'
 _thm[description] = 'THM Canon Picture Thumbnail File'
 _thm[extension] = 'thm'
 _thm[start_seq] = [0xFF, 0xD8, 0xFF, 0xE1, 0x09, 0xFE, 0x45, 0x78, 0x69, 0x66, 0x00, 0x00, 0x49, 0x49]
-_thm[end_seq] = [0xFF, 0xD9]
-_thm[skip_end_seqs] = 0
-_thm[filesize_type] = TYPE_END_SEQUENCE
+_thm[filesize_type] = TYPE_MANUAL
+_thm[filesizemanual_functionname] = manual_jpeg.jpeg_getendaddress
+_thm[max_filesize] = 1024 * 1024
 
 # signature for WAV Files
 # mpilgerm 2005-04-25
@@ -155,6 +179,7 @@ _wav[start_seq] = [0x52, 0x49, 0x46, 0x46]
 _wav[filesize_address_offsets] = [0x07, 0x06, 0x05, 0x04]
 _wav[filesize_info_correction] = 8
 _wav[filesize_type] = TYPE_FILE_SIZE
+_wav[max_filesize] = 512 * 1024 * 1024
 
 # signature for PNG Picture files
 # http://download.mirror.ac.uk/sites/www.libpng.org/pub/png/spec/1.2/png-1.2-pdg.html
@@ -164,9 +189,10 @@ _png[name] = 'PNG'
 _png[description] = 'Portable Netowrk Graphics (PNG) Picture File'
 _png[extension] = 'png'
 _png[start_seq] = [0x89, 0x50, 0x4E, 0x47, 0x0D, 0x0A, 0x1A, 0x0A]
-_png[end_seq] = [0x00, 0x00, 0x00, 0x00, 0x49, 0x45, 0x4E, 0x44, 0xAE, 0x42, 0x60, 0x82]
-_png[skip_end_seqs] = 0
-_png[filesize_type] = TYPE_END_SEQUENCE
+_png[chunks_end_type] = 'IEND'
+_png[chunks_crc] = 0
+_png[filesize_type] = TYPE_CHUNKS
+_png[max_filesize] = 256 * 1024 * 1024
 
 # signature for Windows Event Log Data files
 # bin comparision and http://www.oreilly.com/catalog/winlog/chapter/ch02.html
@@ -224,7 +250,53 @@ def getCopyOfAllSignauteres():
         ret.append(sig)
     return ret
 
-def normaliseSignatures(signs):     # returns the size of the longest signature
+class CompiledSignature(object):
+    """
+    Compiled representation of one signature as used by the core.
+    
+    Signatures are written as dictionaries (see above); for examining the source file, each
+    of them is compiled into an instance of this class by L{normaliseSignatures}. The attributes
+    are slotted and hold the values of the dictionary entries with the same names. Per-signature
+    state of the core (e.g. the position of a started file) is kept in lists indexed by L{index}.
+    
+    @ivar index: Position of the signature in the list of signatures
+    @type index: C{int}
+    @ivar end_length: Length of the end sequence (0 if the signature has none)
+    @type end_length: C{int}
+    """
+    __slots__ = ('index', 'name', 'description', 'extension', 'type', 'start_seq', 'end_seq',
+        'end_length', 'skip_end_seqs', 'offsets', 'correction', 'function', 'max_filesize',
+        'chunks_end_type', 'chunks_offset', 'chunks_crc')
+    
+    def __init__(self, index, sig):
+        """
+        Compiles the given (normalised) signature dictionary.
+        
+        @param index: Position of the signature in the list of signatures
+        @type index: C{int}
+        @param sig: Signature to be compiled
+        @type sig: Signature C{Dictionary}
+        """
+        self.index = index
+        self.name = sig[name]
+        self.description = sig[description]
+        self.extension = sig[extension]
+        self.type = sig[filesize_type]
+        self.start_seq = sig[start_seq]
+        self.end_seq = sig.get(end_seq)
+        self.end_length = 0
+        if self.end_seq != None:
+            self.end_length = len(self.end_seq)
+        self.skip_end_seqs = sig.get(skip_end_seqs, 0)
+        self.offsets = sig.get(filesize_address_offsets)
+        self.correction = sig.get(filesize_info_correction, 0)
+        self.function = sig.get(filesizemanual_functionname)
+        self.max_filesize = sig[max_filesize]
+        self.chunks_end_type = sig.get(chunks_end_type)
+        self.chunks_offset = sig.get(chunks_offset)
+        self.chunks_crc = sig.get(chunks_crc, 0)
+
+def normaliseSignatures(signs, compiled = None):     # returns the size of the longest signature
     """
     Chechs the given signatures for mistakes.
     
@@ -235,8 +307,13 @@ def normaliseSignatures(signs):     # returns the size of the longest signature
     Furthermore, the maximum length of binary signatures is stored. Both start and end
     sequences are involved in this process. This number is returned by the function.
     
+    If requested, the signatures are compiled (see L{CompiledSignature}) as well.
+    
     @param signs: List of signatures to be examined
     @type signs: C{List} of Signatures C{Dictionaries}
+    @param compiled: List the compiled signatures are appended to (in the order of L{signs}) - 
+    only filled if all signatures are valid
+    @type compiled: C{List} of L{CompiledSignature}
     @return: Maximum length of (start / end) sequence
     @rtype: C{int}
     """
@@ -254,8 +331,14 @@ def normaliseSignatures(signs):     # returns the size of the longest signature
             return -1
         if sig[filesize_type] == TYPE_MANUAL and not sig.has_key(filesizemanual_functionname):
             return -1
+        if sig[filesize_type] == TYPE_CHUNKS and not sig.has_key(chunks_end_type):
+            return -1
         if sig[name].strip() == '':
             return -2
+        if sig[start_seq].count(None) == len(sig[start_seq]):
+            return -2
+        if sig[filesize_type] == TYPE_END_SEQUENCE and sig[end_seq].count(None) == len(sig[end_seq]):
+            return -2
         if len(sig[start_seq]) > maxlength:
             maxlength = len(sig[start_seq])
         if sig[filesize_type] == TYPE_END_SEQUENCE:
@@ -266,11 +349,25 @@ def normaliseSignatures(signs):     # returns the size of the longest signature
         if sig[filesize_type] == TYPE_FILE_SIZE:
             if not sig.has_key(filesize_info_correction):
                 sig[filesize_info_correction] = 0
+        if sig[filesize_type] == TYPE_CHUNKS:
+            if len(sig[chunks_end_type]) != 4:
+                return -2
+            if not sig.has_key(chunks_offset):
+                sig[chunks_offset] = len(sig[start_seq])
+            if not sig.has_key(chunks_crc):
+                sig[chunks_crc] = 0
         if not sig.has_key(description):
             sig[description] = 'no description'
         if not sig.has_key(extension):
             sig[extension] = ''
-        
+        if not sig.has_key(max_filesize):
+            sig[max_filesize] = None
+        if sig[max_filesize] != None and sig[max_filesize] < 1:
+            return -2
+    
+    if compiled != None:
+        for index in range(len(signs)):
+            compiled.append(CompiledSignature(index, signs[index]))
     return maxlength
         
 def printSignatures(signs):
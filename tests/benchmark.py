@@ -0,0 +1,392 @@
+"""
+Benchmark for the cores of FileExtractor.
+
+Builds a reproducible synthetic source file - random or zero filler with files of all signatures planted
+at known positions, some of them across block (and hence shard) boundaries - and examines it with each
+available core (see L{tools.determineScanCore}) and several settings. For each run the throughput, the
+peak memory (resident set size) and recall / precision against the planted files are measured. Each run
+is performed in a process of its own, so that the peak memory of one run does not hide the next one.
+
+The results may be written to a JSON file and compared with the results of another version::
+
+    python tests/benchmark.py -o1.0.4.json -l1.0.4
+    python tests/benchmark.py -r1.0.4.json
+
+Run
+python tests/benchmark.py
+
+without options for the defaults; C{-h} lists the options.
+
+FileExtractor is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+FileExtractor is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
+
+@var def_size: Default size of the synthetic source file in MB
+@var def_files: Default number of planted files
+@var def_filler: Default filler between the planted files (random or zero)
+@var def_seed: Default seed of the synthetic source file
+@var def_blocksize: Default block size - smaller than usual, so that many files cross block boundaries
+@var RUNS: Settings of the runs - name, core, processes, memory mapped
+@var REGRESSION: Relative loss of throughput reported as regression when comparing results
+"""
+import sys
+import os
+import os.path
+import json
+import random
+import shutil
+import struct
+import tempfile
+import time
+import zlib
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import signatures
+import tools
+import CarveManifest
+import FileExtractorCoreNew
+from ExecutionSettings import ExecutionSettings, ExecutionStatus
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def_size = 64
+def_files = 400
+def_filler = 'random'
+def_seed = 1
+def_blocksize = 1024 * 1024
+
+RUNS = [('Python', 'Python', 1, False), ('Python mmap', 'Python', 1, True), ('Python 2 processes', 'Python', 2, False),
+    ('Native', 'Native', 1, False)]
+REGRESSION = 0.1
+
+_POOLSIZE = 1024 * 1024
+
+class SourceGenerator:
+    """
+    Builds the content of planted files and filler from one seed.
+
+    @ivar _random: Random generator for all decisions
+    @type _random: C{random.Random}
+    @ivar _pool: Random bytes the filler and the content of files are taken from
+    @type _pool: C{String}
+    """
+    def __init__(self, seed):
+        """
+        @param seed: Seed of the source file
+        @type seed: C{int}
+        """
+        self._random = random.Random(seed)
+        self._pool = ('%0*x' %(2 * _POOLSIZE, self._random.getrandbits(8 * _POOLSIZE))).decode('hex')
+
+    def randint(self, low, high):
+        return self._random.randint(low, high)
+
+    def choice(self, items):
+        return self._random.choice(items)
+
+    def bytes(self, length, forbidden = ()):
+        """
+        Provides random bytes not containing any of the forbidden sequences.
+        """
+        data = ''
+        while len(data) < length:
+            start = self._random.randrange(_POOLSIZE)
+            data += self._pool[start:start + length - len(data)]
+        for sequence in forbidden:
+            while data.find(sequence) != -1:
+                data = data.replace(sequence, 'x' * len(sequence))
+        return data
+
+    def jpeg(self, length):
+        app1 = 'Exif\x00\x00MM' + self.bytes(min(length / 4, 60000))
+        entropy = self.bytes(max(length - len(app1) - 16, 16)).replace('\xff', '\xff\x00')
+        return '\xff\xd8\xff\xe1' + struct.pack('>H', len(app1) + 2) + app1 + '\xff\xda\x00\x04\x00\x00' + \
+            entropy + '\xff\xd9'
+
+    def thm(self, length):
+        app1 = 'Exif\x00\x00II' + self.bytes(0x09FE - 10)
+        entropy = self.bytes(max(length - len(app1) - 16, 16)).replace('\xff', '\xff\x00')
+        return '\xff\xd8\xff\xe1\x09\xfe' + app1 + '\xff\xda\x00\x04\x00\x00' + entropy + '\xff\xd9'
+
+    def bmp(self, length):
+        return 'BM' + struct.pack('<I', length) + '\x00\x00\x00\x00' + struct.pack('<I', 0x36) + self.bytes(length - 14)
+
+    def gif(self, length):
+        return 'GIF89a' + self.bytes(length - 8, ['\x00;']) + '\x00;'
+
+    def cr2(self, length):
+        part = max((length - 18) / 3, 1)
+        body = [self.bytes(part, ['\xff\xd9']) for i in range(3)]
+        return 'II\x2a\x00\x10\x00\x00\x00CR\x02\x00' + '\xff\xd9'.join(body) + '\xff\xd9'
+
+    def crw(self, length):
+        header = 'II' + struct.pack('<I', 26) + 'HEAPCCDR' + '\x00' * 12
+        heap = self.bytes(max(length - len(header) - 36, 64), ['\x03\x00\x05\x20'])
+        directory = '\x03\x00\x05\x20' + self.bytes(28, ['\x03\x00\x05\x20'])
+        return header + heap + directory + struct.pack('<I', len(heap))
+
+    def wave(self, length):
+        return 'RIFF' + struct.pack('<I', length - 8) + 'WAVEfmt ' + self.bytes(length - 16)
+
+    def png(self, length):
+        def chunk(chunktype, data):
+            return struct.pack('>I', len(data)) + chunktype + data + struct.pack('>I', zlib.crc32(chunktype + data) & 0xFFFFFFFF)
+        return '\x89PNG\r\n\x1a\n' + chunk('IHDR', self.bytes(13)) + chunk('IDAT', self.bytes(max(length - 57, 1))) + \
+            chunk('IEND', '')
+
+    def winevt(self, length):
+        return '\x30\x00\x00\x00LfLe\x01\x00\x00\x00\x01\x00\x00\x00' + self.bytes(length - 56) + \
+            '\x28\x00\x00\x00\x11\x11\x11\x11\x22\x22\x22\x22\x33\x33\x33\x33\x44\x44\x44\x44' + self.bytes(16) + \
+            '\x28\x00\x00\x00'
+
+# name of the signature, function building the content, further signatures matching the content
+_PAYLOADS = [('JPEG', SourceGenerator.jpeg, []), ('THM', SourceGenerator.thm, ['JPEG']),
+    ('BMP', SourceGenerator.bmp, []), ('GIF', SourceGenerator.gif, []), ('CR2', SourceGenerator.cr2, []),
+    ('CRW', SourceGenerator.crw, []), ('WAVE', SourceGenerator.wave, []), ('PNG', SourceGenerator.png, []),
+    ('WINEVT', SourceGenerator.winevt, [])]
+
+def createSourceFile(filename, size, files, filler, seed, blocksize):
+    """
+    Writes a synthetic source file and provides the planted files.
+
+    Every fourth file starts across a block boundary (the start sequence is split), every fourth file
+    ends across a block boundary; the others are separated by filler of random length.
+
+    @param filename: Name of the source file
+    @type filename: C{String}
+    @param size: Size of the source file in bytes (at least)
+    @type size: C{int}
+    @param files: Number of files to be planted
+    @type files: C{int}
+    @param filler: Filler between the files - C{random} or C{zero}
+    @type filler: C{String}
+    @param seed: Seed for the content of the source file
+    @type seed: C{int}
+    @param blocksize: Block size of the runs (the boundaries of blocks and shards)
+    @type blocksize: C{int}
+    @return: Planted files - tuples of name of signature, first and last byte
+    @rtype: C{List} of C{Tuples}
+    """
+    generator = SourceGenerator(seed)
+    truth = []
+    average = max(size / max(files, 1), 4096)
+    pos = 0
+    source = open(filename, 'wb')
+    try:
+        for number in range(files):
+            name, build, others = generator.choice(_PAYLOADS)
+            content = build(generator, generator.randint(average / 8, average / 2))
+            boundary = (pos / blocksize + 1) * blocksize
+            if number % 4 == 0:
+                gap = boundary - generator.randint(1, 3) - pos
+            elif number % 4 == 1:
+                gap = boundary - len(content) + generator.randint(0, 1) - pos
+            else:
+                gap = generator.randint(0, average - len(content) / 2)
+            if gap < 0:
+                gap = generator.randint(0, average / 4)
+            if filler == 'zero':
+                source.write('\x00' * gap)
+            else:
+                source.write(generator.bytes(gap))
+            pos += gap
+            for sig in [name] + others:
+                truth.append((sig, pos, pos + len(content) - 1))
+            source.write(content)
+            pos += len(content)
+        if pos < size:
+            if filler == 'zero':
+                source.write('\x00' * (size - pos))
+            else:
+                source.write(generator.bytes(size - pos))
+    finally:
+        source.close()
+    return truth
+
+def runCore(sourcefile, corename, processes, memory_mapped, blocksize, write):
+    """
+    Examines the source file with one core and returns the measurements (in a process of its own).
+
+    @return: Seconds for initialisation and for the search, peak resident set size in KB (C{None} if not
+    available), found files - tuples as for the planted files
+    @rtype: C{Tuple}
+    """
+    folder = tempfile.mkdtemp(prefix = 'febench')
+    try:
+        manifestname = os.path.join(folder, 'manifest.jsonl')
+        settings = ExecutionSettings(sourceFiles = [sourcefile], signatures = signatures.getCopyOfAllSignauteres(),
+            output_level = 0, dest_folder = folder, blocksize = blocksize, processes = processes,
+            memory_mapped = memory_mapped, core = corename, manifest = manifestname, virtual = not write)
+        status = ExecutionStatus(settings)
+        core = tools.determineScanCore(corename)
+        started = time.time()
+        if core.init(status) < 0:
+            return None
+        initialised = time.time()
+        core.startSearch(status)
+        finished = time.time()
+        rss = None
+        if resource != None:
+            rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        found = [(r['signature'], r['start'], r['end']) for r in CarveManifest.readManifest(manifestname)]
+        return initialised - started, finished - initialised, rss, found
+    finally:
+        shutil.rmtree(folder, True)
+
+def _runInProcess(queue, args):
+    queue.put(runCore(*args))
+
+def evaluate(name, measured, truth, size):
+    """
+    Compares the files found by one run with the planted files.
+
+    @return: Results of the run
+    @rtype: C{Dict}
+    """
+    init_seconds, seconds, rss, found = measured
+    expected = set(truth)
+    hits = set(found)
+    correct = len(expected & hits)
+    return {'name': name, 'init_seconds': round(init_seconds, 4), 'seconds': round(seconds, 4),
+        'mb_per_s': round(size / 1048576.0 / max(seconds, 1e-6), 2), 'peak_rss_kb': rss,
+        'found': len(found), 'correct': correct,
+        'recall': round(correct / float(max(len(expected), 1)), 4),
+        'precision': round(correct / float(max(len(hits), 1)), 4)}
+
+def compareResults(results, reference):
+    """
+    Prints the differences to the results of another version; losses of throughput by more than
+    L{REGRESSION} and any loss of recall or precision are marked.
+    """
+    print ('\nCompared with %s:' %(reference.get('label')))
+    if reference.get('source') != results['source']:
+        print ('Warning - the source files differ: %s' %(reference.get('source')))
+    previous = dict([(run['name'], run) for run in reference.get('runs', [])])
+    for run in results['runs']:
+        old = previous.get(run['name'])
+        if old == None:
+            print ('\t%-20s\tnew' %(run['name']))
+            continue
+        change = run['mb_per_s'] / max(old['mb_per_s'], 1e-6) - 1
+        marks = []
+        if change < -REGRESSION:
+            marks.append('THROUGHPUT')
+        if run['recall'] < old['recall']:
+            marks.append('RECALL')
+        if run['precision'] < old['precision']:
+            marks.append('PRECISION')
+        print ('\t%-20s\t%+.1f %% MB/s\trecall %.4f -> %.4f\tprecision %.4f -> %.4f\t%s' %(run['name'], change * 100,
+            old['recall'], run['recall'], old['precision'], run['precision'], ' '.join(marks) or 'ok'))
+
+def usage(programname):
+    print ""
+    print "Usage: %s [-sX] [-nX] [-fS] [-xX] [-bX] [-iS] [-w] [-oS] [-lS] [-rS]" %programname
+    print ""
+    print "Parameters"
+    print "\t-sX\tMinimum size of the synthetic source file in MB (default %d)" %def_size
+    print "\t-nX\tNumber of planted files (default %d)" %def_files
+    print "\t-fS\tFiller between the planted files: random or zero (default %s)" %def_filler
+    print "\t-xX\tSeed of the synthetic source file (default %d)" %def_seed
+    print "\t-bX\tBlock size of the runs (default %d)" %def_blocksize
+    print "\t-iS\tKeep the synthetic source file as S (default: temporary file)"
+    print "\t-w\tWrite the found files (default: index only)"
+    print "\t-oS\tWrite the results to JSON file S"
+    print "\t-lS\tLabel of this version in the results"
+    print "\t-rS\tCompare with the results in JSON file S"
+    print ""
+
+def main(args):
+    size, files, filler, seed, blocksize = def_size, def_files, def_filler, def_seed, def_blocksize
+    sourcefile, write, output, label, reference = None, False, None, None, None
+    for arg in args[1:]:
+        if arg[0] != '-' or len(arg) < 2:
+            continue
+        if arg[1] == 's':
+            size = int(arg[2:])
+        elif arg[1] == 'n':
+            files = int(arg[2:])
+        elif arg[1] == 'f':
+            filler = arg[2:]
+        elif arg[1] == 'x':
+            seed = int(arg[2:])
+        elif arg[1] == 'b':
+            blocksize = int(arg[2:])
+        elif arg[1] == 'i':
+            sourcefile = arg[2:]
+        elif arg[1] == 'w':
+            write = True
+        elif arg[1] == 'o':
+            output = arg[2:]
+        elif arg[1] == 'l':
+            label = arg[2:]
+        elif arg[1] == 'r':
+            reference = arg[2:]
+        else:
+            usage(args[0])
+            return
+    if filler not in ['random', 'zero']:
+        usage(args[0])
+        return
+
+    keep = sourcefile != None
+    if not keep:
+        handle, sourcefile = tempfile.mkstemp(prefix = 'febench', suffix = '.img')
+        os.close(handle)
+    try:
+        started = time.time()
+        truth = createSourceFile(sourcefile, size * 1048576, files, filler, seed, blocksize)
+        # the planted files may take more than the nominal size - the throughput refers to the real size
+        sourcesize = os.path.getsize(sourcefile)
+        print ('Source file: %.1f MB, %d planted files, %s filler, seed %d (%.1f seconds)' %(sourcesize / 1048576.0,
+            len(truth), filler, seed, time.time() - started))
+        results = {'label': label, 'python': sys.version.split()[0], 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'source': {'size': size, 'bytes': sourcesize, 'files': files, 'filler': filler, 'seed': seed,
+            'blocksize': blocksize, 'write': write}, 'runs': []}
+        for name, corename, processes, memory_mapped in RUNS:
+            if corename == 'Native' and not FileExtractorCoreNew.isAvailable():
+                continue
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target = _runInProcess,
+                args = (queue, (sourcefile, corename, processes, memory_mapped, blocksize, write)))
+            process.start()
+            measured = queue.get()
+            process.join()
+            if measured == None:
+                print ('%-20s\tfailed' %(name))
+                continue
+            run = evaluate(name, measured, truth, sourcesize)
+            results['runs'].append(run)
+            print ('%-20s\t%8.2f MB/s\t%s KB\trecall %.4f\tprecision %.4f\t(%d found)' %(name, run['mb_per_s'],
+                run['peak_rss_kb'], run['recall'], run['precision'], run['found']))
+    finally:
+        if not keep:
+            os.remove(sourcefile)
+    if output != None:
+        outfile = open(output, 'w')
+        try:
+            json.dump(results, outfile, indent = 1, sort_keys = True)
+        finally:
+            outfile.close()
+    if reference != None:
+        reffile = open(reference, 'r')
+        try:
+            compareResults(results, json.load(reffile))
+        finally:
+            reffile.close()
+
+if __name__ == "__main__":
+    main(sys.argv)
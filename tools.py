@@ -19,15 +19,23 @@ along with FileExtractor. If not, see <http://www.gnu.org/licenses/>.
 @type FALSE: C{int}
 @var TRUE: Exactly what you think it is
 @type TRUE: C{int}
+@var COPY_BUFFERSIZE: Maximum number of bytes held in memory at once when copying a part of the source file
+@type COPY_BUFFERSIZE: C{int}
 """
 import os.path
 import sys
+import mmap
+import cPickle
+import hashlib
+import GrowingFile
 
 # constants
 FALSE = 0
 TRUE = 1
+COPY_BUFFERSIZE = 1024 * 1024
         
 import signatures
+import ExecutionSettings
 
 def checkString(st, list):
     """
@@ -57,14 +65,84 @@ def checkString(st, list):
             return FALSE
     return TRUE
     
+def isMapped(filehandle):
+    """
+    Checks, whether the given source file is accessed memory mapped.
+    
+    @param filehandle: Reference to the source file
+    @type filehandle: Reference to file or C{mmap}
+    @return: TRUE if the source file is a memory map, otherwise FALSE
+    @rtype: C{Boolean}
+    """
+    return isinstance(filehandle, mmap.mmap)
+
+def readAt(filehandle, pos, length):
+    """
+    Provides a part of the source file.
+    
+    Memory mapped source files are sliced directly; otherwise the position in the source file is
+    memorised, the part is read and the position is restored afterwards.
+    
+    @param filehandle: Reference to the source file
+    @type filehandle: Reference to file or C{mmap}
+    @param pos: Position of the part within the source file
+    @type pos: C{int}
+    @param length: Number of bytes to read
+    @type length: C{int}
+    @return: Requested part of the source file - might be shorter at the end of the file
+    @rtype: C{String}
+    """
+    if isMapped(filehandle):
+        return filehandle[pos:pos + length]
+    oldPos = filehandle.tell()
+    filehandle.seek(pos)
+    val = filehandle.read(length)
+    filehandle.seek(oldPos)
+    return val
+
+def openSourceFile(binfilename, memory_mapped, debug_output, imaging = None):
+    """
+    Opens the source file for reading - memory mapped, if requested and possible.
+    
+    A source file still being written by an imaging is never memory mapped; reading it waits
+    for the imaging instead (see L{GrowingFile}).
+    
+    @param binfilename: Name of the source file
+    @type binfilename: C{String}
+    @param memory_mapped: Indicates, whether the source file shall be memory mapped
+    @type memory_mapped: C{Boolean}
+    @param debug_output: Indicates, whether to produce output to standard out.
+    @type debug_output: C{Boolean}
+    @param imaging: Status of the imaging writing the source file (C{None} for a complete source file)
+    @type imaging: L{imagegenerator.Runtime.Status}
+    @return: Reference to the opened source file
+    @rtype: Reference to file, C{mmap} or L{GrowingFile.GrowingFile}
+    """
+    if imaging != None:
+        return GrowingFile.GrowingFile(binfilename, imaging)
+    filehandle = open(binfilename, 'rb')
+    if memory_mapped:
+        try:
+            mapped = mmap.mmap(filehandle.fileno(), 0, access = mmap.ACCESS_READ)
+            filehandle.close()
+            return mapped
+        except (EnvironmentError, ValueError, OverflowError), msg:
+            if debug_output:
+                print ('Source file cannot be memory mapped (%s) - reading it instead' %(msg))
+    return filehandle
+
 def writeFile(type, counter, extension, filehandle, start, end, folder, showoutput, status):
     """
     Writes a certain chunk from a source file to a new file.
     
-    This function assembles a filename regarding to the given settings (digtis, etc.). The old 
-    position in the source file is memorised. The part of the source file from start to end
-    is stored in the new file. The new file is closed and the position in the source file
-    is restored.
+    This function assembles a filename regarding to the given settings (see L{getCarveName}). The
+    part of the source file from start to end is stored in the new file (see L{copyFile}).
+    
+    For deduplication (see L{ExecutionSettings.ExecutionSettings.dedup}) the hash of the part is
+    calculated from the source file before (see L{hashRange}); a file with the same content as a file
+    written before is not written at all, but skipped or replaced by a hard link (see
+    L{resolveDuplicate}). Otherwise, if requested (see L{ExecutionSettings.ExecutionSettings.getHashName}),
+    the hash is calculated while copying.
     
     @param type: Name of the file type - in fact the start of the new filename
     @type type: C{String}
@@ -73,7 +151,7 @@ def writeFile(type, counter, extension, filehandle, start, end, folder, showoutp
     @param extension: The file extension of the new file
     @type extension: C{String}
     @param filehandle: Reference to the source file
-    @type filehandle: Reference to file
+    @type filehandle: Reference to file or C{mmap}
     @param start: Starting position in the source file to copy to the new file
     @type start: C{int}
     @param end: End position in the source file to copy to the new file
@@ -84,20 +162,247 @@ def writeFile(type, counter, extension, filehandle, start, end, folder, showoutp
     @type showoutput: C{Boolean}
     @param status: Reference to status instance of the current execution
     @type status: L{ExecutionSettings.ExecutionStatus}
+    @return: Name of the new file (C{None} if skipped as duplicate); hash of the content (C{None} if
+    not requested); name of the file with the same content written before (C{None} if no duplicate)
+    @rtype: C{String}; C{String}; C{String}
+    """
+    filename = getCarveName(type, counter, extension, folder, status.settings)
+    hashname = status.settings.getHashName()
+    if status.settings.dedup != None:
+        digest = hashRange(filehandle, start, end - start + 1, hashname)
+        filename, original = resolveDuplicate(filename, digest, showoutput, status)
+        if original == None:
+            copyFile(filename, filehandle, start, end, showoutput)
+        return filename, digest, original
+    return filename, copyFile(filename, filehandle, start, end, showoutput, hashname), None
+
+def getCarveName(type, counter, extension, folder, settings):
+    """
+    Assembles the name of the file for a found file - the running number is filled with zeros up to
+    the number of digits given in the settings.
+    
+    @param type: Name of the file type - in fact the start of the new filename
+    @type type: C{String}
+    @param counter: Running number - in fact the second part of the new filename
+    @type counter: C{int}
+    @param extension: The file extension of the new file
+    @type extension: C{String}
+    @param folder: Destination folder for the output file
+    @type folder: C{String}
+    @param settings: Settings of the current execution
+    @type settings: L{ExecutionSettings.ExecutionSettings}
+    @return: Name of the new file
+    @rtype: C{String}
     """
-    oldPos = filehandle.tell()
     scounter = str(counter)
-    scounter = scounter.zfill(status.settings.digits)
-    filename = type + '_' + scounter + '.' + extension
-    filename = folder + filename
+    scounter = scounter.zfill(settings.digits)
+    return folder + type + '_' + scounter + '.' + extension
+
+def copyFile(filename, filehandle, start, end, showoutput, hashname = None):
+    """
+    Copies a part of the source file into a new file (see L{copyRange}).
+    
+    The old position in the source file is memorised and restored afterwards.
+    
+    @param filename: Name of the new file
+    @type filename: C{String}
+    @param filehandle: Reference to the source file
+    @type filehandle: Reference to file or C{mmap}
+    @param start: Starting position in the source file to copy to the new file
+    @type start: C{int}
+    @param end: End position in the source file to copy to the new file
+    @type end: C{int}
+    @param showoutput: Indicates, whether debug output shall be displayed to standard output
+    @type showoutput: C{Boolean}
+    @param hashname: Name of the hash algorithm calculated while copying (see C{hashlib}) - C{None} for no hash
+    @type hashname: C{String}
+    @return: Hash of the content (C{None} if not requested)
+    @rtype: C{String}
+    """
+    oldPos = filehandle.tell()
+    digest = None
+    if hashname != None:
+        digest = hashlib.new(hashname)
     ofile = open(filename, 'wb')
-    filehandle.seek(start)
-    val = filehandle.read(end-start+1)
-    ofile.write(val)
-    ofile.close()
+    try:
+        copyRange(filehandle, start, end-start+1, ofile, digest)
+    finally:
+        ofile.close()
     if showoutput:
         print ("Wrote file with name <%s> from 0x%x to 0x%x (%d Bytes)" %(filename, start, end, end-start))
     filehandle.seek(oldPos)
+    if digest != None:
+        digest = digest.hexdigest()
+    return digest
+
+def hashRange(filehandle, start, length, hashname):
+    """
+    Calculates the hash of a part of the source file.
+    
+    Found files are hashed this way before they are written - the part has just been examined and
+    is usually still in the cache of the operating system.
+    
+    @param filehandle: Reference to the source file
+    @type filehandle: Reference to file or C{mmap}
+    @param start: Starting position in the source file
+    @type start: C{int}
+    @param length: Number of bytes to hash (the part might be shorter at the end of the source file)
+    @type length: C{int}
+    @param hashname: Name of the hash algorithm (see C{hashlib})
+    @type hashname: C{String}
+    @return: Hex digest of the part
+    @rtype: C{String}
+    """
+    digest = hashlib.new(hashname)
+    done = 0
+    while done < length:
+        part = readAt(filehandle, start + done, min(length - done, COPY_BUFFERSIZE))
+        if part == '':
+            break
+        digest.update(part)
+        done += len(part)
+    return digest.hexdigest()
+
+def resolveDuplicate(filename, digest, showoutput, status):
+    """
+    Looks up the content of a found file before writing it (see L{ExecutionSettings.ExecutionSettings.dedup}).
+    
+    The first file registered with a hash is kept; hence, files have to be registered in the order
+    they have been found for a reproducible result. For a file with the same content as a file
+    registered before, the duplicate is resolved (see L{linkDuplicate}) - the file registered
+    before must have been written already.
+    
+    @param filename: Name of the file to be written
+    @type filename: C{String}
+    @param digest: Hash of the content of the file
+    @type digest: C{String}
+    @param showoutput: Indicates, whether debug output shall be displayed to standard output
+    @type showoutput: C{Boolean}
+    @param status: Reference to status instance of the current execution
+    @type status: L{ExecutionSettings.ExecutionStatus}
+    @return: Name of the file (C{None} if skipped as duplicate); name of the file with the same
+    content registered before (C{None} if no duplicate - the file still has to be written)
+    @rtype: C{String}; C{String}
+    """
+    original = status.dedup_store.register(digest, filename)
+    if original != None:
+        filename = linkDuplicate(filename, original, showoutput, status)
+    return filename, original
+
+def linkDuplicate(filename, original, showoutput, status):
+    """
+    Resolves a found file with the same content as a file written before - it is not written, but
+    skipped or replaced by a hard link to the file written before (see L{ExecutionSettings.ExecutionSettings.dedup}).
+    
+    A file with the same name left behind (e.g. by an interrupted execution) is removed in either case.
+    
+    @param filename: Name of the file not to be written
+    @type filename: C{String}
+    @param original: Name of the file written before with the same content
+    @type original: C{String}
+    @param showoutput: Indicates, whether debug output shall be displayed to standard output
+    @type showoutput: C{Boolean}
+    @param status: Reference to status instance of the current execution
+    @type status: L{ExecutionSettings.ExecutionStatus}
+    @return: Name of the file (C{None} if skipped)
+    @rtype: C{String}
+    """
+    if os.path.lexists(filename):
+        os.remove(filename)
+    if status.settings.dedup == ExecutionSettings.DEDUP_LINK and hasattr(os, 'link'):
+        os.link(original, filename)
+    else:
+        filename = None
+    if showoutput:
+        print ("-- Same content as <%s> - %s" %(original, filename and 'linked' or 'skipped'))
+    return filename
+
+def copyRange(filehandle, start, length, ofile, digest = None):
+    """
+    Copies a part of the source file to an output file.
+    
+    The part is copied in chunks of at most L{COPY_BUFFERSIZE} bytes, so that the memory required does
+    not depend on the size of the part. Memory mapped source files are written from buffers on the map
+    directly.
+    
+    @param filehandle: Reference to the source file
+    @type filehandle: Reference to file or C{mmap}
+    @param start: Starting position in the source file
+    @type start: C{int}
+    @param length: Number of bytes to copy (nothing is copied for negative values); C{None} for copying
+    the source file up to its end
+    @type length: C{int}
+    @param ofile: Output file (opened for writing)
+    @type ofile: Reference to a file
+    @param digest: Hash object (see C{hashlib}) updated with the copied bytes (C{None} for no hash)
+    @type digest: C{hashlib} object
+    @return: Number of bytes copied
+    @rtype: C{int}
+    """
+    size = getOpenFileSize(filehandle)
+    if length == None or start + length > size:
+        length = size - start
+    if length < 0:
+        length = 0
+    copied = 0
+    if not isMapped(filehandle):
+        filehandle.seek(start)
+    while copied < length:
+        chunk = min(length - copied, COPY_BUFFERSIZE)
+        if isMapped(filehandle):
+            val = buffer(filehandle, start + copied, chunk)
+        else:
+            val = filehandle.read(chunk)
+            if val == '':
+                break
+            chunk = len(val)
+        if digest != None:
+            digest.update(val)
+        ofile.write(val)
+        copied += chunk
+    return copied
+
+def loadPickle(filename):
+    """
+    Reads an object from a file written by L{savePickle}.
+    
+    @param filename: Name of the file
+    @type filename: C{String}
+    @return: The object or C{None}, if the file does not exist or is damaged
+    @rtype: C{object}
+    """
+    try:
+        pf = open(filename, 'rb')
+        try:
+            return cPickle.load(pf)
+        finally:
+            pf.close()
+    except EnvironmentError:
+        return None
+    except Exception:       # damaged file
+        return None
+
+def savePickle(filename, content):
+    """
+    Writes an object to a file.
+    
+    The object is written to a temporary file, which is renamed afterwards - hence, a damaged
+    file is never left behind (not even if the application is killed while writing).
+    
+    @param filename: Name of the file
+    @type filename: C{String}
+    @param content: Object to be written
+    @type content: C{object}
+    """
+    tmpfile = filename + '.tmp'
+    pf = open(tmpfile, 'wb')
+    try:
+        cPickle.dump(content, pf, cPickle.HIGHEST_PROTOCOL)
+    finally:
+        pf.close()
+    if os.name == 'nt' and os.path.exists(filename):
+        os.remove(filename)
+    os.rename(tmpfile, filename)
 
 def checkDestfolder(dest_folder):
     """
@@ -114,6 +419,21 @@ def checkDestfolder(dest_folder):
         dest_folder += '/'
     return dest_folder
 
+def getOpenFileSize(filehandle):
+    """
+    Looks for the file size of an opened source file.
+    
+    @param filehandle: Reference to the source file
+    @type filehandle: Reference to file or C{mmap}
+    @return: Size of the source file in bytes
+    @rtype: C{int}
+    """
+    if isMapped(filehandle):
+        return len(filehandle)
+    if isinstance(filehandle, GrowingFile.GrowingFile):
+        return filehandle.size
+    return os.fstat(filehandle.fileno()).st_size
+
 def getFileSize(filename):
     """
     Looks for the file size of the file with the given name.
@@ -179,6 +499,30 @@ def determineCoreName(coreNameSetting):
     else:
         return None
 
+def determineScanCore(coreNameSetting):
+    """
+    Provides the core for examining source files.
+    
+    "Python" is the original core (L{FileExtractorCore}), "Native" the one performing the scan loop
+    in a C-Module (L{FileExtractorCoreNew}). "auto" chooses the native core, if it has been compiled.
+    
+    @param coreNameSetting: Name of the core
+    @type coreNameSetting: C{String}
+    @return: Core module or C{None}, if the requested core is not available
+    @rtype: C{module}
+    """
+    import FileExtractorCore
+    import FileExtractorCoreNew
+    if coreNameSetting == None or coreNameSetting == "" or coreNameSetting == "auto":
+        if FileExtractorCoreNew.isAvailable():
+            return FileExtractorCoreNew
+        return FileExtractorCore
+    if coreNameSetting == "Python":
+        return FileExtractorCore
+    if coreNameSetting == "Native" and FileExtractorCoreNew.isAvailable():
+        return FileExtractorCoreNew
+    return None
+
 def determineDDPathFromCoreName(coreName):
     if coreName == "Linux":
         return "/bin/dd"